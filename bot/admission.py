@@ -0,0 +1,150 @@
+"""
+Admission control for the commands that render and upload images. A fixed
+number of them run at once and the rest wait in a bounded queue, taking
+turns between servers so one busy server cannot starve the others.
+"""
+from asyncio import Future, wait
+from collections import OrderedDict, deque
+from functools import wraps
+from time import perf_counter
+
+from discord.ext.commands import CommandError
+
+from bot.metrics import metrics
+
+
+class ServerBusy(CommandError):
+    def __str__(self):
+        return ('I am busy with a lot of commands right now, '
+                'please try again in a moment.')
+
+
+class AdmissionController:
+    """
+    A concurrency limit with a wait queue per server, served round robin.
+    """
+
+    def __init__(self, max_concurrent: int = 8, max_queue: int = 64,
+                 max_wait: float = 10):
+        """
+        Constructor for an AdmissionController.
+
+        :param max_concurrent: Number of commands run at once.
+        :param max_queue: Number of commands that can wait for a turn.
+        :param max_wait: Seconds a command waits before it is turned away.
+        """
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.running = 0
+        self.queued = 0
+        self._queues = OrderedDict()
+
+    def configure(self, options: dict):
+        """
+        :param options: The "admission" section of config.json.
+        """
+        self.max_concurrent = options.get(
+            'max_concurrent', self.max_concurrent)
+        self.max_queue = options.get('max_queue', self.max_queue)
+        self.max_wait = options.get('max_wait', self.max_wait)
+
+    async def acquire(self, server_id: str):
+        """
+        Wait for a turn to run.
+
+        :param server_id: ID of the server of the command, None for DMs.
+
+        :raises ServerBusy: if the queue is full or the wait is too long.
+        """
+        if self.try_acquire():
+            return
+        if self.queued >= self.max_queue:
+            metrics.inc('admission_rejected_total', reason='full')
+            raise ServerBusy
+
+        turn = Future()
+        queue = self._queues.get(server_id)
+        if queue is None:
+            queue = self._queues[server_id] = deque()
+        queue.append(turn)
+        self.queued += 1
+        self._update_gauges()
+        start = perf_counter()
+        try:
+            await wait([turn], timeout=self.max_wait)
+        except BaseException:
+            # Cancelled while waiting, pass on a turn that was handed over.
+            if turn.done():
+                self.release()
+            else:
+                self._remove(server_id, turn)
+            raise
+        metrics.observe('admission_wait_seconds', perf_counter() - start)
+        if not turn.done():
+            self._remove(server_id, turn)
+            metrics.inc('admission_rejected_total', reason='timeout')
+            raise ServerBusy
+
+    def try_acquire(self) -> bool:
+        """
+        Take a turn only if one is free right away, without queueing.
+
+        :return: True if a turn was taken, it must be released when done.
+        """
+        if self.running < self.max_concurrent and not self.queued:
+            self.running += 1
+            self._update_gauges()
+            return True
+        return False
+
+    def release(self):
+        """
+        End a turn, handing it to the next server with a waiting command.
+        """
+        if self._queues:
+            server_id, queue = next(iter(self._queues.items()))
+            turn = queue.popleft()
+            self.queued -= 1
+            if queue:
+                self._queues.move_to_end(server_id)
+            else:
+                del self._queues[server_id]
+            turn.set_result(None)
+            self._update_gauges()
+            return
+        self.running -= 1
+        self._update_gauges()
+
+    def _remove(self, server_id: str, turn: Future):
+        queue = self._queues.get(server_id)
+        if queue is None or turn not in queue:
+            return
+        queue.remove(turn)
+        self.queued -= 1
+        if not queue:
+            del self._queues[server_id]
+        self._update_gauges()
+
+    def _update_gauges(self):
+        metrics.set_gauge('admission_running', self.running)
+        metrics.set_gauge('admission_queued', self.queued)
+        metrics.set_gauge('admission_queued_servers', len(self._queues))
+
+
+def admitted(func):
+    """
+    Decorator for command callbacks that only run when admitted.
+    """
+    @wraps(func)
+    async def wrapper(self, ctx, *args, **kwargs):
+        server = ctx.message.server
+        await admission_controller.acquire(server.id if server else None)
+        try:
+            return await func(self, ctx, *args, **kwargs)
+        finally:
+            admission_controller.release()
+    return wrapper
+
+
+admission_controller = AdmissionController()
@@ -8,16 +8,18 @@ from websockets.exceptions import ConnectionClosed
 from bot.error_handler import command_error_handler, format_command_error, \
     format_traceback
 from bot.logger import command_formatter
+from bot.metrics import metrics
+from bot.profiler import profiler
 from bot.session_manager import SessionManager
 from core.help import get_help
-from data_controller.mongo import MongoClient
+from data_controller.database_controller import StorageClient
 from core import argument_parser
 
 
 class HahaNo4Star(Bot):
     def __init__(self, prefix: str, start_time: int, colour: int, logger,
-                 session_manager: SessionManager, db: MongoClient,
-                 error_log: int, feedback_log: int):
+                 session_manager: SessionManager, db: StorageClient,
+                 error_log: int, feedback_log: int, owners: list = ()):
         """
         Init the instance of HahaNo4Star.
         :param prefix: the bot prefix.
@@ -25,8 +27,9 @@ class HahaNo4Star(Bot):
         :param colour: the colour used for embeds.
         :param logger: the logger.
         :param session_manager: the SessionManager instance.
-        :param db: the MongoDB data controller.
+        :param db: the storage client.
         :param error_log: the channel id for error log.
+        :param owners: the ids of the users allowed to run admin commands.
         """
         super().__init__(prefix)
         self.prefix = prefix
@@ -41,6 +44,7 @@ class HahaNo4Star(Bot):
         # FIXME remove type casting after library rewrite
         self.error_log = Object(str(error_log))
         self.feedbag_log = Object(str(feedback_log))
+        self.owners = {str(owner) for owner in owners}
 
     def start_bot(self, cogs: list, token: str):
         """
@@ -52,6 +56,15 @@ class HahaNo4Star(Bot):
             self.add_cog(cog)
         self.run(token)
 
+    async def close(self):
+        """
+        Close the bot and release the HTTP and database connections.
+        """
+        await super().close()
+        await self.session_manager.close()
+        if self.db:
+            await self.db.close()
+
     async def __change_presence(self):
         """
         Change the "Playinng" status of the bot.
@@ -83,6 +96,7 @@ class HahaNo4Star(Bot):
         self.logger.log(logging.INFO, f'{len(self.servers)} servers detected')
         self.help_general, self.all_help = get_help(self)
         self.member_names = await self.db.cards.get_member_names()
+        argument_parser.compile_arguments(self.member_names)
         await self.__change_presence()
 
     async def process_commands(self, message):
@@ -111,12 +125,25 @@ class HahaNo4Star(Bot):
 
         is_cmd = (content[0] == self.prefix)
         command_name = content.split(' ')[0][len(self.prefix):]
-        if is_cmd and command_name in list(self.commands.keys()):
-            log_entry = command_formatter(message, self.prefix + command_name)
-            self.logger.log(logging.INFO, log_entry)
-            
         message.content = content
-        await super().process_commands(message)
+        if not is_cmd or command_name not in self.commands:
+            await super().process_commands(message)
+            return
+
+        log_entry = command_formatter(message, self.prefix + command_name)
+        self.logger.log(logging.INFO, log_entry, extra={'sampled': True})
+        # Time commands by name, so aliases are counted together.
+        with metrics.command(self.commands[command_name].name):
+            await super().process_commands(message)
+        if profiler.active:
+            profiler.command_done()
+
+    async def upload(self, *args, **kwargs):
+        """
+        Overwrites the upload method to time uploads.
+        """
+        with metrics.timed('upload'):
+            return await super().upload(*args, **kwargs)
 
     async def on_error(self, event_method, *args, **kwargs):
         """
@@ -0,0 +1,41 @@
+"""
+Coalescing of identical commands. While a read only command runs, the same
+command from the same user with the same arguments is not run again, the
+duplicate message gets a reaction instead.
+"""
+from functools import wraps
+
+from discord import HTTPException
+
+from bot.metrics import metrics
+from core.memory import caches
+
+DUPLICATE_REACTION = '\N{HOURGLASS WITH FLOWING SAND}'
+
+# Keys of the commands in progress.
+_in_flight = caches.register('in_flight_commands', set())
+
+
+def coalesced(func):
+    """
+    Decorator for read only command callbacks, dropping calls identical to
+        one in progress.
+    """
+    @wraps(func)
+    async def wrapper(self, ctx, *args, **kwargs):
+        key = (ctx.command.name, ctx.message.author.id,
+               tuple(str(arg).lower() for arg in args),
+               tuple(sorted(kwargs.items())))
+        if key in _in_flight:
+            metrics.inc('coalesced_commands_total', command=ctx.command.name)
+            try:
+                await ctx.bot.add_reaction(ctx.message, DUPLICATE_REACTION)
+            except HTTPException:
+                pass
+            return
+        _in_flight.add(key)
+        try:
+            return await func(self, ctx, *args, **kwargs)
+        finally:
+            _in_flight.discard(key)
+    return wrapper
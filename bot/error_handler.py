@@ -1,7 +1,8 @@
 from textwrap import wrap
 
 from discord.ext.commands import CommandOnCooldown, Context
-from core.checks import NoMongo
+from bot.admission import ServerBusy
+from core.checks import NoMongo, NotOwner
 from bot.session_manager import HTTPStatusError
 
 
@@ -12,7 +13,8 @@ def command_error_handler(exception: Exception):
     :return: the message to be sent based on the exception type
     """
     ex_str = str(exception)
-    if isinstance(exception, (CommandOnCooldown, NoMongo)):
+    if isinstance(exception,
+                  (CommandOnCooldown, NoMongo, NotOwner, ServerBusy)):
         return ex_str
     if isinstance(exception, HTTPStatusError):
         return f'Something went wrong with the HTTP request.\n{ex_str}'
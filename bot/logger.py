@@ -1,7 +1,13 @@
+import json
 import logging
 from datetime import datetime
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
+from queue import Full, Queue
+from random import random
 from sys import stdout
+from time import gmtime
 
 from colorlog import ColoredFormatter
 from discord import Message
@@ -10,6 +16,21 @@ from pytz import timezone
 CONSOLE_FORMAT = ('%(asctime)s %(log_color)s%(levelname)s %(name)s: '
                   '%(message)s')
 FILE_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+DATE_FORMAT = '%y-%m-%d %H:%M:%S'
+
+TIMEZONE = timezone('Canada/Eastern')
+
+# Defaults for the "logging" section of config.json.
+DEFAULT_OPTIONS = {
+    'max_bytes': 10 * 1024 * 1024,
+    'backup_count': 5,
+    'json': False,
+    'queue_size': 10000,
+    'sample_rate': 1.0
+}
+
+# Listener writing queued records to the handlers, see stop_logging.
+_listener = None
 
 
 def command_formatter(message: Message, command_name=None) -> str:
@@ -28,41 +49,141 @@ def command_formatter(message: Message, command_name=None) -> str:
 
 def timestamp(*args):
     """
-    Gets the current timestamp
+    Converts the time of a log record to Canada/Eastern. Used as the
+        converter of logging.Formatter, so the last argument is the time.
+
+    :return: time.struct_time of the local time
+    """
+    seconds = int(args[-1])
+    return gmtime(seconds + _utc_offset(seconds // 3600))
+
+
+@lru_cache(maxsize=4)
+def _utc_offset(hour: int) -> int:
+    """
+    The UTC offset in seconds during an hour since the epoch. Offsets only
+        change on the hour, so this is looked up once an hour.
+    """
+    local = datetime.fromtimestamp(hour * 3600, TIMEZONE)
+    return int(local.utcoffset().total_seconds())
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as one JSON object per line.
+    """
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, DATE_FORMAT),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps a fraction of the INFO records logged with
+        extra={'sampled': True}, such as one line per request or command.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno != logging.INFO or \
+                not getattr(record, 'sampled', False):
+            return True
+        return random() < self.rate
 
-    :return: timestamp string with format yyyy-MM-dd hh:mm:ss AP/PM
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Queue handler that drops records instead of blocking when the queue is
+        full, counting them in dropped.
     """
-    return datetime.now(timezone('Canada/Eastern')).timetuple()
 
+    def __init__(self, queue: Queue):
+        super().__init__(queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # The listener thread does the formatting, only the message is
+        # merged so that arguments changed later are not logged.
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            self.dropped += 1
 
-def setup_logging(start_time, path: Path):
+
+def setup_logging(start_time, path: Path, options: dict = None):
     """
-    Set up logging
+    Set up logging. Records are put on a queue and written to the log file
+        and the console by a background thread.
     :param start_time: the start time of the log
     :param path: the path to the log folder
+    :param options: the "logging" section of config.json
     :return: the logger object
     """
+    global _listener
+    options = dict(DEFAULT_OPTIONS, **(options or {}))
     logging.Formatter.converter = timestamp
+
+    queue = Queue(options['queue_size'])
+    handler = DroppingQueueHandler(queue)
+    handler.addFilter(SamplingFilter(options['sample_rate']))
+    _listener = QueueListener(
+        queue,
+        get_file_handler(path, start_time, options),
+        get_console_handler()
+    )
+    _listener.start()
+
     logger = logging.getLogger()
     logger.setLevel(logging.INFO)
-    logger.addHandler(get_file_handler(path, start_time))
-    logger.addHandler(get_console_handler())
+    logger.addHandler(handler)
     return logger
 
 
-def get_file_handler(path: Path, start_time):
+def stop_logging():
+    """
+    Write out the queued records and stop the background thread.
+    """
+    global _listener
+    if _listener:
+        _listener.stop()
+        _listener = None
+
+
+def get_file_handler(path: Path, start_time, options: dict = None):
     """
-    Get a file handler for logging
+    Get a rotating file handler for logging
     :param path: the log file path
     :param start_time: the start time
+    :param options: the "logging" section of config.json
     :return: the file handler
     """
-    handler = logging.FileHandler(
+    options = dict(DEFAULT_OPTIONS, **(options or {}))
+    handler = RotatingFileHandler(
         filename=path.joinpath(f'{int(start_time)}.log'),
-        encoding='utf-8',
-        mode='w+'
+        maxBytes=options['max_bytes'],
+        backupCount=options['backup_count'],
+        encoding='utf-8'
     )
-    handler.setFormatter(logging.Formatter(FILE_FORMAT))
+    if options['json']:
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(FILE_FORMAT))
     return handler
 
 
@@ -75,7 +196,7 @@ def get_console_handler():
     console.setFormatter(
         ColoredFormatter(
             CONSOLE_FORMAT,
-            datefmt='%y-%m-%d %H:%M:%S',
+            datefmt=DATE_FORMAT,
             reset=True,
             log_colors={
                 'DEBUG': 'cyan',
@@ -0,0 +1,106 @@
+"""
+Event loop lag monitoring. A heartbeat on the loop measures how late it
+wakes up, and a watchdog thread logs the stack of the loop thread when the
+heartbeat stops for too long.
+"""
+import logging
+import sys
+from asyncio import Task, ensure_future, sleep
+from threading import Event, Thread, get_ident
+from time import monotonic
+from traceback import format_stack
+
+from bot.metrics import metrics
+
+
+class LoopMonitor:
+    """
+    Measures event loop lag and captures what blocks the loop.
+    """
+
+    def __init__(self, logger, interval: float = 0.5, threshold: float = 1.0):
+        """
+        Constructor for a LoopMonitor.
+
+        :param logger: The logger stalls are reported to.
+        :param interval: Seconds between heartbeats.
+        :param threshold: Seconds the loop can be blocked before its stack
+            is logged.
+        """
+        self.logger = logger
+        self.interval = interval
+        self.threshold = threshold
+        self._loop = None
+        self._thread_id = None
+        self._last_beat = monotonic()
+        self._stopped = Event()
+
+    def start(self, loop):
+        """
+        Start the heartbeat and the watchdog. Must be called from the thread
+            that runs the loop.
+
+        :param loop: The event loop of the bot.
+        """
+        self._loop = loop
+        self._thread_id = get_ident()
+        self._last_beat = monotonic()
+        ensure_future(self._heartbeat(), loop=loop)
+        Thread(target=self._watch, name='loop-watchdog', daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+
+    async def _heartbeat(self):
+        while not self._stopped.is_set():
+            self._last_beat = monotonic()
+            await sleep(self.interval)
+            lag = max(0.0, monotonic() - self._last_beat - self.interval)
+            metrics.observe('loop_lag_seconds', lag)
+            metrics.set_gauge('loop_lag_last_seconds', lag)
+
+    def _watch(self):
+        """
+        Watchdog thread, logs the loop stack once per stall.
+        """
+        reported = False
+        while not self._stopped.wait(self.interval):
+            stalled = monotonic() - self._last_beat - self.interval
+            if stalled < self.threshold:
+                reported = False
+            elif not reported:
+                reported = True
+                metrics.inc('loop_stalls_total')
+                self._report(stalled)
+
+    def _report(self, stalled: float):
+        frame = sys._current_frames().get(self._thread_id)
+        stack = ''.join(format_stack(frame)) if frame else ''
+        try:
+            command = metrics.current_command(Task.current_task(self._loop))
+            running = metrics.running_commands()
+        except RuntimeError:
+            # The loop changed the timers while they were read.
+            command, running = None, []
+        running = ', '.join(f'{name} ({seconds:.1f}s)'
+                            for name, seconds in running)
+        self.logger.log(
+            logging.WARNING,
+            f'Event loop blocked for {stalled:.1f}s in command '
+            f'{command or "none"}. Running commands: {running or "none"}\n'
+            f'{stack}'
+        )
+
+
+def get_loop_monitor(logger, options: dict):
+    """
+    Creates a loop monitor from config.
+
+    :param logger: The logger stalls are reported to.
+    :param options: Dictionary with the "interval" and "threshold" in
+        seconds.
+
+    :return: The LoopMonitor.
+    """
+    return LoopMonitor(
+        logger, options.get('interval', 0.5), options.get('threshold', 1.0))
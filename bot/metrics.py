@@ -0,0 +1,254 @@
+"""
+In-process metrics: latency histograms per command and per phase of a
+command, exposed in the Prometheus text format.
+"""
+from asyncio import Task, start_server
+from bisect import bisect_left
+from contextlib import contextmanager
+from time import perf_counter
+
+from core.memory import caches
+
+# Upper bounds in seconds of the histogram buckets.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+           float('inf'))
+
+
+class Histogram:
+    """
+    Counts of observations in fixed buckets, with their sum.
+    """
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def percentile(self, q: float) -> float:
+        """
+        Estimate a percentile as the upper bound of the bucket it is in.
+
+        :param q: Percentile between 0 and 100.
+        """
+        rank = self.count * q / 100
+        total = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            total += count
+            if total >= rank and total:
+                return bound
+        return 0.0
+
+
+class CommandTimer:
+    """
+    Phase timers of one command. Nested phases are subtracted from the phase
+        they run in, so every second is counted in one phase only.
+    """
+    __slots__ = ('command', 'start', '_stack')
+
+    def __init__(self, command: str):
+        self.command = command
+        self.start = perf_counter()
+        self._stack = []
+
+
+class Metrics:
+    """
+    Registry of histograms, counters and gauges, each identified by a name
+        and a tuple of label pairs.
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self._timers = {}
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    @contextmanager
+    def command(self, name: str):
+        """
+        Time a command run by the current task, making phase timers inside
+            it record against the command.
+
+        :param name: Name of the command.
+        """
+        task = Task.current_task()
+        timer = self._timers[task] = CommandTimer(name)
+        try:
+            yield timer
+        finally:
+            del self._timers[task]
+            self.observe('command_seconds', perf_counter() - timer.start,
+                         command=name)
+
+    def current_command(self, task: Task = None):
+        """
+        :param task: The task, the current task by default.
+
+        :return: Name of the command run by the task, or None.
+        """
+        timer = self._timers.get(task or Task.current_task())
+        return timer.command if timer else None
+
+    def running_commands(self) -> list:
+        """
+        :return: List of tuples of (command name, seconds running) of every
+            command in progress.
+        """
+        now = perf_counter()
+        return [(timer.command, now - timer.start)
+                for timer in list(self._timers.values())]
+
+    @contextmanager
+    def timed(self, phase: str):
+        """
+        Time a phase of the command run by the current task. Does nothing
+            outside of a command.
+
+        :param phase: Name of the phase, such as "db" or "upload".
+        """
+        timer = self._timers.get(Task.current_task())
+        if timer is None:
+            yield
+            return
+        frame = [perf_counter(), 0.0]
+        timer._stack.append(frame)
+        try:
+            yield
+        finally:
+            timer._stack.pop()
+            elapsed = perf_counter() - frame[0]
+            if timer._stack:
+                timer._stack[-1][1] += elapsed
+            self.observe('phase_seconds', elapsed - frame[1],
+                         command=timer.command, phase=phase)
+
+    def render(self) -> str:
+        """
+        :return: All metrics in the Prometheus text format.
+        """
+        lines = []
+        for kind, values in (('counter', self.counters),
+                             ('gauge', self.gauges)):
+            for metric in sorted({key[0] for key in values}):
+                lines.append(f'# TYPE {metric} {kind}')
+                for (key, labels), value in sorted(values.items()):
+                    if key == metric:
+                        lines.append(
+                            f'{metric}{_format_labels(labels)} {value}')
+
+        for metric in sorted({key[0] for key in self.histograms}):
+            lines.append(f'# TYPE {metric} histogram')
+            for (key, labels), hist in sorted(self.histograms.items()):
+                if key != metric:
+                    continue
+                total = 0
+                for bound, count in zip(BUCKETS, hist.counts):
+                    total += count
+                    le = '+Inf' if bound == float('inf') else str(bound)
+                    bucket_labels = _format_labels(labels + (('le', le),))
+                    lines.append(f'{metric}_bucket{bucket_labels} {total}')
+                lines.append(
+                    f'{metric}_sum{_format_labels(labels)} {hist.sum}')
+                lines.append(
+                    f'{metric}_count{_format_labels(labels)} {hist.count}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self, name: str, label: str, **match) -> list:
+        """
+        Summarize a histogram by one of its labels.
+
+        :param name: Name of the histogram.
+        :param label: Label to group by.
+        :param match: Only include series with these label values.
+
+        :return: List of tuples of (label value, count, p50, p95, mean),
+            most time spent first.
+        """
+        grouped = {}
+        for (key, labels), hist in self.histograms.items():
+            labels = dict(labels)
+            if key != name or any(
+                    labels.get(k) != v for k, v in match.items()):
+                continue
+            value = labels.get(label)
+            merged = grouped.get(value)
+            if merged is None:
+                merged = grouped[value] = Histogram()
+            merged.counts = [a + b for a, b in zip(merged.counts, hist.counts)]
+            merged.sum += hist.sum
+            merged.count += hist.count
+
+        rows = [
+            (value, hist.count, hist.percentile(50), hist.percentile(95),
+             hist.sum / hist.count)
+            for value, hist in grouped.items() if hist.count
+        ]
+        rows.sort(key=lambda row: -row[1] * row[4])
+        return rows
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(key, str(value).replace('"', '\\"'))
+        for key, value in labels
+    )
+    return '{' + pairs + '}'
+
+
+async def start_metrics_server(metrics: Metrics, options: dict):
+    """
+    Serve the metrics over HTTP for Prometheus to scrape.
+
+    :param metrics: The metrics registry.
+    :param options: The "metrics" section of config.json, with the "host"
+        and "port" to listen on. No server is started without a port.
+
+    :return: The asyncio server, or None.
+    """
+    if not options.get('port'):
+        return None
+
+    async def handle(reader, writer):
+        try:
+            # Every path serves the metrics, only the headers are read.
+            while (await reader.readline()).strip():
+                pass
+            body = metrics.render().encode()
+            writer.write(
+                b'HTTP/1.0 200 OK\r\n'
+                b'Content-Type: text/plain; version=0.0.4\r\n'
+                b'Content-Length: ' + str(len(body)).encode() + b'\r\n\r\n' +
+                body
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+    return await start_server(
+        handle, options.get('host', '127.0.0.1'), options['port'])
+
+
+metrics = caches.register('metrics', Metrics())
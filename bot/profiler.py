@@ -0,0 +1,84 @@
+"""
+On demand profiling of the live bot. The profiler is only enabled while a
+profile is being taken, so it costs nothing the rest of the time.
+"""
+from asyncio import Future, TimeoutError, wait_for
+from cProfile import Profile
+from pathlib import Path
+from pstats import Stats
+
+# Root folder of the bot, used to filter and shorten file names.
+ROOT = Path(__file__).parent.parent
+
+
+class CommandProfiler:
+    """
+    Profiles the event loop thread for a number of seconds or commands.
+    """
+
+    def __init__(self):
+        self.active = False
+        self._remaining = 0
+        self._done = None
+
+    async def run(self, seconds: float, commands: int = 0) -> Stats:
+        """
+        Profile until the time is up or enough commands have finished.
+
+        :param seconds: Seconds to profile for, or the longest to wait for
+            the commands.
+        :param commands: Number of commands to profile, 0 to profile for
+            the whole time.
+
+        :return: The collected stats.
+        """
+        if self.active:
+            raise RuntimeError('A profile is already being taken.')
+        profile = Profile()
+        self._remaining = commands
+        self._done = Future()
+        self.active = True
+        profile.enable()
+        try:
+            await wait_for(self._done, seconds)
+        except TimeoutError:
+            pass
+        finally:
+            profile.disable()
+            self.active = False
+        return Stats(profile)
+
+    def command_done(self):
+        """
+        Count a finished command.
+        """
+        if self._remaining > 0:
+            self._remaining -= 1
+            if self._remaining == 0 and not self._done.done():
+                self._done.set_result(None)
+
+
+def summarize(stats: Stats, folders: tuple, limit: int = 20) -> list:
+    """
+    The functions in some folders of the bot with the most cumulative time.
+
+    :param stats: The profile stats.
+    :param folders: Names of the folders to include, such as "core".
+    :param limit: Number of functions.
+
+    :return: List of tuples of (calls, total time, cumulative time,
+        "path:line(function)").
+    """
+    prefixes = tuple(str(ROOT.joinpath(folder)) for folder in folders)
+    rows = []
+    for (filename, line, function), (_, calls, total, cumulative, _) in \
+            stats.stats.items():
+        if not filename.startswith(prefixes):
+            continue
+        path = Path(filename).relative_to(ROOT).as_posix()
+        rows.append((calls, total, cumulative, f'{path}:{line}({function})'))
+    rows.sort(key=lambda row: -row[2])
+    return rows[:limit]
+
+
+profiler = CommandProfiler()
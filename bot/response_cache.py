@@ -0,0 +1,216 @@
+"""
+Cache of parsed JSON responses for SessionManager.get_json, revalidated
+with conditional requests once they are stale.
+"""
+import json
+from collections import OrderedDict
+from hashlib import sha1
+from pathlib import Path
+from time import time
+
+from core.memory import caches
+from data import data_path
+
+
+class CachedResponse:
+    """
+    A parsed response body and the headers needed to revalidate it.
+    """
+    __slots__ = ('value', 'etag', 'last_modified', 'expires')
+
+    def __init__(self, value, etag: str = None, last_modified: str = None,
+                 expires: float = 0):
+        self.value = value
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires = expires
+
+    def is_fresh(self) -> bool:
+        return time() < self.expires
+
+    def validators(self) -> dict:
+        """
+        :return: Headers for a conditional request for this response.
+        """
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def to_dict(self) -> dict:
+        return {
+            'value': self.value,
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+            'expires': self.expires
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict):
+        return cls(d['value'], d['etag'], d['last_modified'], d['expires'])
+
+
+class ResponseCache:
+    """
+    An LRU of parsed responses keyed by URL and query string, with an
+        optional directory the responses are also written to so they
+        survive restarts.
+    """
+
+    def __init__(self, max_entries: int, path: Path = None):
+        """
+        Constructor for a ResponseCache.
+
+        :param max_entries: Maximum number of responses kept in memory.
+        :param path: Optional directory of the on-disk layer.
+        """
+        self.max_entries = max_entries
+        self.path = path
+        self.stats = {'hits': 0, 'misses': 0, 'revalidations': 0}
+        self._entries = OrderedDict()
+        if path:
+            path.mkdir(parents=True, exist_ok=True)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str):
+        """
+        Get a response, fresh or not, loading it from disk if needed.
+
+        :param key: URL with query string.
+
+        :return: The CachedResponse, or None if not cached.
+        """
+        entry = self._entries.get(key)
+        if entry:
+            self._entries.move_to_end(key)
+            return entry
+        entry = self._load(key)
+        if entry:
+            self._put(key, entry)
+        return entry
+
+    def store(self, key: str, value, headers):
+        """
+        Cache a response if its headers allow it.
+
+        :param key: URL with query string.
+        :param value: The parsed body.
+        :param headers: The response headers.
+        """
+        entry = cached_response(value, headers)
+        if entry is None:
+            self.discard(key)
+            return
+        self._put(key, entry)
+        self._save(key, entry)
+
+    def refresh(self, key: str, entry: CachedResponse, headers):
+        """
+        Extend a response after the server confirmed it is unchanged.
+
+        :param key: URL with query string.
+        :param entry: The revalidated response.
+        :param headers: Headers of the 304 response.
+        """
+        updated = cached_response(entry.value, headers)
+        if updated is None:
+            return
+        entry.etag = updated.etag or entry.etag
+        entry.last_modified = updated.last_modified or entry.last_modified
+        entry.expires = updated.expires
+        self._save(key, entry)
+
+    def discard(self, key: str):
+        self._entries.pop(key, None)
+        if self.path:
+            try:
+                self._file(key).unlink()
+            except FileNotFoundError:
+                pass
+
+    def _put(self, key: str, entry: CachedResponse):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _file(self, key: str) -> Path:
+        return self.path.joinpath(sha1(key.encode()).hexdigest() + '.json')
+
+    def _load(self, key: str):
+        if not self.path:
+            return None
+        try:
+            with self._file(key).open() as f:
+                return CachedResponse.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _save(self, key: str, entry: CachedResponse):
+        if not self.path:
+            return
+        with self._file(key).open('w') as f:
+            json.dump(entry.to_dict(), f)
+
+
+def cached_response(value, headers):
+    """
+    Build a CachedResponse from response headers.
+
+    :param value: The parsed body.
+    :param headers: The response headers.
+
+    :return: The CachedResponse, or None if the response must not be cached
+        or could never be reused.
+    """
+    directives = parse_cache_control(headers.get('Cache-Control', ''))
+    if 'no-store' in directives:
+        return None
+    etag = headers.get('ETag')
+    last_modified = headers.get('Last-Modified')
+
+    max_age = 0
+    if 'no-cache' not in directives:
+        try:
+            max_age = int(directives.get('max-age', 0))
+        except ValueError:
+            pass
+    if max_age <= 0 and not etag and not last_modified:
+        return None
+    return CachedResponse(value, etag, last_modified, time() + max_age)
+
+
+def parse_cache_control(header: str) -> dict:
+    """
+    :return: Dictionary of Cache-Control directives mapped to their values.
+    """
+    directives = {}
+    for part in header.split(','):
+        name, _, value = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = value.strip('"')
+    return directives
+
+
+def get_response_cache(options: dict):
+    """
+    Creates a response cache from config.
+
+    :param options: Dictionary with "max_entries" and an optional "path" of
+        the on-disk layer.
+
+    :return: The ResponseCache, or None if it is disabled.
+    """
+    if not options.get('max_entries'):
+        return None
+    path = None
+    if options.get('path'):
+        path = Path(options['path'])
+        if not path.is_absolute():
+            path = data_path.joinpath(path)
+    return caches.register(
+        'http_responses', ResponseCache(options['max_entries'], path))
@@ -1,10 +1,42 @@
+from asyncio import FIRST_COMPLETED, TimeoutError, ensure_future, sleep, \
+    wait, wait_for
+from collections import deque
 from http import HTTPStatus
+from inspect import isawaitable
 from json import loads
+from random import uniform
+from time import monotonic
+from urllib.parse import urlsplit
 
-from aiohttp import ClientResponse, ClientSession
+from aiohttp import ClientError, ClientResponse, ClientSession, \
+    DisconnectedError, TCPConnector
 from discord.ext.commands import CommandError
 import logging
 
+from bot.response_cache import get_response_cache
+
+# Defaults for the "http" section of config.json.
+DEFAULT_OPTIONS = {
+    'limit_per_host': 20,
+    'keepalive_timeout': 30,
+    'use_dns_cache': True,
+    'dns_cache_ttl': 300,
+    'connect_timeout': 5,
+    'total_timeout': 15,
+    'retries': 2,
+    'backoff': 0.25,
+    'hedge': False,
+    'cache': {}
+}
+
+# Errors a GET is retried after.
+RETRY_ERRORS = (ClientError, DisconnectedError, TimeoutError, OSError)
+
+# Request latencies kept per host, and how many are needed before requests
+# to the host are hedged.
+LATENCY_SAMPLES = 200
+HEDGE_MIN_SAMPLES = 20
+
 
 class HTTPStatusError(CommandError):
     def __init__(self, code: int, msg: str, url: str):
@@ -17,37 +49,63 @@ class HTTPStatusError(CommandError):
                 f'\nUrl: {self.url}\nCode: {self.code}\nMessage: {self.msg}')
 
 
-async def get_session_manager(logger):
+async def get_session_manager(logger, options: dict = None):
     """
     Get an instance of SessionManager.
     :param logger: the logger used.
+    :param options: the "http" section of config.json, see DEFAULT_OPTIONS.
     :return: the instance of SessionManager.
     """
-    session = ClientSession()
-    return SessionManager(session, logger)
+    options = dict(DEFAULT_OPTIONS, **(options or {}))
+    connector = TCPConnector(
+        limit=options['limit_per_host'],
+        keepalive_timeout=options['keepalive_timeout'],
+        use_dns_cache=options['use_dns_cache'],
+        conn_timeout=options['connect_timeout']
+    )
+    session = ClientSession(connector=connector)
+    return SessionManager(session, logger, options)
 
 
 class SessionManager:
     """
-    An aiohttp client session manager.
+    An aiohttp client session manager. GETs made through get_bytes and
+        get_json have a total timeout, are retried with jittered backoff and
+        can be hedged with a second attempt when the first is slow.
     """
 
-    def __init__(self, session: ClientSession, logger):
+    def __init__(self, session: ClientSession, logger, options: dict = None):
         """
         Initialize the instance of this class.
+        :param session: the client session.
+        :param logger: the logger.
+        :param options: the "http" section of config.json.
         """
+        options = dict(DEFAULT_OPTIONS, **(options or {}))
         self.session = session
         self.logger = logger
         self.codes = {
             val.value: key
             for key, val in HTTPStatus.__members__.items()
         }
+        self.dns_cache_ttl = options['dns_cache_ttl']
+        self.connect_timeout = options['connect_timeout']
+        self.total_timeout = options['total_timeout']
+        self.retries = options['retries']
+        self.backoff = options['backoff']
+        self.hedge = options['hedge']
+        self.stats = {'requests': 0, 'retries': 0, 'hedged': 0, 'timeouts': 0}
+        self.cache = get_response_cache(options['cache'])
+        self._latencies = {}
+        self._dns_cleared = monotonic()
 
-    def __del__(self):
+    async def close(self):
         """
-        Class destructor, close the client session.
+        Close the client session.
         """
-        self.session.close()
+        result = self.session.close()
+        if isawaitable(result):
+            await result
 
     def get_msg(self, code: int):
         """
@@ -71,20 +129,71 @@ class SessionManager:
         """
         if 200 <= code < 300:
             return res
+        res.close()
         raise HTTPStatusError(code, self.get_msg(code), url)
 
     async def get_json(self, url: str, params: dict = None):
         """
-        Get the json content from an HTTP request.
+        Get the json content from an HTTP request. With the response cache
+            on, fresh responses are returned without a request and stale
+            ones are revalidated with a conditional request.
         :param url: the url.
         :param params: the request params.
         :return: the json content in a dict if success, else the error message.
         :raises HTTPStatusError: if the status code isn't in the 200s
         """
-        res = await self.get(url, params=params)
-        async with res:
-            text = await res.read()
-            return loads(text) if text else None
+        if self.cache is None:
+            _, _, text = await self._fetch(url, params)
+            return loads(text.decode()) if text else None
+
+        key = url + get_query_string(params)
+        entry = self.cache.get(key)
+        if entry and entry.is_fresh():
+            self.cache.stats['hits'] += 1
+            return entry.value
+
+        status, headers, text = await self._fetch(
+            url, params, entry.validators() if entry else None)
+        if status == HTTPStatus.NOT_MODIFIED:
+            self.cache.stats['revalidations'] += 1
+            self.cache.refresh(key, entry, headers)
+            return entry.value
+
+        self.cache.stats['misses'] += 1
+        value = loads(text.decode()) if text else None
+        self.cache.store(key, value, headers)
+        return value
+
+    async def get_bytes(self, url: str, params: dict = None) -> bytes:
+        """
+        Get the body of a GET request, retrying failed attempts.
+        :param url: the url.
+        :param params: the request params.
+        :return: the response body.
+        :raises HTTPStatusError: if the status code isn't in the 200s
+        """
+        _, _, body = await self._fetch(url, params)
+        return body
+
+    async def _fetch(self, url: str, params: dict = None,
+                     headers: dict = None) -> tuple:
+        """
+        Make a GET request, retrying failed attempts.
+        :return: tuple of the status, the headers and the body.
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                return await self._get_hedged(url, params, headers)
+            except HTTPStatusError as e:
+                if e.code < 500:
+                    raise
+                error = e
+            except RETRY_ERRORS as e:
+                error = e
+            if attempt < self.retries:
+                self.stats['retries'] += 1
+                await sleep(uniform(0, self.backoff * 2 ** attempt))
+        raise error
 
     async def get(
             self, url, *, allow_redirects=True, **kwargs) -> ClientResponse:
@@ -102,12 +211,93 @@ class SessionManager:
         if 'params' in kwargs:
             query_url += get_query_string(kwargs['params'])
 
-        self.logger.log(logging.INFO, 'Sending GET request to ' + query_url)
+        self.logger.log(
+            logging.INFO, 'Sending GET request to ' + query_url,
+            extra={'sampled': True})
+
+        if monotonic() - self._dns_cleared > self.dns_cache_ttl:
+            self._dns_cleared = monotonic()
+            self.session.connector.clear_dns_cache()
 
+        # The session timeout covers connecting and reading the headers.
+        kwargs.setdefault('timeout', self.total_timeout)
+        self.stats['requests'] += 1
         r = await self.session.get(
             url, allow_redirects=allow_redirects, **kwargs)
+        if r.status == HTTPStatus.NOT_MODIFIED and kwargs.get('headers'):
+            # The answer to a conditional request.
+            return r
         return self.return_response(r, r.status, url)
 
+    async def _get_once(self, url: str, params: dict, headers: dict) -> tuple:
+        """
+        One attempt at a GET, limited to the total timeout.
+        """
+        start = monotonic()
+        try:
+            result = await wait_for(
+                self._read(url, params, headers), self.total_timeout)
+        except TimeoutError:
+            self.stats['timeouts'] += 1
+            raise
+        latencies = self._latencies.setdefault(
+            urlsplit(url).netloc, deque(maxlen=LATENCY_SAMPLES))
+        latencies.append(monotonic() - start)
+        return result
+
+    async def _read(self, url: str, params: dict, headers: dict) -> tuple:
+        resp = await self.get(url, params=params, headers=headers)
+        async with resp:
+            return resp.status, resp.headers, await resp.read()
+
+    async def _get_hedged(
+            self, url: str, params: dict, headers: dict) -> tuple:
+        """
+        Start a second attempt if the first takes longer than the 95th
+            percentile latency of the host, and use whichever succeeds
+            first.
+        """
+        delay = self._hedge_delay(url)
+        if delay is None:
+            return await self._get_once(url, params, headers)
+
+        first = ensure_future(self._get_once(url, params, headers))
+        done, _ = await wait([first], timeout=delay)
+        if done:
+            return first.result()
+
+        self.stats['hedged'] += 1
+        second = ensure_future(self._get_once(url, params, headers))
+        tasks = [first, second]
+        try:
+            while tasks:
+                done, pending = await wait(tasks, return_when=FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                tasks = list(pending)
+            return first.result()
+        finally:
+            for task in (first, second):
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    # Retrieve the error so it is not logged as unhandled.
+                    task.exception()
+
+    def _hedge_delay(self, url: str):
+        """
+        :return: the 95th percentile latency of the url host, or None if
+            requests to it should not be hedged.
+        """
+        if not self.hedge:
+            return None
+        latencies = self._latencies.get(urlsplit(url).netloc)
+        if not latencies or len(latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(latencies)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
 
 def get_query_string(params) -> str:
     """
@@ -3,5 +3,6 @@ from commands.album_commands import Album
 from commands.scout_commands import Play
 from commands.stats_commands import Stats
 from commands.config_commands import Config
+from commands.admin_commands import Admin
 
-__all__ = ['Play', 'Album', 'Info', 'Stats', 'Config']
+__all__ = ['Play', 'Album', 'Info', 'Stats', 'Config', 'Admin']
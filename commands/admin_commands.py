@@ -0,0 +1,200 @@
+from time import time
+
+from discord.ext import commands
+
+from bot import HahaNo4Star
+from bot.metrics import metrics
+from bot.profiler import profiler, summarize
+from core.checks import check_mongo, check_owner
+from core.memory import caches, memory_tracer
+from data_controller.archive import DEFAULT_INACTIVE_DAYS
+from logs import log_path
+
+# Commands with a phase breakdown in the metrics command.
+MAX_METRICS_COMMANDS = 5
+
+# Default and longest profile in seconds.
+DEFAULT_PROFILE_SECONDS = 30
+MAX_PROFILE_SECONDS = 600
+
+# Folders of the functions in the profile summary.
+PROFILE_FOLDERS = ('core', 'data_controller')
+
+
+class Admin:
+    """
+    A class to hold commands for the owners of the bot.
+    """
+
+    def __init__(self, bot: HahaNo4Star):
+        self.bot = bot
+
+    @commands.command(pass_context=True, hidden=True)
+    @commands.check(check_owner)
+    @commands.check(check_mongo)
+    async def archive(self, ctx, *args: str):
+        """
+        Description: |
+            Moves the albums of inactive users to the compressed archive.
+            Without "run" only reports what would be archived.
+            For example, !archive 180 run
+
+        Optional Arguments: |
+            Days without plays (default 365)
+            run
+        """
+        days = DEFAULT_INACTIVE_DAYS
+        for arg in args:
+            if arg.isdigit():
+                days = int(arg)
+        dry_run = 'run' not in args
+
+        report = await self.bot.db.users.archive_inactive_users(days, dry_run)
+        saved = report['album_bytes'] - report['archive_bytes']
+        action = 'Would archive' if dry_run else 'Archived'
+        await self.bot.say(
+            f"{action} {report['users']} users inactive for {days} days "
+            f"with {report['cards']} album cards.\n"
+            f"Album size: {_format_bytes(report['album_bytes'])}, "
+            f"archived: {_format_bytes(report['archive_bytes'])}, "
+            f"saved: {_format_bytes(saved)}."
+        )
+
+    @commands.command(name='metrics', pass_context=True, hidden=True)
+    @commands.check(check_owner)
+    async def show_metrics(self, ctx, *args: str):
+        """
+        Description: |
+            Shows the latency of each command since the bot started and
+            the phases its time is spent in.
+        """
+        rows = metrics.summary('command_seconds', 'command')
+        if not rows:
+            await self.bot.say('No commands timed yet.')
+            return
+
+        tables = [_format_table('command', rows)]
+        for command, *_ in rows[:MAX_METRICS_COMMANDS]:
+            phases = metrics.summary(
+                'phase_seconds', 'phase', command=command)
+            if phases:
+                tables.append(_format_table(command, phases))
+        await self.bot.say('```\n' + '\n\n'.join(tables) + '\n```')
+
+    @commands.command(pass_context=True, hidden=True)
+    @commands.check(check_owner)
+    async def profile(self, ctx, *args: str):
+        """
+        Description: |
+            Profiles the bot for a number of seconds, or until a number of
+            commands have finished. The stats are saved to the logs folder
+            and a summary is posted to the error log channel.
+            For example, !profile 60 or !profile 20 commands
+
+        Optional Arguments: |
+            Seconds or commands (default 30 seconds)
+            commands
+        """
+        number = DEFAULT_PROFILE_SECONDS
+        for arg in args:
+            if arg.isdigit():
+                number = int(arg)
+        if 'commands' in args:
+            seconds, count = MAX_PROFILE_SECONDS, number
+            target = f'{count} commands'
+        else:
+            seconds, count = min(number, MAX_PROFILE_SECONDS), 0
+            target = f'{seconds} seconds'
+
+        if profiler.active:
+            await self.bot.say('A profile is already being taken.')
+            return
+        await self.bot.say(f'Profiling for {target}.')
+        stats = await profiler.run(seconds, count)
+
+        path = log_path.joinpath(f'profile-{int(time())}.pstats')
+        stats.dump_stats(str(path))
+        rows = summarize(stats, PROFILE_FOLDERS)
+        lines = [f'{"calls":>8}{"tottime":>9}{"cumtime":>9}  function']
+        for calls, total, cumulative, function in rows:
+            lines.append(
+                f'{calls:>8}{total:>9.3f}{cumulative:>9.3f}  {function[-60:]}')
+        await self.bot.send_message(
+            self.bot.error_log,
+            f'**PROFILE** {target}, saved to {path.name}\n'
+            '```\n' + '\n'.join(lines) + '\n```'
+        )
+        await self.bot.say(f'Profile saved to {path.name}.')
+
+    @commands.command(pass_context=True, hidden=True)
+    @commands.check(check_owner)
+    async def memory(self, ctx, *args: str):
+        """
+        Description: |
+            Shows the size of every cache. While tracing, also shows the
+            allocation sites that grew the most since the baseline.
+            "start" starts tracing, "reset" takes a new baseline and "stop"
+            stops tracing.
+
+        Optional Arguments: |
+            start, reset or stop
+        """
+        if 'start' in args:
+            memory_tracer.start()
+        elif 'reset' in args and memory_tracer.tracing:
+            memory_tracer.reset()
+        elif 'stop' in args:
+            memory_tracer.stop()
+
+        lines = [f'{"cache":<16}{"entries":>9}{"size":>11}']
+        for name, entries, size in caches.report():
+            entries = '-' if entries is None else entries
+            lines.append(f'{name:<16}{entries:>9}{_format_bytes(size):>11}')
+
+        if memory_tracer.tracing:
+            lines.append('\nGrowth since baseline')
+            for diff in await memory_tracer.top_growth():
+                frame = diff.traceback[0]
+                lines.append(
+                    f'{_format_bytes(diff.size_diff):>10} '
+                    f'{diff.count_diff:>+8}  '
+                    f'{frame.filename[-40:]}:{frame.lineno}'
+                )
+        else:
+            lines.append('\nNot tracing allocations.')
+        await self.bot.say('```\n' + '\n'.join(lines) + '\n```')
+
+
+def _format_table(title: str, rows: list) -> str:
+    """
+    Format a metrics summary as a table.
+    :param title: the header of the first column.
+    :param rows: rows returned by Metrics.summary.
+    :return: the table.
+    """
+    lines = [f'{title:<14}{"count":>7}{"p50":>8}{"p95":>8}{"mean":>8}']
+    for value, count, p50, p95, mean in rows:
+        lines.append(f'{str(value):<14}{count:>7}{_format_seconds(p50):>8}'
+                     f'{_format_seconds(p95):>8}{_format_seconds(mean):>8}')
+    return '\n'.join(lines)
+
+
+def _format_seconds(seconds: float) -> str:
+    if seconds == float('inf'):
+        return '>10s'
+    if seconds < 1:
+        return f'{seconds * 1000:.0f}ms'
+    return f'{seconds:.1f}s'
+
+
+def _format_bytes(size: int) -> str:
+    """
+    Format a number of bytes.
+    :param size: the number of bytes.
+    :return: the size in the largest fitting unit.
+    """
+    for unit in ('B', 'KB', 'MB'):
+        if abs(size) < 1024:
+            return f'{size:.0f} {unit}' if unit == 'B' else f'{size:.1f} {unit}'
+        size /= 1024
+    return f'{size:.1f} GB'
@@ -1,16 +1,24 @@
 import math
+from asyncio import ensure_future
+from io import BytesIO
+from logging import WARN
 from operator import itemgetter
 from posixpath import basename
 from urllib.parse import urlsplit
 from copy import deepcopy
 
-from discord import User
 from discord.ext import commands
 
 from bot import HahaNo4Star
-from core.argument_parser import parse_arguments
+from bot.admission import admission_controller, admitted
+from bot.coalesce import coalesced
+from bot.metrics import metrics
+from core.argument_parser import format_suggestions, parse_arguments, \
+    suggest_arguments
+from core.album_pages import AlbumPage, album_pages, page_key
 from core.checks import check_mongo
 from core.image_generator import create_image, get_one_img, member_img_path
+from core.session_store import AlbumSession, SessionStore
 
 PAGE_SIZE = 16
 ROWS = 4
@@ -26,8 +34,8 @@ SORTS = [
     'instrument'
 ]
 
-# Dictionary mapping user ids to last used album arguments
-_last_user_args = {}
+# Album arguments that are not filters.
+KEYWORDS = set(SORTS + ['all', '+', '-'])
 
 
 class Album:
@@ -35,8 +43,13 @@ class Album:
     A class to hold all album commands.
     """
 
-    def __init__(self, bot: HahaNo4Star):
+    def __init__(self, bot: HahaNo4Star, sessions: SessionStore):
+        """
+        :param bot: the bot.
+        :param sessions: store of the last used album arguments per user.
+        """
         self.bot = bot
+        self.sessions = sessions
 
     async def __send_error_msg(self, ctx, content):
         await self.bot.send_message(
@@ -44,12 +57,11 @@ class Album:
             f'<@{ctx.message.author.id }> ' + content
         )
 
-    async def __handle_album_result(self, ctx, album_size, image):
+    async def __handle_album_result(self, ctx, album_size, image, page):
         if not image:
             await self.__send_error_msg(ctx, 'No matching cards found.')
-            _last_user_args[ctx.message.author.id] = _get_new_user_args()
+            self.sessions.reset(ctx.message.author.id)
         else:
-            page = _last_user_args[ctx.message.author.id]["page"]
             max_page = int(math.ceil(album_size / PAGE_SIZE))
             msg = (f'<@{ctx.message.author.id}> Page {page+1} of {max_page}. '
                    f'`$help album` for more info.')
@@ -76,6 +88,8 @@ class Album:
     @commands.command(pass_context=True, aliases=['a'])
     @commands.cooldown(rate=3, per=2.5, type=commands.BucketType.user)
     @commands.check(check_mongo)
+    @coalesced
+    @admitted
     async def album(self, ctx, *args: str):
         """
         Description: |
@@ -95,21 +109,86 @@ class Album:
             Rarity (1star, 2star, 3star, 4star)
         """
         user = ctx.message.author
-        album = await self.bot.db.users.get_user_album(user.id, True)
-        _parse_album_arguments(self.bot, args, user)
-        album = _apply_filter(album, user)
-        album = _apply_sort(album, user)
+        suggestions = suggest_arguments(self.bot, args, KEYWORDS)
+        if suggestions:
+            await self.__send_error_msg(ctx, format_suggestions(suggestions))
+            return
+
+        session = self.sessions.get_or_create(user.id)
+        _parse_album_arguments(self.bot, args, session)
+
+        # Read the version before the album, see AlbumPageCache.version.
+        version = album_pages.version(user.id)
+        key = page_key(
+            user.id, version, session.filters, session.sort, session.page)
+        cached = album_pages.get(key)
+        if cached:
+            session.page = cached.page
+            await self.__handle_album_result(
+                ctx, cached.album_size, BytesIO(cached.image), cached.page)
+            return
+
+        with metrics.timed('db'):
+            album = await self.bot.db.users.get_user_album(user.id, True)
+        album = _apply_filter(album, session)
+        album = _apply_sort(album, session)
         filtered_album_size = len(album)
-        album = _splice_page(album, user)
+        page = _splice_page(album, session)
 
         image = await create_image(
-            self.bot.session_manager, album, ROWS, True, True
-        ) if len(album) > 0 else None
-        await self.__handle_album_result(ctx, filtered_album_size, image)
+            self.bot.session_manager, page, ROWS, True, True
+        ) if len(page) > 0 else None
+        if image:
+            album_pages.put(key, AlbumPage(
+                image.getvalue(), filtered_album_size, session.page))
+        await self.__handle_album_result(
+            ctx, filtered_album_size, image, session.page)
+        if image and album_pages.prefetch:
+            self.__prefetch_next_page(user.id, version, session, album)
+
+    def __prefetch_next_page(self, user_id: str, version: int,
+                             session: AlbumSession, album: list):
+        """
+        Render the page after the one just sent in the background, if a
+            turn is free when rendering starts.
+        :param user_id: the user id.
+        :param version: the album version the album was read at.
+        :param session: the album session of the user.
+        :param album: the filtered and sorted album.
+        """
+        page = session.page + 1
+        if page * PAGE_SIZE >= len(album):
+            return
+        key = page_key(user_id, version, session.filters, session.sort, page)
+        if album_pages.get(key) is None:
+            ensure_future(self.__render_page(key, album, page))
+
+    async def __render_page(self, key: tuple, album: list, page: int):
+        """
+        Render a page of an album into the page cache.
+        :param key: the page cache key.
+        :param album: the filtered and sorted album.
+        :param page: the page number.
+        """
+        # Counts against the admission limit, but never waits for a turn.
+        if not admission_controller.try_acquire():
+            return
+        cards = album[PAGE_SIZE * page:PAGE_SIZE * (page + 1)]
+        try:
+            image = await create_image(
+                self.bot.session_manager, cards, ROWS, True, True)
+        except Exception as e:
+            self.bot.logger.log(WARN, f'Prefetching album page failed: {e}')
+            return
+        finally:
+            admission_controller.release()
+        album_pages.put(key, AlbumPage(image.getvalue(), len(album), page))
 
     @commands.command(pass_context=True, aliases=['v'])
     @commands.cooldown(rate=3, per=2.5, type=commands.BucketType.user)
     @commands.check(check_mongo)
+    @coalesced
+    @admitted
     async def view(self, ctx, *args: str):
         """
         Description: |
@@ -132,7 +211,9 @@ class Album:
                 trained = True
 
         image = None
-        card = await self.bot.db.users.get_card_from_album(user.id, card_id)
+        with metrics.timed('db'):
+            card = await self.bot.db.users.get_card_from_album(
+                user.id, card_id)
 
         if card:
             img_url = None
@@ -150,17 +231,17 @@ class Album:
         await self.__handle_view_result(ctx, image)
 
 
-def _apply_filter(album: list, user: User):
+def _apply_filter(album: list, session: AlbumSession):
     """
     Applys a user's filters to a card album, removing anything not matching
         the filter.
 
     :param album: Album being filtered.
-    :param user: User who requested the album.
+    :param session: Album session of the user who requested the album.
 
     :return: Filtered album.
     """
-    filters = _last_user_args[user.id]['filters']
+    filters = session.filters
 
     for filter_type in filters:
         filter_values = filters[filter_type]
@@ -171,28 +252,25 @@ def _apply_filter(album: list, user: User):
         # Looping backwards since we are removing elements
         for i in range(len(album) - 1, -1, -1):
             # Generic case
-            print(filter_type)
-            print(filter_values)
-            print(album[i])
             if album[i][filter_type] not in filter_values:
                 album.pop(i)
 
     return album
 
 
-def _apply_sort(album: list, user: User) -> list:
+def _apply_sort(album: list, session: AlbumSession) -> list:
     """
     Applys a user's sort to a card album.
 
     :param album: Album being sorted.
-    :param user: User who requested the album.
+    :param session: Album session of the user who requested the album.
 
     :return: Sorted album.
     """
-    sort = _last_user_args[user.id]['sort']
+    sort = session.sort
 
     # FIXME This var doesn't seem to have any use.
-    order = _last_user_args[user.id]['order']
+    order = session.order
 
     if not sort:
         return album
@@ -218,48 +296,44 @@ def _apply_sort(album: list, user: User) -> list:
     return sorted(album, key=itemgetter(sort, 'id'), reverse=sort_descending)
 
 
-def _splice_page(album: list, user: User) -> list:
+def _splice_page(album: list, session: AlbumSession) -> list:
     """
     Splices a user's last requested page out of their album.
 
     :param album: Album being spliced
-    :param user: User who requested the album.
+    :param session: Album session of the user who requested the album.
 
     :return: Spliced album.
     """
-    page = _last_user_args[user.id]['page']
+    page = session.page
     max_page = int(math.ceil(len(album) / PAGE_SIZE)) - 1
 
     if page > max_page:
         page = max_page
     if page < 0:
         page = 0
-    _last_user_args[user.id]['page'] = page
+    session.page = page
 
     start = PAGE_SIZE * page
     end = (PAGE_SIZE * page) + PAGE_SIZE
     return album[start:end]
 
 
-def _parse_album_arguments(bot, args: tuple, user: User):
+def _parse_album_arguments(bot, args: tuple, session: AlbumSession):
     """
     Parse arguments to get how an album will be sorted and filtered. The parsed
-        arguments are stored in the user's last used arguments dictionary.
+        arguments are stored in the user's album session.
 
     :param args: Tuple of arguments.
-    :param user: User who requested the album.
+    :param session: Album session of the user who requested the album.
     """
-    # Add user to last used argument dictionary if they don't already exist.
-    if user.id not in _last_user_args:
-        _last_user_args[user.id] = _get_new_user_args()
-
     # Get values of user's last album preview.
-    page = _last_user_args[user.id]['page']
-    filters = _last_user_args[user.id]['filters']
-    sort = _last_user_args[user.id]['sort']
+    page = session.page
+    filters = session.filters
+    sort = session.sort
 
     # FIXME This var doesn't seem to have any use.
-    order = _last_user_args[user.id]['order']
+    order = session.order
 
     new_filters = parse_arguments(bot, args, True)
     if _has_filter(new_filters):
@@ -294,26 +368,9 @@ def _parse_album_arguments(bot, args: tuple, user: User):
         if _is_number(arg):
             page = int(arg) - 1
 
-        _last_user_args[user.id]['page'] = page
-        _last_user_args[user.id]['filters'] = filters
-        _last_user_args[user.id]['sort'] = sort
-
-
-def _get_new_user_args():
-    args = {
-        'page': 0,
-        'filters': {
-            'name': [],
-            'i_band': [],
-            'i_school_year': [],
-            'i_attribute': [],
-            'i_rarity': [],
-            'instrument': []
-        },
-        'sort': None,
-        'order': None  # Sort by ID if None
-    }
-    return args
+        session.page = page
+        session.set_filters(filters)
+        session.sort = sort
 
 
 def _has_filter(filters: dict) -> bool:
@@ -1,9 +1,30 @@
+from collections import Counter
+from math import ceil
+
+from discord import Embed
 from discord.ext import commands
 
 from bot import HahaNo4Star
-from core.scout_handler import PlayHandler, PlayImage
+from bot.admission import admitted
+from bot.metrics import metrics
+from core.argument_parser import format_suggestions, parse_arguments, \
+    suggest_arguments
+from core.banner import DATE_FORMAT, banner_sampler
+from core.odds import odds_calculator
+from core.play_query import query_key
+from core.scout_handler import BLOCK_SIZE, RATES, PlayHandler, PlayImage
 from core.checks import check_mongo
 
+# Number of plays on each page of the play history.
+HISTORY_PAGE_SIZE = 10
+
+# Default and largest number of cards in a bulk play.
+DEFAULT_BULK_COUNT = 100
+MAX_BULK_COUNT = 1000
+
+# Stars spent on a 10 play.
+STARS_PER_PLAY = 250
+
 
 class Play:
     """
@@ -13,13 +34,30 @@ class Play:
     def __init__(self, bot: HahaNo4Star):
         self.bot = bot
 
-    async def __handle_result(self, ctx, results, image: PlayImage):
+    async def __check_arguments(self, ctx, args: tuple,
+                                ignore: tuple = ()) -> bool:
+        """
+        Check for misspelled arguments and suggest corrections.
+        :param ctx: the context.
+        :param args: the play arguments.
+        :param ignore: arguments that are not filters.
+        :return: True if the play should go ahead.
+        """
+        suggestions = suggest_arguments(self.bot, args, ignore)
+        if not suggestions:
+            return True
+        msg = format_suggestions(suggestions)
+        await self.bot.say(f'<@{ctx.message.author.id}> {msg}')
+        return False
+
+    async def __handle_result(self, ctx, play: PlayHandler, image: PlayImage):
         """
         Handle a play result.
         :param ctx: the context.
-        :param results: the play results.
+        :param play: the play.
         :param image: play image result.
         """
+        results = play.results
         if not image:
             msg = (f'<@{ctx.message.author.id}> '
                    f'A transmission error occured. No cards found!')
@@ -30,14 +68,52 @@ class Play:
             content=f'<@{ctx.message.author.id}>'
         )
 
-        if not await self.bot.db.users.find_user(ctx.message.author.id):
-            await self.bot.db.users.insert_user(ctx.message.author.id)
-        await self.bot.db.users.add_to_user_album(
-                ctx.message.author.id, results)
+        with metrics.timed('db'):
+            self.bot.db.plays.record(ctx.message.author.id, play.box, results)
+            if not await self.bot.db.users.find_user(ctx.message.author.id):
+                await self.bot.db.users.insert_user(ctx.message.author.id)
+            await self.bot.db.users.add_to_user_album(
+                    ctx.message.author.id, results)
+
+    async def __handle_bulk_result(self, ctx, play: PlayHandler,
+                                   image: PlayImage):
+        """
+        Handle a bulk play result.
+        :param ctx: the context.
+        :param play: the play.
+        :param image: image of the 3 and 4 star cards, if any.
+        """
+        user_id = ctx.message.author.id
+        results = play.results
+        if not results:
+            msg = (f'<@{user_id}> '
+                   f'A transmission error occured. No cards found!')
+            await self.bot.say(msg)
+            return
+
+        rarities = Counter(card['i_rarity'] for card in results)
+        desc = '\n'.join(
+            f'{rarity} star cards: {rarities[rarity]}'
+            for rarity in sorted(rarities, reverse=True)
+        )
+        emb = Embed(
+            title=f'{len(results)} card play', description=desc,
+            colour=self.bot.colour
+        )
+        await self.bot.say(f'<@{user_id}>', embed=emb)
+        if image:
+            await self.bot.upload(image.bytes, filename=image.name)
+
+        with metrics.timed('db'):
+            self.bot.db.plays.record(user_id, play.box, results)
+            if not await self.bot.db.users.find_user(user_id):
+                await self.bot.db.users.insert_user(user_id)
+            await self.bot.db.users.add_to_user_album(user_id, results)
 
     @commands.command(pass_context=True, aliases=['1play', 'play'])
     @commands.cooldown(rate=5, per=2.5, type=commands.BucketType.user)
     @commands.check(check_mongo)
+    @admitted
     async def play1(self, ctx, *args: str):
         """
         Description: |
@@ -51,14 +127,17 @@ class Play:
             Year (first, second, third)
             Instrument(vocals, drums, guitar, bass, dj, keytar, keyboard)
         """
+        if not await self.__check_arguments(ctx, args):
+            return
         play = PlayHandler(
             self.bot, ctx.message.author, 'star', 1, False, args)
         image = await play.do_scout()
-        await self.__handle_result(ctx, play.results, image)
+        await self.__handle_result(ctx, play, image)
 
     @commands.command(pass_context=True, aliases=['10play'])
     @commands.cooldown(rate=3, per=2.5, type=commands.BucketType.user)
     @commands.check(check_mongo)
+    @admitted
     async def play10(self, ctx, *args: str):
         """
         Description: |
@@ -72,14 +151,17 @@ class Play:
             Year (first, second, third)
             Instrument(vocals, drums, guitar, bass, dj, keytar, keyboard)
         """
+        if not await self.__check_arguments(ctx, args):
+            return
         play = PlayHandler(
             self.bot, ctx.message.author, 'star', 10, True, args)
         image = await play.do_scout()
-        await self.__handle_result(ctx, play.results, image)
+        await self.__handle_result(ctx, play, image)
 
     @commands.command(pass_context=True, aliases=['5play'])
     @commands.cooldown(rate=3, per=2.5, type=commands.BucketType.user)
     @commands.check(check_mongo)
+    @admitted
     async def play5(self, ctx, *args: str):
         """
         Description: |
@@ -93,14 +175,17 @@ class Play:
             Year (first, second, third)
             Instrument(vocals, drums, guitar, bass, dj, keytar, keyboard)
         """
+        if not await self.__check_arguments(ctx, args):
+            return
         play = PlayHandler(
             self.bot, ctx.message.author, 'star', 5, True, args)
         image = await play.do_scout()
-        await self.__handle_result(ctx, play.results, image)
+        await self.__handle_result(ctx, play, image)
 
     @commands.command(pass_context=True, aliases=['10playdf'])
     @commands.cooldown(rate=3, per=2.5, type=commands.BucketType.user)
     @commands.check(check_mongo)
+    @admitted
     async def playdf10(self, ctx, *args: str):
         """
         Description: |
@@ -114,14 +199,17 @@ class Play:
             Year (first, second, third)
             Instrument(vocals, drums, guitar, bass, dj, keytar, keyboard)
         """
+        if not await self.__check_arguments(ctx, args):
+            return
         play = PlayHandler(
             self.bot, ctx.message.author, 'df', 10, True, args)
         image = await play.do_scout()
-        await self.__handle_result(ctx, play.results, image)
+        await self.__handle_result(ctx, play, image)
 
     @commands.command(pass_context=True, aliases=['1playdf', 'playdf'])
     @commands.cooldown(rate=5, per=2.5, type=commands.BucketType.user)
     @commands.check(check_mongo)
+    @admitted
     async def playdf1(self, ctx, *args: str):
         """
         Description: |
@@ -135,7 +223,188 @@ class Play:
             Year (first, second, third)
             Instrument(vocals, drums, guitar, bass, dj, keytar, keyboard)
         """
+        if not await self.__check_arguments(ctx, args):
+            return
         play = PlayHandler(
             self.bot, ctx.message.author, 'df', 1, False, args)
         image = await play.do_scout()
-        await self.__handle_result(ctx, play.results, image)
\ No newline at end of file
+        await self.__handle_result(ctx, play, image)
+
+    @commands.command(pass_context=True, aliases=['bulkplay'])
+    @commands.cooldown(rate=1, per=30, type=commands.BucketType.user)
+    @commands.check(check_mongo)
+    @admitted
+    async def playbulk(self, ctx, *args: str):
+        """
+        Description: |
+            Plays many cards at once in 10 plays with guaranteed 3 Star.
+            Only the 3 and 4 star cards are shown.
+            For example, !playbulk 200 roselia
+
+            **Rates:** 2star: 88.5%, 3star: 8.5%, 4star: 3.0%
+        Optional Arguments: |
+            Number of cards (10, 20, ..., 1000, default 100)
+            Main unit name (Poppin' Party, Afterglow)
+            Idol first name (Kasumi, Ran, ...)
+            Attribute (powerful, pure, cool, happy)
+            Year (first, second, third)
+            Instrument(vocals, drums, guitar, bass, dj, keytar, keyboard)
+        """
+        if not await self.__check_arguments(ctx, args):
+            return
+        play = PlayHandler(
+            self.bot, ctx.message.author, 'star', _get_bulk_count(args),
+            True, args)
+        image = await play.do_bulk_scout()
+        await self.__handle_bulk_result(ctx, play, image)
+
+    @commands.command(pass_context=True)
+    @commands.cooldown(rate=3, per=10, type=commands.BucketType.user)
+    async def banner(self, ctx, *args: str):
+        """
+        Description: |
+            Shows the current banner and its rate up cards.
+        """
+        banner = banner_sampler.get_active_banner()
+        if not banner:
+            await self.bot.say(
+                f'<@{ctx.message.author.id}> There is no banner right now.')
+            return
+
+        card_ids = ', '.join(str(card_id) for card_id in sorted(banner.weights))
+        desc = (f'Ends {banner.end.strftime(DATE_FORMAT)}\n'
+                f'Rate up cards: {card_ids}')
+        emb = Embed(title=banner.name, description=desc, colour=self.bot.colour)
+        await self.bot.say(embed=emb)
+
+    @commands.command(pass_context=True, aliases=['chance'])
+    @commands.cooldown(rate=3, per=10, type=commands.BucketType.user)
+    @commands.check(check_mongo)
+    async def odds(self, ctx, *args: str):
+        """
+        Description: |
+            Shows how many 10 plays it takes to get a card, or every card
+            matching the given filters.
+            For example, !odds 512, !odds roselia 4star or !odds df kasumi
+
+        Optional Arguments: |
+            Card ID
+            DreamFes rates (df)
+            Rarity (2star, 3star, 4star, default all)
+            Main unit name (Poppin' Party, Afterglow)
+            Idol first name (Kasumi, Ran, ...)
+            Attribute (powerful, pure, cool, happy)
+            Year (first, second, third)
+            Instrument(vocals, drums, guitar, bass, dj, keytar, keyboard)
+        """
+        user_id = ctx.message.author.id
+        if not await self.__check_arguments(ctx, args, ('df',)):
+            return
+
+        box = 'df' if 'df' in args else 'star'
+        parsed = parse_arguments(self.bot, args, True)
+        card_ids = [int(arg) for arg in args if arg.isdigit()]
+        if card_ids:
+            target = card_ids[0]
+            title = f'Card {target}'
+        else:
+            target = tuple(parsed.get('i_rarity') or
+                           (r for r in RATES[box] if RATES[box][r] > 0))
+            title = 'Every ' + '/'.join(f'{r} star' for r in target) + ' card'
+
+        odds = await odds_calculator.get_odds(
+            self.bot.db.cards, RATES[box], query_key(parsed), 10, True, target)
+        if not odds:
+            await self.bot.say(f'<@{user_id}> No cards found.')
+            return
+
+        desc = (f"Cards: {odds['cards']}\n"
+                f"Average: {_format_plays(odds['mean'])}\n")
+        desc += '\n'.join(
+            f'{q}% of players: {_format_plays(n)}'
+            for q, n in sorted(odds['percentiles'].items())
+        )
+        if odds['simulated']:
+            desc += f"\n\nSimulated with {odds['simulated']} players."
+        emb = Embed(
+            title=f"{title} in {'DreamFes ' if box == 'df' else ''}10 plays",
+            description=desc, colour=self.bot.colour
+        )
+        await self.bot.say(f'<@{user_id}>', embed=emb)
+
+    @commands.command(pass_context=True, aliases=['h'])
+    @commands.cooldown(rate=3, per=10, type=commands.BucketType.user)
+    @commands.check(check_mongo)
+    async def history(self, ctx, *args: str):
+        """
+        Description: |
+            View your most recent plays.
+            For example, !history or !history 2
+
+        Optional Arguments: |
+            Page (1, 2, 3, ...)
+        """
+        user_id = ctx.message.author.id
+        page = 0
+        for arg in args:
+            if arg.isdigit():
+                page = max(int(arg) - 1, 0)
+
+        plays = await self.bot.db.plays.get_history(
+            user_id, page, HISTORY_PAGE_SIZE)
+        if not plays:
+            await self.bot.say(f'<@{user_id}> No plays found.')
+            return
+
+        desc = '\n'.join(_format_history_entry(entry) for entry in plays)
+        emb = Embed(
+            title=f'Plays for {ctx.message.author.name}, page {page + 1}',
+            description=desc, colour=self.bot.colour
+        )
+        await self.bot.say(embed=emb)
+
+
+def _format_history_entry(entry: dict) -> str:
+    """
+    Format a play from the journal for the history command.
+    :param entry: the play.
+    :return: a line with the time, size and best cards of the play.
+    """
+    rarities = Counter(entry['rarities'])
+    stars = ', '.join(
+        f'{rarities[r]}x {r} star' for r in sorted(rarities, reverse=True))
+    four_stars = [
+        str(card_id)
+        for card_id, rarity in zip(entry['cards'], entry['rarities'])
+        if rarity == 4
+    ]
+    line = (f"`{entry['time'].strftime('%Y-%m-%d %H:%M')}` "
+            f"{len(entry['cards'])} cards: {stars}")
+    if four_stars:
+        line += f" (4 star: {', '.join(four_stars)})"
+    return line
+
+
+def _format_plays(cards: float) -> str:
+    """
+    Format a number of cards played as 10 plays.
+    :param cards: the number of cards played.
+    :return: the number of 10 plays and stars spent.
+    """
+    plays = ceil(cards / 10)
+    return f'{plays} plays ({plays * STARS_PER_PLAY} stars)'
+
+
+def _get_bulk_count(args: tuple) -> int:
+    """
+    Get the number of cards in a bulk play from its arguments.
+
+    :param args: the play arguments.
+    :return: the first number given, rounded down to a multiple of 10 and
+        limited to MAX_BULK_COUNT.
+    """
+    for arg in args:
+        if arg.isdigit():
+            count = int(arg) - int(arg) % BLOCK_SIZE
+            return min(max(count, BLOCK_SIZE), MAX_BULK_COUNT)
+    return DEFAULT_BULK_COUNT
@@ -1,7 +1,18 @@
+from datetime import datetime
+
 import discord
 from discord.ext import commands
+from core.argument_parser import format_suggestions, parse_arguments, \
+    suggest_arguments
+from core.catalog import catalog, popcount
 from core.checks import check_mongo
+from core.leaderboard import METRICS, leaderboard
+from core.ownership import ownership_index
 from bot import HahaNo4Star
+from bot.coalesce import coalesced
+
+# Most card IDs listed by the compare command.
+MAX_COMPARE_CARDS = 20
 
 class Stats:
     def __init__(self, bot: HahaNo4Star):
@@ -10,6 +21,7 @@ class Stats:
     @commands.command(pass_context=True, aliases=['stats'])
     @commands.cooldown(rate=3, per=10, type=commands.BucketType.user)
     @commands.check(check_mongo)
+    @coalesced
     async def mystats(self, ctx, *args: str):
         """
         Description: |
@@ -36,6 +48,7 @@ class Stats:
     @commands.command(pass_context=True)
     @commands.cooldown(rate=3, per=10, type=commands.BucketType.user)
     @commands.check(check_mongo)
+    @coalesced
     async def botstats(self, ctx, *args: str):
         """
         Description: |
@@ -45,10 +58,145 @@ class Stats:
         stats.append(('Servers', len(self.bot.servers)))
         stats.append(('Users', await self.bot.db.users.get_user_count()))
 
+        today = await self.bot.db.plays.get_daily(datetime.utcnow())
+        if today:
+            stats.append(('Plays today', today['plays']))
+            stats.append(
+                ('4 star cards played today', today['rarities'].get('4', 0)))
+
         emb = _create_embed('My stats', stats)
         await self.bot.send_message(ctx.message.channel, embed=emb)
 
 
+    @commands.command(pass_context=True, aliases=['progress'])
+    @commands.cooldown(rate=3, per=10, type=commands.BucketType.user)
+    @commands.check(check_mongo)
+    async def completion(self, ctx, *args: str):
+        """
+        Description: |
+            Shows how much of each band and rarity you have collected,
+            or how much of the cards matching the given filters.
+            For example, !completion or !completion roselia 4star
+
+        Optional Arguments: |
+            Main unit name (Poppin' Party, Afterglow)
+            Idol first name (Kasumi, Ran, ...)
+            Rarity (1star, 2star, 3star, 4star)
+            Attribute (powerful, pure, cool, happy)
+            Year (first, second, third)
+            Instrument(vocals, drums, guitar, bass, dj, keytar, keyboard)
+        """
+        user_id = ctx.message.author.id
+        suggestions = suggest_arguments(self.bot, args)
+        if suggestions:
+            msg = format_suggestions(suggestions)
+            await self.bot.say(f'<@{user_id}> {msg}')
+            return
+
+        owned = await ownership_index.get(self.bot.db, user_id)
+        parsed = parse_arguments(self.bot, args, True)
+        if any(parsed.values()):
+            masks = [(' '.join(args), catalog.get_mask(parsed))]
+        else:
+            masks = [('All cards', catalog.all_mask)]
+            masks += [
+                (band, catalog.get_mask({'i_band': [band]}))
+                for band in catalog.get_values('i_band')
+            ]
+            masks += [
+                (f'{rarity} star', catalog.get_mask({'i_rarity': [rarity]}))
+                for rarity in catalog.get_values('i_rarity')
+            ]
+
+        stats = [
+            (name, _format_completion(popcount(owned & mask), popcount(mask)))
+            for name, mask in masks
+        ]
+        emb = _create_embed(
+            'Completion for ' + ctx.message.author.name, stats)
+        await self.bot.send_message(ctx.message.channel, embed=emb)
+
+    @commands.command(pass_context=True)
+    @commands.cooldown(rate=3, per=10, type=commands.BucketType.user)
+    @commands.check(check_mongo)
+    async def compare(self, ctx, *args: str):
+        """
+        Description: |
+            Compares your album with another user's album.
+            For example, !compare @user or !compare @user 4star
+
+        Optional Arguments: |
+            Rarity (1star, 2star, 3star, 4star)
+            Main unit name (Poppin' Party, Afterglow)
+            Idol first name (Kasumi, Ran, ...)
+        """
+        user = ctx.message.author
+        if not ctx.message.mentions:
+            await self.bot.say(f'<@{user.id}> Mention a user to compare with.')
+            return
+        other = ctx.message.mentions[0]
+
+        filters = tuple(arg for arg in args if not arg.startswith('<@'))
+        parsed = parse_arguments(self.bot, filters, True)
+        mine = await ownership_index.get(self.bot.db, user.id)
+        theirs = await ownership_index.get(self.bot.db, other.id)
+        mask = catalog.get_mask(parsed)
+        mine &= mask
+        theirs &= mask
+
+        only_theirs = catalog.to_ids(theirs & ~mine)
+        stats = [
+            ('Cards you both have', popcount(mine & theirs)),
+            ('Cards only you have', popcount(mine & ~theirs)),
+            (f'Cards only {other.name} has', len(only_theirs)),
+            ('Cards different between you', popcount(mine ^ theirs))
+        ]
+        if only_theirs:
+            listed = ', '.join(
+                str(card_id) for card_id in only_theirs[:MAX_COMPARE_CARDS])
+            if len(only_theirs) > MAX_COMPARE_CARDS:
+                listed += ', ...'
+            stats.append(('Missing from your album', listed))
+
+        emb = _create_embed(f'{user.name} and {other.name}', stats)
+        await self.bot.send_message(ctx.message.channel, embed=emb)
+
+
+    @commands.command(pass_context=True, aliases=['lb', 'top'])
+    @commands.cooldown(rate=3, per=10, type=commands.BucketType.user)
+    @commands.check(check_mongo)
+    async def leaderboard(self, ctx, *args: str):
+        """
+        Description: |
+            Shows the top collectors, globally or on this server.
+            For example, !leaderboard or !leaderboard 4star server
+
+        Optional Arguments: |
+            Score (unique, 4star, default unique)
+            Board (global, server, default global)
+        """
+        args = [arg.lower() for arg in args]
+        metric = 'four_star' if '4star' in args else 'unique'
+        server = ctx.message.server
+        if 'server' in args and server:
+            entries = await leaderboard.get_server(self.bot.db, server, metric)
+            title = f'Top collectors on {server.name}'
+        else:
+            entries = leaderboard.get_global(metric)
+            title = 'Top collectors'
+
+        if not entries:
+            desc = 'Nobody has collected any cards yet.'
+        else:
+            desc = '\n'.join(
+                f'{i}. <@{user_id}>: {score}'
+                for i, (user_id, score) in enumerate(entries, 1)
+            )
+        emb = discord.Embed(
+            title=f'{title} by {METRICS[metric].lower()}', description=desc)
+        await self.bot.send_message(ctx.message.channel, embed=emb)
+
+
 class AlbumCounter:
     def __init__(self, album):
         self.album = album
@@ -77,6 +225,17 @@ class AlbumCounter:
         self.distinct_count = len(self.album)
 
 
+def _format_completion(owned: int, total: int) -> str:
+    """
+    Format a completion stat.
+
+    :param owned: Number of cards owned.
+    :param total: Number of cards.
+    """
+    percent = owned / total * 100 if total else 0
+    return f'{owned}/{total} ({percent:.1f}%)'
+
+
 def _create_embed(title: str, stats: list):
     """
     Create a stats embed.
@@ -0,0 +1,127 @@
+"""
+Cache of rendered album pages. Pages are keyed by the version of the
+user's album, which changes on every album write, so a page is never
+served after the album it shows has changed.
+"""
+from collections import OrderedDict
+
+from core.memory import caches
+
+
+class AlbumPage:
+    """
+    A rendered album page.
+    """
+    __slots__ = ('image', 'album_size', 'page')
+
+    def __init__(self, image: bytes, album_size: int, page: int):
+        """
+        :param image: The encoded image.
+        :param album_size: Number of cards matching the filters.
+        :param page: The page shown, after clamping to the last page.
+        """
+        self.image = image
+        self.album_size = album_size
+        self.page = page
+
+
+class AlbumPageCache:
+    """
+    A least recently used cache of album pages, bounded by count and bytes.
+    """
+
+    def __init__(self, max_entries: int = 512, max_bytes: int = 64 << 20,
+                 max_users: int = 100000):
+        """
+        Constructor for an AlbumPageCache.
+
+        :param max_entries: Maximum number of pages kept.
+        :param max_bytes: Maximum total size of the page images.
+        :param max_users: Maximum number of album versions tracked.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_users = max_users
+        self.prefetch = False
+        self.size = 0
+        self._pages = OrderedDict()
+        # Users mapped to the sequence number of their last album write.
+        self._versions = OrderedDict()
+        self._sequence = 0
+        # Highest sequence number dropped from _versions. Users without a
+        # version get this one, which is never lower than their last write.
+        self._floor = 0
+
+    def __len__(self):
+        return len(self._pages)
+
+    def configure(self, options: dict):
+        """
+        :param options: The "album_pages" section of config.json.
+        """
+        self.max_entries = options.get('max_entries', self.max_entries)
+        self.max_bytes = options.get('max_bytes', self.max_bytes)
+        self.prefetch = options.get('prefetch', self.prefetch)
+
+    def version(self, user_id: str) -> int:
+        """
+        Get the album version of a user. Read it before reading the album,
+            so a page rendered from an album that changes meanwhile is
+            stored under an outdated version.
+        """
+        return self._versions.get(user_id, self._floor)
+
+    def get(self, key: tuple):
+        """
+        :param key: Tuple of (user ID, album version, filters, sort, page).
+
+        :return: The AlbumPage, or None.
+        """
+        page = self._pages.get(key)
+        if page is not None:
+            self._pages.move_to_end(key)
+        return page
+
+    def put(self, key: tuple, page: AlbumPage):
+        """
+        Cache a page, unless its album has changed since the version in the
+            key was read.
+        """
+        if key[1] != self.version(key[0]) or len(page.image) > self.max_bytes:
+            return
+        old = self._pages.pop(key, None)
+        if old is not None:
+            self.size -= len(old.image)
+        self._pages[key] = page
+        self.size += len(page.image)
+        while len(self._pages) > self.max_entries or \
+                self.size > self.max_bytes:
+            _, dropped = self._pages.popitem(last=False)
+            self.size -= len(dropped.image)
+
+    def on_album_write(self, user_id: str, counts: dict,
+                       scores: dict = None):
+        """
+        Album listener moving a user's album to a new version.
+
+        :param user_id: ID of the user.
+        :param counts: Unused.
+        :param scores: Unused.
+        """
+        self._sequence += 1
+        self._versions[user_id] = self._sequence
+        self._versions.move_to_end(user_id)
+        while len(self._versions) > self.max_users:
+            _, sequence = self._versions.popitem(last=False)
+            self._floor = max(self._floor, sequence)
+
+
+def page_key(user_id: str, version: int, filters: dict, sort: str,
+             page: int) -> tuple:
+    """
+    :return: Cache key of an album page.
+    """
+    return (user_id, version, tuple(sorted(filters.items())), sort, page)
+
+
+album_pages = caches.register('album_pages', AlbumPageCache())
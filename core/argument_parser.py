@@ -1,3 +1,8 @@
+from functools import lru_cache
+
+from bot.metrics import metrics
+from core.fuzzy_index import BKTree, confidence, max_distance
+
 ALIASES = {
     'name': {
         'misaki': 'Michelle',
@@ -61,6 +66,122 @@ ALIASES = {
 }
 
 
+FILTER_TYPES = (
+    'name', 'i_band', 'i_school_year', 'i_attribute', 'i_rarity', 'instrument'
+)
+
+# Keywords that only ever mean one thing, other matches are ignored.
+EXCLUSIVE = {
+    'first': ('i_school_year', 'First'),
+    'second': ('i_school_year', 'Second'),
+    'third': ('i_school_year', 'Third'),
+    'cool': ('i_attribute', 'Cool'),
+    'happy': ('i_attribute', 'Happy'),
+    'pure': ('i_attribute', 'Pure'),
+    'power': ('i_attribute', 'Power'),
+    'powerful': ('i_attribute', 'Power')
+}
+
+INSTRUMENTS = [
+    'dj', 'drums', 'guitar', 'guitar/vocals', 'keytar', 'bass', 'keyboard'
+]
+
+# Number of distinct argument tuples remembered by the parser.
+MEMO_SIZE = 4096
+
+# Unknown arguments shorter than this are not matched approximately.
+MIN_FUZZY_LENGTH = 3
+
+# Lowest confidence for a "did you mean" suggestion.
+MIN_CONFIDENCE = 0.6
+
+
+class ArgumentIndex:
+    """
+    Maps every known argument token to the filters it stands for. Built once
+        for a list of member names.
+    """
+
+    def __init__(self, member_names: list):
+        """
+        Constructor for an ArgumentIndex.
+
+        :param member_names: List of full member names.
+        """
+        self.member_names = member_names
+        self.tokens = _build_tokens(member_names)
+        self.fuzzy = BKTree(self.tokens)
+        self.parse = lru_cache(maxsize=MEMO_SIZE)(self._parse)
+        self.suggest = lru_cache(maxsize=MEMO_SIZE)(self._suggest)
+
+    def _parse(self, args: tuple) -> tuple:
+        """
+        Parse a tuple of lower case arguments.
+
+        :param args: Tuple of lower case arguments.
+
+        :return: Tuple of (arg_type, sorted tuple of values) for every
+            filter type.
+        """
+        found = {arg_type: set() for arg_type in FILTER_TYPES}
+        for arg in args:
+            for arg_type, arg_value in self.tokens.get(arg, ()):
+                found[arg_type].add(arg_value)
+        return tuple(
+            (arg_type, tuple(sorted(found[arg_type])))
+            for arg_type in FILTER_TYPES
+        )
+
+    def _suggest(self, arg: str) -> tuple:
+        """
+        Find the known arguments closest to an unknown lower case argument.
+
+        :param arg: A lower case argument.
+
+        :return: Tuple of the closest known arguments, empty if the argument
+            is known or nothing is close enough.
+        """
+        if arg in self.tokens or len(arg) < MIN_FUZZY_LENGTH:
+            return ()
+
+        matches = [
+            (dist, match)
+            for dist, match in self.fuzzy.search(arg, max_distance(arg))
+            if confidence(arg, match, dist) >= MIN_CONFIDENCE
+        ]
+        if not matches:
+            return ()
+        best = matches[0][0]
+        return tuple(match for dist, match in matches if dist == best)
+
+
+_index = None
+
+
+def compile_arguments(member_names: list) -> ArgumentIndex:
+    """
+    Rebuild the argument index, this must be called when members change.
+
+    :param member_names: List of full member names.
+
+    :return: The new argument index.
+    """
+    global _index
+    _index = ArgumentIndex(member_names)
+    return _index
+
+
+def get_index(bot) -> ArgumentIndex:
+    """
+    Get the argument index for the bot's current member names.
+
+    :return: The argument index.
+    """
+    if _index is None or _index.member_names is not bot.member_names:
+        return compile_arguments(bot.member_names)
+    return _index
+
+
 def parse_arguments(bot, args: tuple, 
                     allow_unsupported_lists: bool = False) -> dict:
     """
@@ -70,79 +191,88 @@ def parse_arguments(bot, args: tuple,
     :param allow_unsupported_lists: Whether parameters that the Bang Dream API
         does not allow multiple values of are reduced.
 
-    :return: A list of tuples of (arg_type, arg_value)
+    :return: A dictionary mapping each arg_type to a list of values.
     """
-    parsed_args = {
-        'name': [],
-        'i_band': [],
-        'i_school_year': [],
-        'i_attribute': [],
-        'i_rarity': [],
-        'instrument': []
-    }
+    with metrics.timed('parse'):
+        parsed = get_index(bot).parse(tuple(arg.lower() for arg in args))
+        return {arg_type: list(values) for arg_type, values in parsed}
+
+
+def suggest_arguments(bot, args: tuple, ignore=()) -> list:
+    """
+    Find unknown arguments that look like misspelled known arguments.
+
+    :param args: Tuple of all arguments.
+    :param ignore: Other arguments accepted by the command.
 
-    for arg in args:
-        for arg_type, arg_value in _parse_argument(bot, arg):
-            parsed_args[arg_type].append(arg_value)
+    :return: List of tuples of (argument, tuple of suggestions).
+    """
+    index = get_index(bot)
+    suggestions = []
+    with metrics.timed('parse'):
+        for arg in args:
+            arg = arg.lower()
+            if arg in ignore or arg.lstrip('-').isdigit():
+                continue
+            found = index.suggest(arg)
+            if found:
+                suggestions.append((arg, found))
+    return suggestions
 
-    # Covert all values to sets and back to lists to remove duplicates.
-    for arg_type in parsed_args:
-        parsed_args[arg_type] = list(set(parsed_args[arg_type]))
 
-    return parsed_args
+def format_suggestions(suggestions: list) -> str:
+    """
+    Format suggestions into a "did you mean" message.
+
+    :param suggestions: List of tuples of (argument, tuple of suggestions).
+
+    :return: The message.
+    """
+    lines = []
+    for arg, found in suggestions:
+        options = ' or '.join(f'`{s}`' for s in found[:3])
+        lines.append(f'I don\'t know `{arg}`, did you mean {options}?')
+    return '\n'.join(lines)
 
 
-def _parse_argument(bot, arg: str) -> list:
+def _build_tokens(member_names: list) -> dict:
     """
-    Parse user argument.
+    Build the inverted index of argument tokens.
 
-    :param arg: An argument.
+    :param member_names: List of full member names.
 
-    :return: List of tuples of (arg_type, arg_value)
+    :return: Dictionary mapping lower case tokens to tuples of
+        (arg_type, arg_value).
     """
-    arg = arg.lower()
-    found_args = []
+    tokens = {}
 
-    # Check for unit and idol names by alias
+    def add(token, arg_type, arg_value):
+        found = tokens.setdefault(token, [])
+        if (arg_type, arg_value) not in found:
+            found.append((arg_type, arg_value))
+
+    # Unit and idol names by alias
     for key, val in ALIASES.items():
-        search_result = val.get(arg, None)
-        if search_result:
-            found_args.append((key, search_result))
-
-    # Check for names/surnames
-    for full_name in bot.member_names:
-        name_split = full_name.split(' ')
-        if arg.title() in name_split:
-            found_args.append(('name', full_name))
-
-    # Check for years
-    if arg in ('first', 'second', 'third'):
-        return [('i_school_year', arg.title())]
-
-    # Check for attribute
-    if arg in ('cool', 'happy', 'pure'):
-        return [('i_attribute', arg.title())]
-    if arg in ('power, powerful'):
-        return [('i_attribute', 'Power')]
-
-    # Check for instrument
-    instruments = [
-        'dj', 'drums', 'guitar', 'guitar/vocals', 'keytar', 'bass', 'keyboard'
-    ]
-    if arg in instruments:
-        found_args.append(('instrument', arg.title()))
-
-    # Check for rarity
-    if arg.lower() in ALIASES['i_rarity'].items():
-        return [('i_rarity', ALIASES['i_rarity'][arg.lower()])]
-
-    adjusted_args = []
-    for a in range(0, len(found_args)):
-        arg = found_args[a]
-        if arg[0] == 'instrument' and arg[1] == 'Guitar/Vocals':
-            adjusted_args.append(('instrument', 'Vocals'))
-        if arg[0] == 'instrument' and arg[1] == 'Guitar':
-            adjusted_args.append(('instrument', 'Guitar/Vocals'))
-    found_args += adjusted_args
-
-    return found_args
+        for alias, value in val.items():
+            add(alias, key, value)
+
+    # Names/surnames
+    for full_name in member_names:
+        for part in full_name.split(' '):
+            add(part.lower(), 'name', full_name)
+
+    # Instruments
+    for instrument in INSTRUMENTS:
+        add(instrument, 'instrument', instrument.title())
+
+    # Guitarists and vocalists overlap.
+    for found in tokens.values():
+        if ('instrument', 'Guitar/Vocals') in found:
+            found.append(('instrument', 'Vocals'))
+        if ('instrument', 'Guitar') in found:
+            found.append(('instrument', 'Guitar/Vocals'))
+
+    for token, arg in EXCLUSIVE.items():
+        tokens[token] = [arg]
+
+    return {token: tuple(found) for token, found in tokens.items()}
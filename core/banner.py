@@ -0,0 +1,216 @@
+"""
+Banner events that raise the odds of featured cards.
+"""
+import json
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from random import random
+
+from core.memory import caches
+
+DATE_FORMAT = '%Y-%m-%d'
+
+
+class Banner:
+    """
+    A banner event. Featured cards are weighted against a weight of 1 for
+        every other card of the same rarity.
+    """
+    __slots__ = ('name', 'start', 'end', 'weights')
+
+    def __init__(self, name: str, start: datetime, end: datetime,
+                 weights: dict):
+        """
+        Constructor for a Banner.
+
+        :param name: Name of the banner.
+        :param start: Time the banner starts.
+        :param end: Time the banner ends.
+        :param weights: Dictionary mapping featured card IDs to weights.
+        """
+        self.name = name
+        self.start = start
+        self.end = end
+        self.weights = weights
+
+    def is_active(self, now: datetime) -> bool:
+        return self.start <= now < self.end
+
+    @classmethod
+    def from_dict(cls, d: dict):
+        return cls(
+            d['name'],
+            datetime.strptime(d['start'], DATE_FORMAT),
+            datetime.strptime(d['end'], DATE_FORMAT),
+            {int(k): float(v) for k, v in d['rate_up'].items()}
+        )
+
+
+class AliasTable:
+    """
+    Walker's alias method, built with Vose's algorithm. Building is O(n) and
+        every weighted draw is O(1).
+    """
+    __slots__ = ('items', 'prob', 'alias')
+
+    def __init__(self, items: list, weights: list):
+        """
+        Constructor for an AliasTable.
+
+        :param items: Items to draw.
+        :param weights: Positive weight of every item.
+        """
+        n = len(items)
+        total = sum(weights)
+        scaled = [w * n / total for w in weights]
+        prob = [1.0] * n
+        alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1]
+        large = [i for i, p in enumerate(scaled) if p >= 1]
+
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            prob[s] = scaled[s]
+            alias[s] = l
+            scaled[l] += scaled[s] - 1
+            if scaled[l] < 1:
+                small.append(l)
+            else:
+                large.append(l)
+
+        self.items = items
+        self.prob = prob
+        self.alias = alias
+
+    def __len__(self):
+        return len(self.items)
+
+    def draw(self):
+        """
+        :return: A random item.
+        """
+        n = random() * len(self.items)
+        i = int(n)
+        # The fractional part is a second uniform number in [0, 1).
+        if n - i < self.prob[i]:
+            return self.items[i]
+        return self.items[self.alias[i]]
+
+    def draws(self, k: int) -> list:
+        """
+        :param k: Number of draws.
+        :return: List of k random items, drawn with replacement.
+        """
+        draw = self.draw
+        return [draw() for _ in range(k)]
+
+    def sample(self, k: int) -> list:
+        """
+        Draw up to k distinct items. Items already drawn are redrawn a
+            limited number of times.
+
+        :param k: Number of items.
+        :return: List of at most k distinct items.
+        """
+        k = min(k, len(self.items))
+        picked = []
+        seen = set()
+        attempts = k * 10
+        while len(picked) < k and attempts > 0:
+            item = self.draw()
+            attempts -= 1
+            if item not in seen:
+                seen.add(item)
+                picked.append(item)
+        return picked
+
+
+class BannerSampler:
+    """
+    Keeps the banners and an alias table for every banner, query and rarity
+        combination played during a banner.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        """
+        Constructor for a BannerSampler.
+
+        :param max_entries: Maximum number of alias tables kept.
+        """
+        self.max_entries = max_entries
+        self.banners = []
+        self._tables = OrderedDict()
+
+    def __len__(self):
+        return len(self._tables)
+
+    def set_banners(self, banners: list):
+        """
+        Replace the banners and drop all alias tables.
+
+        :param banners: List of banners.
+        """
+        self.banners = banners
+        self._tables.clear()
+
+    def get_active_banner(self) -> Banner:
+        """
+        :return: The first banner running now, or None.
+        """
+        now = datetime.now()
+        for banner in self.banners:
+            if banner.is_active(now):
+                return banner
+        return None
+
+    def get_table(self, key: tuple, rarity: int, pool: list) -> AliasTable:
+        """
+        Get the alias table for a card pool under the active banner.
+
+        :param key: Query key of the pool.
+        :param rarity: Rarity of the pool.
+        :param pool: List of card IDs in the pool.
+
+        :return: The alias table, or None if no banner features any card in
+            the pool.
+        """
+        banner = self.get_active_banner()
+        if not banner:
+            return None
+
+        table_key = (banner.name, key, rarity)
+        entry = self._tables.get(table_key)
+        # Pools are replaced whenever the catalog changes.
+        if entry and entry[0] is pool:
+            self._tables.move_to_end(table_key)
+            return entry[1]
+
+        weights = [banner.weights.get(card_id, 1.0) for card_id in pool]
+        table = None
+        if any(w != 1.0 for w in weights):
+            table = AliasTable(pool, weights)
+        self._tables[table_key] = (pool, table)
+        while len(self._tables) > self.max_entries:
+            self._tables.popitem(last=False)
+        return table
+
+
+def load_banners(path: Path) -> list:
+    """
+    Load banners from a JSON file.
+
+    :param path: Path of a JSON list of banners with a name, start and end
+        date (yyyy-mm-dd) and a rate_up dictionary mapping card IDs to
+        weights.
+
+    :return: List of banners.
+    """
+    if not path.is_file():
+        return []
+    with path.open() as f:
+        return [Banner.from_dict(d) for d in json.load(f)]
+
+
+banner_sampler = caches.register('banner_tables', BannerSampler())
@@ -0,0 +1,143 @@
+"""
+Dense in-memory index of the card catalog. Every card gets a bit position,
+so sets of cards are stored as Python int bitsets.
+"""
+from asyncio import Lock
+
+from core.memory import caches
+from core.play_query import FIELDS
+
+# Filter types with a mask for every value, mapped to the card fields.
+MASK_FIELDS = dict(FIELDS, i_rarity='i_rarity')
+
+
+def popcount(bits: int) -> int:
+    """
+    :return: Number of set bits.
+    """
+    return bin(bits).count('1')
+
+
+def _get_field(card: dict, path: str):
+    for part in path.split('.'):
+        card = card.get(part) if isinstance(card, dict) else None
+    return card
+
+
+class CardCatalog:
+    """
+    Assigns every card a bit position and keeps a mask of the cards with
+        each filter value. Positions are only ever appended, so bitsets stay
+        valid when the catalog is refreshed.
+    """
+
+    def __init__(self):
+        self.version = None
+        # Incremented whenever cards are added to the index.
+        self.generation = 0
+        self.card_ids = []
+        self.positions = {}
+        self.masks = {}
+        self.all_mask = 0
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self.card_ids)
+
+    async def refresh(self, cards):
+        """
+        Rebuild the masks if the card catalog has changed.
+
+        :param cards: Card controller of the bot.
+
+        :return: This catalog.
+        """
+        if self.version == cards.catalog_version:
+            return self
+
+        async with self._lock:
+            if self.version == cards.catalog_version:
+                return self
+            version = cards.catalog_version
+            card_ids = sorted(await cards.get_card_ids())
+            infos = await cards.get_cards(card_ids)
+
+            added = [c for c in card_ids if c not in self.positions]
+            for card_id in added:
+                self.positions[card_id] = len(self.card_ids)
+                self.card_ids.append(card_id)
+            if added:
+                self.generation += 1
+
+            masks = {}
+            all_mask = 0
+            for card in infos:
+                bit = 1 << self.positions[card['_id']]
+                all_mask |= bit
+                for arg_type, field in MASK_FIELDS.items():
+                    key = (arg_type, _get_field(card, field))
+                    masks[key] = masks.get(key, 0) | bit
+
+            self.masks = masks
+            self.all_mask = all_mask
+            self.version = version
+        return self
+
+    def to_bits(self, card_ids) -> int:
+        """
+        :param card_ids: Iterable of card IDs.
+
+        :return: Bitset of the cards, cards not in the index are skipped.
+        """
+        bits = 0
+        positions = self.positions
+        for card_id in card_ids:
+            position = positions.get(card_id)
+            if position is not None:
+                bits |= 1 << position
+        return bits
+
+    def to_ids(self, bits: int) -> list:
+        """
+        :param bits: Bitset of cards.
+
+        :return: List of the card IDs in the bitset.
+        """
+        result = []
+        position = 0
+        while bits:
+            if bits & 1:
+                result.append(self.card_ids[position])
+            bits >>= 1
+            position += 1
+        return result
+
+    def get_mask(self, args: dict) -> int:
+        """
+        Get the mask of cards matching parsed arguments. Cards must match
+            one value of every argument type given.
+
+        :param args: Parsed arguments from parse_arguments.
+
+        :return: Bitset of matching cards.
+        """
+        mask = self.all_mask
+        for arg_type, values in args.items():
+            if arg_type not in MASK_FIELDS or not values:
+                continue
+            type_mask = 0
+            for value in values:
+                type_mask |= self.masks.get((arg_type, value), 0)
+            mask &= type_mask
+        return mask
+
+    def get_values(self, arg_type: str) -> list:
+        """
+        :return: Sorted list of values of a filter type.
+        """
+        return sorted(
+            value for t, value in self.masks if t == arg_type and value
+        )
+
+
+catalog = caches.register('catalog', CardCatalog())
@@ -10,3 +10,14 @@ def check_mongo(ctx):
     if ctx.bot.db:
         return True
     raise NoMongo
+
+
+class NotOwner(CommandError):
+    def __str__(self):
+        return 'Only the owners of the bot can use this command.'
+
+
+def check_owner(ctx):
+    if ctx.message.author.id in ctx.bot.owners:
+        return True
+    raise NotOwner
@@ -0,0 +1,119 @@
+"""
+Approximate string matching for user arguments.
+"""
+
+
+class BKTree:
+    """
+    A Burkhard-Keller tree of words keyed by edit distance. Searching for
+        words within a small distance only visits a fraction of the tree.
+    """
+    __slots__ = ('root', 'size')
+
+    def __init__(self, words=()):
+        """
+        Constructor for a BKTree.
+
+        :param words: Iterable of words to add.
+        """
+        self.root = None
+        self.size = 0
+        for word in words:
+            self.add(word)
+
+    def __len__(self):
+        return self.size
+
+    def add(self, word: str):
+        """
+        Add a word to the tree.
+
+        :param word: Word to add.
+        """
+        if self.root is None:
+            self.root = (word, {})
+            self.size = 1
+            return
+
+        node_word, children = self.root
+        while True:
+            dist = edit_distance(word, node_word)
+            if dist == 0:
+                return
+            child = children.get(dist)
+            if child is None:
+                children[dist] = (word, {})
+                self.size += 1
+                return
+            node_word, children = child
+
+    def search(self, word: str, max_dist: int) -> list:
+        """
+        Find all words within an edit distance of a word.
+
+        :param word: Word to search for.
+        :param max_dist: Maximum edit distance.
+
+        :return: Sorted list of tuples of (distance, word).
+        """
+        if self.root is None:
+            return []
+
+        results = []
+        stack = [self.root]
+        while stack:
+            node_word, children = stack.pop()
+            dist = edit_distance(word, node_word)
+            if dist <= max_dist:
+                results.append((dist, node_word))
+            for child_dist, child in children.items():
+                if dist - max_dist <= child_dist <= dist + max_dist:
+                    stack.append(child)
+        results.sort()
+        return results
+
+
+def edit_distance(a: str, b: str, limit: int = None) -> int:
+    """
+    Compute the Levenshtein distance between two strings.
+
+    :param a: First string.
+    :param b: Second string.
+    :param limit: Stop early once the distance is known to exceed this.
+
+    :return: The edit distance, or a value over limit if it was exceeded.
+    """
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    if limit is not None and len(a) - len(b) > limit:
+        return limit + 1
+
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ca != cb)
+            ))
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def max_distance(word: str) -> int:
+    """
+    The largest edit distance accepted for a word of this length.
+    """
+    return 1 if len(word) <= 5 else 2
+
+
+def confidence(word: str, match: str, dist: int) -> float:
+    """
+    How confident we are that a word was meant to be a match, from 0 to 1.
+    """
+    return 1 - dist / max(len(word), len(match))
@@ -8,6 +8,7 @@ from urllib.parse import urlsplit
 from PIL import Image, ImageDraw, ImageFont
 
 from bot import SessionManager
+from bot.metrics import metrics
 from member_images import member_img_path
 
 CIRCLE_DISTANCE = 10
@@ -35,27 +36,30 @@ async def create_image(session_manager: SessionManager, cards: list,
     num_rows = min((num_rows, len(cards)))
 
     imgs = []
-    for card in cards:
-        image_field = 'image'
-        count_field = 'count'
+    with metrics.timed('compose'):
+        for card in cards:
+            image_field = 'image'
+            count_field = 'count'
 
-        url = card[image_field]
-        url_path = Path(urlsplit(url).path)
-        file_path = member_img_path.joinpath(url_path.name)
-        next_img = Image.open(
-                await get_one_img(url, file_path, session_manager))
+            url = card[image_field]
+            url_path = Path(urlsplit(url).path)
+            file_path = member_img_path.joinpath(url_path.name)
+            next_img = Image.open(
+                    await get_one_img(url, file_path, session_manager))
 
-        if add_labels:
-            texts = [str(card['_id']), str(card[count_field])]
-            next_img = _add_label(
-                    next_img, texts, LABEL_COLOURS[card['i_attribute']])
+            if add_labels:
+                texts = [str(card['_id']), str(card[count_field])]
+                next_img = _add_label(
+                        next_img, texts, LABEL_COLOURS[card['i_attribute']])
 
-        imgs.append(next_img)
+            imgs.append(next_img)
+
+        # Load images
+        image = _build_image(imgs, num_rows, 10, 10, align)
 
     res = BytesIO()
-    # Load images
-    image = _build_image(imgs, num_rows, 10, 10, align)
-    image.save(res, 'PNG')
+    with metrics.timed('encode'):
+        image.save(res, 'PNG')
     return BytesIO(res.getvalue())
 
 
@@ -69,13 +73,13 @@ async def get_one_img(url: str, path: Path,
     :param session_manager: the SessionManager
     :return: a BytesIO of the image.
     """
-    if path.is_file():
-        return BytesIO(path.read_bytes())
-    resp = await session_manager.get(url)
-    async with resp:
+    with metrics.timed('fetch'):
+        if path.is_file():
+            return BytesIO(path.read_bytes())
+        image = await session_manager.get_bytes(url)
         session_manager.logger.log(
-            INFO, 'Saving ' + url + ' to ' + str(path))
-        image = await resp.read()
+            INFO, 'Saving ' + url + ' to ' + str(path),
+            extra={'sampled': True})
         path.write_bytes(image)
         return BytesIO(image)
 
@@ -0,0 +1,150 @@
+"""
+Top collector leaderboards kept in memory and updated on album writes.
+"""
+from bisect import insort
+from collections import OrderedDict
+
+from core.memory import caches
+
+# Leaderboard scores mapped to their display names.
+METRICS = {
+    'unique': 'Unique cards',
+    'four_star': '4 star cards'
+}
+
+
+class TopK:
+    """
+    The k users with the highest score. Scores only ever increase, so a
+        user that drops out never has to be brought back from below.
+    """
+    __slots__ = ('size', '_entries', '_scores')
+
+    def __init__(self, size: int, rows: list = ()):
+        """
+        Constructor for a TopK.
+
+        :param size: Number of users kept.
+        :param rows: Initial list of tuples of (user ID, score).
+        """
+        self.size = size
+        self._entries = []
+        self._scores = {}
+        for user_id, score in rows:
+            self.update(user_id, score)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def update(self, user_id: str, score: int):
+        """
+        Record a user's new score.
+        """
+        old = self._scores.get(user_id)
+        if old is not None:
+            if score == old:
+                return
+            self._entries.remove((-old, user_id))
+        elif len(self._entries) >= self.size and \
+                (-score, user_id) >= self._entries[-1]:
+            return
+
+        insort(self._entries, (-score, user_id))
+        self._scores[user_id] = score
+        if len(self._entries) > self.size:
+            _, dropped = self._entries.pop()
+            del self._scores[dropped]
+
+    def entries(self) -> list:
+        """
+        :return: List of tuples of (user ID, score), best first.
+        """
+        return [(user_id, -score) for score, user_id in self._entries]
+
+
+class Leaderboard:
+    """
+    Global leaderboards for every metric, and server leaderboards built on
+        first use. Reads never touch storage once a board is built.
+    """
+
+    def __init__(self, size: int = 10, max_servers: int = 256):
+        """
+        Constructor for a Leaderboard.
+
+        :param size: Number of users on each board.
+        :param max_servers: Maximum number of server boards kept.
+        """
+        self.size = size
+        self.max_servers = max_servers
+        self._global = {metric: TopK(size) for metric in METRICS}
+        self._servers = OrderedDict()
+
+    def __len__(self):
+        return len(self._servers)
+
+    async def rebuild(self, storage):
+        """
+        Backfill missing scores and load the global boards from the score
+            indexes. Drops all server boards.
+
+        :param storage: Storage backend of the bot.
+        """
+        await storage.users.backfill_scores()
+        for metric in METRICS:
+            rows = await storage.users.get_top_scores(metric, self.size)
+            self._global[metric] = TopK(self.size, rows)
+        self._servers.clear()
+
+    def get_global(self, metric: str) -> list:
+        """
+        :param metric: One of METRICS.
+
+        :return: List of tuples of (user ID, score), best first.
+        """
+        return self._global[metric].entries()
+
+    async def get_server(self, storage, server, metric: str) -> list:
+        """
+        Get the board of a server, building it on first use.
+
+        :param storage: Storage backend of the bot.
+        :param server: The discord server.
+        :param metric: One of METRICS.
+
+        :return: List of tuples of (user ID, score), best first.
+        """
+        key = (server.id, metric)
+        entry = self._servers.get(key)
+        if entry:
+            self._servers.move_to_end(key)
+            return entry[1].entries()
+
+        member_ids = [member.id for member in server.members]
+        rows = await storage.users.get_top_scores(
+            metric, self.size, member_ids)
+        board = TopK(self.size, rows)
+        self._servers[key] = (server, board)
+        while len(self._servers) > self.max_servers:
+            self._servers.popitem(last=False)
+        return board.entries()
+
+    def on_album_write(self, user_id: str, counts: dict,
+                       scores: dict = None):
+        """
+        Album listener updating the boards with a user's new scores.
+
+        :param user_id: ID of the user.
+        :param counts: Unused.
+        :param scores: Dictionary of the user's scores if they changed.
+        """
+        if not scores:
+            return
+        for metric, board in self._global.items():
+            board.update(user_id, scores.get(metric, 0))
+        for (_, metric), (server, board) in self._servers.items():
+            if server.get_member(user_id):
+                board.update(user_id, scores.get(metric, 0))
+
+
+leaderboard = caches.register('leaderboard', Leaderboard())
@@ -0,0 +1,188 @@
+"""
+Memory diagnostics: a registry of the in-process caches with their sizes,
+and tracemalloc snapshots diffed against a baseline.
+"""
+import sys
+import tracemalloc
+from asyncio import get_event_loop, sleep
+from collections import OrderedDict, deque
+from itertools import islice
+from logging import INFO
+
+# Items of a container measured to estimate its size.
+SAMPLE_SIZE = 100
+
+# Packages whose objects are measured through their attributes. Anything
+# else, such as discord objects, is only counted shallowly.
+OWN_PACKAGES = {'bot', 'core', 'data_controller', 'commands'}
+
+SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>')
+)
+
+
+class CacheRegistry:
+    """
+    Named caches and global dictionaries, reported with their number of
+        entries and approximate size.
+    """
+
+    def __init__(self):
+        self._caches = OrderedDict()
+
+    def register(self, name: str, cache):
+        """
+        Register a cache, replacing any cache with the same name.
+
+        :param name: Name shown in reports.
+        :param cache: The cache, counted with len() if it supports it.
+
+        :return: The cache.
+        """
+        self._caches[name] = cache
+        return cache
+
+    def report(self) -> list:
+        """
+        :return: List of tuples of (name, entries, approximate bytes),
+            largest first. Entries is None if the cache has no length.
+        """
+        rows = []
+        for name, cache in self._caches.items():
+            try:
+                entries = len(cache)
+            except TypeError:
+                entries = None
+            rows.append((name, entries, approx_size(cache)))
+        rows.sort(key=lambda row: -row[2])
+        return rows
+
+
+class MemoryTracer:
+    """
+    Takes tracemalloc snapshots and compares them with a baseline.
+    """
+
+    def __init__(self, frames: int = 1):
+        """
+        :param frames: Frames stored per allocation, more frames give
+            longer tracebacks but use more memory.
+        """
+        self.frames = frames
+        self._baseline = None
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self):
+        """
+        Start tracing and take the baseline.
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        self.reset()
+
+    def stop(self):
+        tracemalloc.stop()
+        self._baseline = None
+
+    def reset(self):
+        """
+        Take a new baseline.
+        """
+        self._baseline = _snapshot()
+
+    async def top_growth(self, limit: int = 10) -> list:
+        """
+        Compare a new snapshot with the baseline. The comparison runs in an
+            executor as it can take a while.
+
+        :param limit: Number of allocation sites.
+
+        :return: List of tracemalloc.StatisticDiff, most growth first.
+        """
+        if not self.tracing:
+            return []
+        if self._baseline is None:
+            self.reset()
+        snapshot = _snapshot()
+        diffs = await get_event_loop().run_in_executor(
+            None, snapshot.compare_to, self._baseline, 'lineno')
+        return diffs[:limit]
+
+
+def _snapshot():
+    return tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+
+
+def approx_size(obj, sample: int = SAMPLE_SIZE, seen: set = None) -> int:
+    """
+    Estimate the deep size of an object. Large containers are measured from
+        a sample of their items, and shared objects are counted once.
+
+    :param obj: The object.
+    :param sample: Items of each container measured.
+    :param seen: IDs of the objects already counted.
+
+    :return: Approximate number of bytes.
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+
+    if isinstance(obj, (str, bytes, bytearray, int, float)):
+        return size
+    if isinstance(obj, dict):
+        items = list(islice(obj.items(), sample))
+        if not items:
+            return size
+        measured = sum(approx_size(key, sample, seen) +
+                       approx_size(value, sample, seen)
+                       for key, value in items)
+        return size + measured * len(obj) // len(items)
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        items = list(islice(obj, sample))
+    elif type(obj).__module__.split('.')[0] in OWN_PACKAGES:
+        if hasattr(obj, '__dict__'):
+            return size + approx_size(vars(obj), sample, seen)
+        slots = (getattr(obj, name, None)
+                 for cls in type(obj).__mro__
+                 for name in getattr(cls, '__slots__', ()))
+        return size + sum(approx_size(value, sample, seen)
+                          for value in slots)
+    else:
+        return size
+
+    if not items:
+        return size
+    measured = sum(approx_size(item, sample, seen) for item in items)
+    return size + measured * len(obj) // len(items)
+
+
+async def report_memory(logger, tracer: MemoryTracer, interval: float):
+    """
+    Periodically log the cache sizes and, when tracing, the allocation
+        sites that grew the most since the baseline.
+
+    :param logger: The logger.
+    :param tracer: The memory tracer.
+    :param interval: Seconds between reports.
+    """
+    while True:
+        await sleep(interval)
+        lines = [f'{name}: {entries} entries, {size} bytes'
+                 for name, entries, size in caches.report()]
+        for diff in await tracer.top_growth():
+            lines.append(str(diff))
+        logger.log(INFO, 'Memory report\n' + '\n'.join(lines))
+
+
+caches = CacheRegistry()
+memory_tracer = MemoryTracer()
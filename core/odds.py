@@ -0,0 +1,225 @@
+"""
+Estimates how many plays it takes to get a card or a full set of cards.
+"""
+import math
+from asyncio import get_event_loop
+from collections import OrderedDict
+from random import random
+from time import perf_counter, time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from core.banner import banner_sampler
+from core.memory import caches
+from core.play_query import query_cache
+
+# Number of simulated users and the most time spent simulating them.
+SIMULATED_USERS = 50000
+SIMULATION_BATCH = 5000
+TIME_BUDGET = 0.5
+
+PERCENTILES = (50, 90, 99)
+
+
+def expected_rarities(rates: dict, count: int, guaranteed: bool) -> dict:
+    """
+    Expected share of each rarity among all cards of a play.
+
+    :param rates: Rates of a box from RATES.
+    :param count: Number of cards in the play.
+    :param guaranteed: Whether every 10 cards include a 3 star or better.
+
+    :return: Dictionary mapping rarities to their share of cards played.
+    """
+    if not guaranteed:
+        return dict(rates)
+
+    blocks = count // 10 if count >= 10 else 1
+    block_size = count // blocks
+    # The last card of a block is forced to 3 star or better when all
+    # others rolled 2 star or worse.
+    low = (rates[1] + rates[2]) ** (block_size - 1)
+    last = {
+        1: (1 - low) * rates[1],
+        2: (1 - low) * rates[2],
+        3: (1 - low) * rates[3] + low * (1 - rates[4]),
+        4: rates[4]
+    }
+    return {
+        r: ((block_size - 1) * rates[r] + last[r]) / block_size
+        for r in rates
+    }
+
+
+def geometric_percentile(p: float, q: float) -> int:
+    """
+    Number of draws after which a card with probability p per draw has been
+        drawn with probability q.
+    """
+    if p >= 1:
+        return 1
+    return max(1, math.ceil(math.log(1 - q) / math.log(1 - p)))
+
+
+def single_card_odds(p: float) -> dict:
+    """
+    Closed form odds of drawing one card.
+
+    :param p: Probability of drawing the card per card played.
+
+    :return: Dictionary with the mean and percentiles of cards played.
+    """
+    return {
+        'mean': 1 / p,
+        'percentiles': {
+            q: geometric_percentile(p, q / 100) for q in PERCENTILES
+        },
+        'simulated': 0
+    }
+
+
+def full_set_odds(probabilities: list, budget: float = TIME_BUDGET) -> dict:
+    """
+    Simulated odds of drawing every card of a set at least once.
+
+    The first draw of each card is simulated as an independent geometric
+        draw, which is accurate when every card is rare compared to the
+        whole pool.
+
+    :param probabilities: Probability of drawing each card per card played.
+    :param budget: Most seconds spent simulating.
+
+    :return: Dictionary with the mean and percentiles of cards played and
+        the number of simulated users.
+    """
+    deadline = perf_counter() + budget
+    # Pure Python batches are kept small so the budget is not overrun.
+    batch = SIMULATION_BATCH if np is not None else SIMULATION_BATCH // 10
+    batches = []
+    simulated = 0
+    while simulated < SIMULATED_USERS and perf_counter() < deadline:
+        batches.append(_simulate_batch(probabilities, batch))
+        simulated += batch
+
+    if np is not None:
+        results = np.concatenate(batches)
+        mean = float(results.mean())
+        percentiles = {
+            q: int(np.percentile(results, q)) for q in PERCENTILES
+        }
+    else:
+        results = sorted(r for batch in batches for r in batch)
+        mean = sum(results) / len(results)
+        percentiles = {
+            q: results[min(len(results) - 1, len(results) * q // 100)]
+            for q in PERCENTILES
+        }
+    return {'mean': mean, 'percentiles': percentiles, 'simulated': simulated}
+
+
+def _simulate_batch(probabilities: list, users: int):
+    if np is not None:
+        # One geometric draw per user and card, the set is complete at the
+        # last first draw.
+        draws = np.random.geometric(
+            np.array(probabilities), (users, len(probabilities)))
+        return draws.max(axis=1)
+
+    logs = [math.log(1 - p) for p in probabilities]
+    return [
+        max(int(math.log(1 - random()) / log) + 1 for log in logs)
+        for _ in range(users)
+    ]
+
+
+class OddsCalculator:
+    """
+    Computes play odds for a filtered card pool and caches them per filter
+        and target until the catalog changes.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600):
+        """
+        Constructor for an OddsCalculator.
+
+        :param max_entries: Maximum number of results kept.
+        :param ttl: Seconds a result is kept.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._results = OrderedDict()
+
+    def __len__(self):
+        return len(self._results)
+
+    async def get_odds(self, cards, rates: dict, key: tuple, count: int,
+                       guaranteed: bool, target) -> dict:
+        """
+        Get the odds of drawing a target with a type of play.
+
+        :param cards: Card controller of the bot.
+        :param rates: Rates of the played box.
+        :param key: Query key of the played pool.
+        :param count: Number of cards per play.
+        :param guaranteed: Whether plays have a guaranteed 3 star.
+        :param target: A card ID, or a tuple of rarities to collect every
+            card of those rarities in the pool.
+
+        :return: Dictionary with the "mean" and "percentiles" of cards
+            played, the number of "cards" in the target and how many users
+            were "simulated". None if the target is not in the pool.
+        """
+        banner = banner_sampler.get_active_banner()
+        cache_key = (banner.name if banner else None,
+                     tuple(sorted(rates.items())), key, count, guaranteed,
+                     target)
+        entry = self._results.get(cache_key)
+        if entry:
+            version, expires, result = entry
+            if version == cards.catalog_version and expires > time():
+                self._results.move_to_end(cache_key)
+                return result
+
+        version = cards.catalog_version
+        shares = expected_rarities(rates, count, guaranteed)
+        pools = {
+            rarity: await query_cache.get_pool(cards, key, rarity)
+            for rarity in rates if rates[rarity] > 0
+        }
+
+        # Chance of each card per card played, with banner weights applied
+        # within each rarity.
+        chances = {}
+        for rarity, pool in pools.items():
+            weights = [
+                banner.weights.get(card_id, 1.0) if banner else 1.0
+                for card_id in pool
+            ]
+            total = sum(weights)
+            for card_id, weight in zip(pool, weights):
+                chances[card_id] = (rarity, shares[rarity] * weight / total)
+
+        result = None
+        if isinstance(target, int):
+            if target in chances:
+                result = single_card_odds(chances[target][1])
+                result['cards'] = 1
+        else:
+            probabilities = [
+                p for rarity, p in chances.values() if rarity in target
+            ]
+            if probabilities:
+                result = await get_event_loop().run_in_executor(
+                    None, full_set_odds, probabilities)
+                result['cards'] = len(probabilities)
+
+        self._results[cache_key] = (version, time() + self.ttl, result)
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+        return result
+
+
+odds_calculator = caches.register('odds', OddsCalculator())
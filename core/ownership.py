@@ -0,0 +1,93 @@
+"""
+Keeps the cards owned by recently active users as bitsets over the card
+catalog, updated incrementally on album writes.
+"""
+from asyncio import ensure_future
+from collections import OrderedDict
+
+from core.catalog import catalog
+from core.memory import caches
+
+
+class OwnershipIndex:
+    """
+    LRU of ownership bitsets. A bitset is loaded from the album IDs on first
+        use and kept current by on_album_write.
+    """
+
+    def __init__(self, max_users: int = 100000):
+        """
+        Constructor for an OwnershipIndex.
+
+        :param max_users: Maximum number of users kept.
+        """
+        self.max_users = max_users
+        self._bits = OrderedDict()
+        self._pending = {}
+        # Cards written while a user's album was being loaded.
+        self._writes = {}
+
+    def __len__(self):
+        return len(self._bits)
+
+    async def get(self, storage, user_id: str) -> int:
+        """
+        Get the bitset of cards owned by a user.
+
+        :param storage: Storage backend of the bot.
+        :param user_id: ID of the user.
+
+        :return: Bitset over the card catalog.
+        """
+        await catalog.refresh(storage.cards)
+        entry = self._bits.get(user_id)
+        if entry and entry[0] == catalog.generation:
+            self._bits.move_to_end(user_id)
+            return entry[1]
+
+        pending = self._pending.get(user_id)
+        if pending is None:
+            pending = ensure_future(self._load(storage, user_id))
+            self._pending[user_id] = pending
+        return await pending
+
+    async def _load(self, storage, user_id: str) -> int:
+        self._writes[user_id] = set()
+        try:
+            card_ids = await storage.users.get_album_card_ids(user_id)
+        finally:
+            del self._pending[user_id]
+            written = self._writes.pop(user_id)
+
+        bits = catalog.to_bits(card_ids) | catalog.to_bits(written)
+        self._bits[user_id] = (catalog.generation, bits)
+        self._bits.move_to_end(user_id)
+        while len(self._bits) > self.max_users:
+            self._bits.popitem(last=False)
+        return bits
+
+    def on_album_write(self, user_id: str, counts: dict,
+                       scores: dict = None):
+        """
+        Album listener adding written cards to a user's bitset.
+
+        :param user_id: ID of the user.
+        :param counts: Dictionary mapping card IDs to copies added. Removed
+            copies leave the card in the album with a count of 0, so the
+            card stays owned.
+        :param scores: Unused.
+        """
+        if user_id in self._writes:
+            self._writes[user_id].update(counts)
+        entry = self._bits.get(user_id)
+        if entry:
+            self._bits[user_id] = (entry[0], entry[1] | catalog.to_bits(counts))
+
+    def clear(self):
+        """
+        Drop all bitsets.
+        """
+        self._bits.clear()
+
+
+ownership_index = caches.register('ownership', OwnershipIndex())
@@ -0,0 +1,140 @@
+"""
+Compiles parsed play arguments into card filters and caches the cards that
+each filter allows.
+"""
+from asyncio import ensure_future
+from collections import OrderedDict
+from time import time
+
+from core.memory import caches
+
+# Parsed argument types mapped to the card fields they filter.
+FIELDS = {
+    'i_band': 'member.i_band',
+    'name': 'member.name',
+    'i_school_year': 'member.i_school_year',
+    'i_attribute': 'i_attribute',
+    'instrument': 'member.instrument'
+}
+
+
+def query_key(args: dict) -> tuple:
+    """
+    Normalize parsed arguments into a hashable key. Arguments that select
+        the same cards get the same key.
+
+    :param args: Parsed arguments from parse_arguments.
+
+    :return: Tuple of (arg_type, sorted tuple of values).
+    """
+    return tuple(
+        (arg_type, tuple(sorted(set(args[arg_type]))))
+        for arg_type in sorted(args)
+        if arg_type in FIELDS and args[arg_type]
+    )
+
+
+def compile_filter(key: tuple) -> dict:
+    """
+    Compile a query key into a card filter without the rarity.
+
+    :param key: Key from query_key.
+
+    :return: Mongo style filter dictionary.
+    """
+    return {FIELDS[arg_type]: {'$in': list(values)} for arg_type, values in key}
+
+
+class PlayQueryCache:
+    """
+    Caches compiled filters and the IDs of the cards each filter allows for
+        every rarity. Pools are dropped when the card catalog changes.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600):
+        """
+        Constructor for a PlayQueryCache.
+
+        :param max_entries: Maximum number of filters and of pools kept.
+        :param ttl: Seconds a pool is kept before it is fetched again.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._filters = OrderedDict()
+        self._pools = OrderedDict()
+        self._pending = {}
+
+    def __len__(self):
+        return len(self._pools)
+
+    def get_filter(self, key: tuple) -> dict:
+        """
+        Get the compiled filter for a query key.
+
+        :param key: Key from query_key.
+
+        :return: Mongo style filter dictionary without the rarity.
+        """
+        compiled = self._filters.get(key)
+        if compiled is None:
+            compiled = compile_filter(key)
+            self._filters[key] = compiled
+            _trim(self._filters, self.max_entries)
+        else:
+            self._filters.move_to_end(key)
+        return compiled
+
+    async def get_pool(self, cards, key: tuple, rarity: int) -> list:
+        """
+        Get the IDs of all cards of a rarity matching a query key.
+
+        :param cards: Card controller of the bot.
+        :param key: Key from query_key.
+        :param rarity: Card rarity.
+
+        :return: List of card IDs.
+        """
+        pool_key = (key, rarity)
+        entry = self._pools.get(pool_key)
+        if entry:
+            version, expires, ids = entry
+            if version == cards.catalog_version and expires > time():
+                self._pools.move_to_end(pool_key)
+                return ids
+
+        # Identical pools requested at the same time share one query.
+        pending = self._pending.get(pool_key)
+        if pending is None:
+            pending = ensure_future(self._fetch_pool(cards, key, rarity))
+            self._pending[pool_key] = pending
+        return await pending
+
+    async def _fetch_pool(self, cards, key: tuple, rarity: int) -> list:
+        pool_key = (key, rarity)
+        version = cards.catalog_version
+        try:
+            filters = dict(self.get_filter(key))
+            filters['i_rarity'] = rarity
+            ids = await cards.get_matching_card_ids(filters)
+        finally:
+            del self._pending[pool_key]
+
+        self._pools[pool_key] = (version, time() + self.ttl, ids)
+        self._pools.move_to_end(pool_key)
+        _trim(self._pools, self.max_entries)
+        return ids
+
+    def clear(self):
+        """
+        Drop all cached filters and pools.
+        """
+        self._filters.clear()
+        self._pools.clear()
+
+
+def _trim(cache: OrderedDict, max_entries: int):
+    while len(cache) > max_entries:
+        cache.popitem(last=False)
+
+
+query_cache = caches.register('play_query', PlayQueryCache())
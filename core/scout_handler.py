@@ -1,21 +1,32 @@
-from collections import namedtuple
+from collections import Counter, namedtuple
+from math import ceil
 from posixpath import basename
-from random import randint, shuffle, uniform
+from random import choices, randint, sample, shuffle, uniform
 from time import time
 from urllib.parse import urlsplit
 
 from discord import User
 
 from bot import HahaNo4Star
+from bot.metrics import metrics
 from core.argument_parser import parse_arguments
+from core.banner import banner_sampler
 from core.image_generator import create_image, get_one_img, \
     member_img_path
+from core.play_query import query_cache, query_key
 
 RATES = {
     "star": {1: 0.00, 2: 0.885, 3: 0.085, 4: 0.03},
     "df": {1: 0.00, 2: 0.855, 3: 0.085, 4: 0.06}
 }
 
+# Number of cards in each guaranteed 3 star block of a bulk play.
+BLOCK_SIZE = 10
+
+# Most cards shown in the summary image of a bulk play.
+MAX_SUMMARY_CARDS = 24
+SUMMARY_ROW_SIZE = 8
+
 
 class PlayImage(namedtuple('playImage', ('bytes', 'name'))):
     __slots__ = ()
@@ -26,7 +37,7 @@ class PlayHandler:
     Provides scouting functionality for bot.
     """
     __slots__ = ('results', '_bot', '_user', '_box', '_count',
-                 '_guaranteed_sr', '_args')
+                 '_guaranteed_sr', '_args', '_query')
 
     def __init__(self, bot: HahaNo4Star, user: User,
                  box: str = "honour", count: int = 1,
@@ -47,10 +58,34 @@ class PlayHandler:
         self._count = count
         self._guaranteed_sr = guaranteed_sr
         self._args = parse_arguments(self._bot, args, True)
+        self._query = query_key(self._args)
+
+    @property
+    def box(self) -> str:
+        return self._box
 
     async def do_scout(self):
         return await self._handle_multiple_play()
 
+    async def do_bulk_scout(self):
+        """
+        Plays all cards in one pass. Guaranteed plays get a 3 star in every
+            block of 10 cards.
+
+        :return: Image of the 3 and 4 star cards played, or None if none
+            were played.
+        """
+        cards = await self._play_bulk_cards()
+        hits = _summarize_hits(cards)
+        if not hits:
+            return None
+
+        fname = f'{int(time())}{randint(0, 100)}.png'
+        num_rows = ceil(len(hits) / SUMMARY_ROW_SIZE)
+        _bytes = await create_image(
+            self._bot.session_manager, hits, num_rows, True, True)
+        return PlayImage(_bytes, fname)
+
     async def _handle_multiple_play(self):
         """
         Handles a play with multiple cards
@@ -127,6 +162,49 @@ class PlayHandler:
         shuffle(results)
         return results
 
+    async def _play_bulk_cards(self) -> list:
+        """
+        Plays a large number of cards, drawing from the cached card pools
+            and fetching each distinct card once.
+
+        :return: cards played
+        """
+        cards = self._bot.db.cards
+        picked = []
+        for rarity, count in Counter(self._roll_bulk_rarities()).items():
+            with metrics.timed('db'):
+                pool = await query_cache.get_pool(cards, self._query, rarity)
+            if not pool:
+                self.results = []
+                return []
+            table = banner_sampler.get_table(self._query, rarity, pool)
+            if table:
+                picked += table.draws(count)
+            else:
+                picked += choices(pool, k=count)
+
+        with metrics.timed('db'):
+            infos = await cards.get_cards(list(set(picked)))
+        infos = {info['_id']: info for info in infos}
+        results = [infos[card_id] for card_id in picked if card_id in infos]
+        self.results = results
+        return results
+
+    def _roll_bulk_rarities(self) -> list:
+        """
+        Generates random rarities for every card in the play at once.
+
+        :return: List of rarities.
+        """
+        rates = RATES[self._box]
+        rarities = choices(list(rates.keys()), list(rates.values()),
+                           k=self._count)
+        if self._guaranteed_sr:
+            for end in range(BLOCK_SIZE, self._count + 1, BLOCK_SIZE):
+                if max(rarities[end - BLOCK_SIZE:end - 1]) < 3:
+                    rarities[end - 1] = self._roll_rarity(True)
+        return rarities
+
     async def _play_request(self, count: int, rarity: int) -> dict:
         """
         Plays a specified number of cards of a given rarity
@@ -138,31 +216,21 @@ class PlayHandler:
         if count == 0:
             return []
 
-        params = {'i_rarity': rarity,}
-
-        for arg_type, arg_values in self._args.items():
-            if not arg_values:
-                continue
-
-            val = arg_values
-
-            # Comma seperated strings need to use $in.
-            if len(arg_values) > 0:
-                val = {'$in': arg_values}
+        cards = self._bot.db.cards
+        with metrics.timed('db'):
+            pool = await query_cache.get_pool(cards, self._query, rarity)
+        if not pool:
+            return []
 
-            if arg_type == "i_band":
-                params['member.i_band'] = val
-            elif arg_type == "name":
-                params['member.name'] = val
-            elif arg_type == "i_school_year":
-                params['member.i_school_year'] = val
-            elif arg_type == "i_attribute":
-                params['i_attribute'] = val
-            elif arg_type == "instrument":
-                params['member.instrument'] = val
+        table = banner_sampler.get_table(self._query, rarity, pool)
+        if table:
+            picked = table.sample(count)
+        else:
+            picked = sample(pool, min(count, len(pool)))
 
         # Get and return response
-        return await self._bot.db.cards.get_random_cards(params, count)
+        with metrics.timed('db'):
+            return await cards.get_cards(picked)
 
     def _roll_rarity(self, guaranteed_sr: bool = False) -> str:
         """
@@ -227,3 +295,25 @@ def _get_adjusted_play(play: list, required_count: int) -> list:
             play[card_index] = play[card_index + 1]
 
     return play
+
+
+def _summarize_hits(cards: list) -> list:
+    """
+    Collects the distinct 3 and 4 star cards of a play with their counts.
+
+    :param cards: List of cards played.
+
+    :return: List of copies of the highest rarity cards with a count field,
+        rarest and most played first.
+    """
+    counts = Counter(card['_id'] for card in cards)
+    hits = {}
+    for card in cards:
+        if card['i_rarity'] >= 3 and card['_id'] not in hits:
+            hit = dict(card)
+            hit['count'] = counts[card['_id']]
+            hits[card['_id']] = hit
+
+    hits = sorted(
+        hits.values(), key=lambda c: (-c['i_rarity'], -c['count'], c['_id']))
+    return hits[:MAX_SUMMARY_CARDS]
@@ -0,0 +1,255 @@
+"""
+Bounded storage for per-user command state, such as the last album filters.
+"""
+import json
+import sys
+from asyncio import get_event_loop, sleep
+from collections import OrderedDict
+from pathlib import Path
+from time import time
+
+from core.memory import caches
+from data import data_path
+
+
+class AlbumSession:
+    """
+    The last album arguments used by a user.
+    """
+    __slots__ = ('page', 'filters', 'sort', 'order', 'expires')
+
+    def __init__(self, page: int = 0, filters: dict = None, sort: str = None,
+                 order: str = None, expires: float = 0):
+        self.page = page
+        self.filters = filters or {}
+        self.sort = sort
+        self.order = order  # Sort by ID if None
+        self.expires = expires
+
+    def set_filters(self, filters: dict):
+        """
+        Stores filters, keeping only the filter types with values.
+
+        :param filters: Parsed filter dictionary.
+        """
+        self.filters = {k: tuple(v) for k, v in filters.items() if v}
+
+    def to_dict(self) -> dict:
+        return {
+            'page': self.page,
+            'filters': {k: list(v) for k, v in self.filters.items()},
+            'sort': self.sort,
+            'order': self.order,
+            'expires': self.expires
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict):
+        session = cls(d['page'], None, d['sort'], d['order'], d['expires'])
+        session.set_filters(d['filters'])
+        return session
+
+    def size(self) -> int:
+        """
+        Approximate number of bytes used by this session.
+        """
+        total = sys.getsizeof(self) + sys.getsizeof(self.filters)
+        for key, values in self.filters.items():
+            total += sys.getsizeof(key) + sys.getsizeof(values)
+            total += sum(sys.getsizeof(v) for v in values)
+        return total
+
+
+class FileSessionBackend:
+    """
+    Persists sessions to a local JSON file. Any object with the same load
+        and save methods can be used as a backend instead.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def load(self) -> dict:
+        """
+        :return: Dictionary mapping keys to serialized sessions.
+        """
+        if not self.path.is_file():
+            return {}
+        with self.path.open() as f:
+            return json.load(f)
+
+    def save(self, sessions: dict):
+        """
+        :param sessions: Dictionary mapping keys to serialized sessions.
+        """
+        tmp = self.path.with_name(self.path.name + '.tmp')
+        with tmp.open('w') as f:
+            json.dump(sessions, f)
+        tmp.replace(self.path)
+
+
+class SessionStore:
+    """
+    A least recently used store of sessions with a time to live.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, backend=None,
+                 session_type=AlbumSession):
+        """
+        Constructor for a SessionStore.
+
+        :param max_entries: Maximum number of sessions kept, the least
+            recently used session is dropped first.
+        :param ttl: Seconds a session is kept after its last use.
+        :param backend: Optional backend used to persist sessions.
+        :param session_type: Class of the stored sessions.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.backend = backend
+        self.session_type = session_type
+        self._sessions = OrderedDict()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key):
+        """
+        Gets a session and marks it as recently used.
+
+        :param key: Session key.
+
+        :return: The session, or None if it is missing or expired.
+        """
+        session = self._sessions.get(key)
+        if session is None:
+            return None
+        now = time()
+        if session.expires < now:
+            del self._sessions[key]
+            return None
+        session.expires = now + self.ttl
+        self._sessions.move_to_end(key)
+        return session
+
+    def get_or_create(self, key):
+        """
+        Gets a session, creating a new one if it is missing or expired.
+
+        :param key: Session key.
+
+        :return: The session.
+        """
+        session = self.get(key)
+        if session is None:
+            session = self.reset(key)
+        return session
+
+    def reset(self, key):
+        """
+        Replaces a session with a new one.
+
+        :param key: Session key.
+
+        :return: The new session.
+        """
+        session = self.session_type(expires=time() + self.ttl)
+        self._sessions[key] = session
+        self._sessions.move_to_end(key)
+        while len(self._sessions) > self.max_entries:
+            self._sessions.popitem(last=False)
+        return session
+
+    def prune(self) -> int:
+        """
+        Removes expired sessions.
+
+        :return: Number of sessions removed.
+        """
+        now = time()
+        expired = [k for k, s in self._sessions.items() if s.expires < now]
+        for key in expired:
+            del self._sessions[key]
+        return len(expired)
+
+    def load(self):
+        """
+        Loads sessions that have not expired from the backend.
+        """
+        if not self.backend:
+            return
+        now = time()
+        stored = self.backend.load()
+        loaded = sorted(
+            (d['expires'], k) for k, d in stored.items()
+            if d['expires'] >= now
+        )
+        for _, key in loaded[-self.max_entries:]:
+            self._sessions[key] = self.session_type.from_dict(stored[key])
+
+    def save(self):
+        """
+        Saves sessions that have not expired to the backend.
+        """
+        if not self.backend:
+            return
+        self.prune()
+        self.backend.save(self.snapshot())
+
+    def snapshot(self) -> dict:
+        """
+        :return: Dictionary mapping keys to serialized sessions.
+        """
+        return {k: s.to_dict() for k, s in self._sessions.items()}
+
+    def stats(self) -> dict:
+        """
+        :return: Dictionary with the number of entries and their approximate
+            size in bytes.
+        """
+        size = sys.getsizeof(self._sessions)
+        for key, session in self._sessions.items():
+            size += sys.getsizeof(key) + session.size()
+        return {'entries': len(self._sessions), 'bytes': size}
+
+
+async def save_sessions(store: SessionStore, interval: float):
+    """
+    Periodically remove expired sessions and save the rest, so a crash only
+        loses the sessions changed since the last save. The sessions are
+        serialized on the event loop and written in an executor.
+
+    :param store: The session store.
+    :param interval: Seconds between saves.
+    """
+    while True:
+        await sleep(interval)
+        store.prune()
+        if store.backend:
+            await get_event_loop().run_in_executor(
+                None, store.backend.save, store.snapshot())
+
+
+def get_session_store(options: dict) -> SessionStore:
+    """
+    Creates a session store from config.
+
+    :param options: Dictionary with "max_entries", "ttl" and an optional
+        "path" of the file sessions are persisted to.
+
+    :return: The session store with any persisted sessions loaded.
+    """
+    backend = None
+    if options.get('path'):
+        path = Path(options['path'])
+        if not path.is_absolute():
+            path = data_path.joinpath(path)
+        backend = FileSessionBackend(path)
+
+    store = SessionStore(
+        options.get('max_entries', 100000), options.get('ttl', 86400), backend)
+    store.load()
+    return caches.register('album_sessions', store)
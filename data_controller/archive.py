@@ -0,0 +1,49 @@
+"""
+Compact format for the albums of archived users. An album is packed as
+little endian (card id, count, time acquired) records compressed with zlib.
+"""
+import struct
+import zlib
+
+RECORD = struct.Struct('<IIq')
+
+# Days without album writes before a user is archived by default.
+DEFAULT_INACTIVE_DAYS = 365
+
+
+def pack_album(album: list) -> bytes:
+    """
+    Pack an album for the archive.
+
+    :param album: List of album entries with an id, count and time_aquired.
+
+    :return: Compressed bytes.
+    """
+    raw = b''.join(
+        RECORD.pack(card['id'], card['count'], card.get('time_aquired') or 0)
+        for card in album
+    )
+    return zlib.compress(raw, 9)
+
+
+def unpack_album(data: bytes) -> list:
+    """
+    Unpack an album packed by pack_album.
+
+    :param data: Compressed bytes.
+
+    :return: List of album entries sorted by card ID.
+    """
+    return [
+        {'id': card_id, 'count': count, 'time_aquired': time_aquired}
+        for card_id, count, time_aquired in RECORD.iter_unpack(
+            zlib.decompress(data))
+    ]
+
+
+def new_report(dry_run: bool) -> dict:
+    """
+    :return: Empty archive report.
+    """
+    return {'dry_run': dry_run, 'users': 0, 'cards': 0,
+            'album_bytes': 0, 'archive_bytes': 0}
@@ -9,6 +9,8 @@ class CardController(DatabaseController):
         :param mongo_client: Mongo client used by this controller.
         """
         super().__init__(mongo_client, 'cards')
+        # Incremented whenever the card catalog changes.
+        self.catalog_version = 0
 
     async def upsert_card(self, card: dict):
         """
@@ -24,6 +26,7 @@ class CardController(DatabaseController):
         setCard = {'$set': card}
 
         await self._collection.update(doc, setCard, upsert=True)
+        self.catalog_version += 1
 
     async def get_card(self, card_id: int) -> dict:
         """
@@ -77,6 +80,16 @@ class CardController(DatabaseController):
         cursor = self._collection.aggregate([match, sample])
         return await cursor.to_list(None)
 
+    async def get_matching_card_ids(self, filters: dict) -> list:
+        """
+        Gets the IDs of all cards matching a filter.
+
+        :param filters: Dicitonary of filters to use.
+
+        :return: List of card IDs.
+        """
+        return await self._collection.distinct('_id', filters)
+
     async def get_card_ids(self) -> list:
         """
         Gets a list of all card IDs in the datase.
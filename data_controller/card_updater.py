@@ -1,30 +1,36 @@
-import json
-import requests
 import time
 import copy
-from pymongo import MongoClient
+from asyncio import run_coroutine_threadsafe
 from datetime import datetime
 
 MAX_UPDATE_SIZE = 15
 API = 'https://bandori.party/api/'
 
 # This is ugly until I find time for a better solution...
-def update_task():
+def update_task(db, session_manager, loop):
+    """
+    Periodically copies new members and cards from the API into storage.
+        Runs on its own thread, database calls and requests are run on the
+        bot loop.
+
+    :param db: Storage client of the bot.
+    :param session_manager: SessionManager of the bot, its response cache
+        revalidates the ID lists instead of downloading them every time.
+    :param loop: Event loop the storage client belongs to.
+    """
+    def run(coro):
+        return run_coroutine_threadsafe(coro, loop).result()
+
     while True:
         print('Getting cards...')
-        client = None
         try:
-            client = MongoClient('localhost', 27017)
-            db = client['haha-no-4star']
-
              # Get card ids from database and api.
-            db_card_ids = set(get_card_ids(db))
-            db_member_ids = set(get_member_ids(db))
+            db_card_ids = set(run(db.cards.get_card_ids()))
+            db_member_ids = set(run(db.members.get_member_ids()))
 
-            api_card_ids = set(json.loads(
-                    requests.get(API + 'cardids').text)) 
-            api_member_ids = set(json.loads(
-                    requests.get(API + 'memberids').text)) 
+            api_card_ids = set(run(session_manager.get_json(API + 'cardids')))
+            api_member_ids = set(
+                run(session_manager.get_json(API + 'memberids')))
 
             new_card_ids = list(api_card_ids - db_card_ids)
             new_member_ids = list(api_member_ids - db_member_ids)
@@ -33,91 +39,45 @@ def update_task():
                 new_member_ids = new_member_ids[:MAX_UPDATE_SIZE]
                 print('Getting members ' + str(new_member_ids))
                 for i in new_member_ids:
-                    req = requests.get(url=API + 'members/' + str(i))    
-                    res = json.loads(req.text)
-                    upsert_member(db, res)
+                    res = run(session_manager.get_json(
+                        API + 'members/' + str(i)))
+                    run(db.members.upsert_member(res))
 
             if len(new_card_ids) > 0:
                 new_card_ids = new_card_ids[:MAX_UPDATE_SIZE]
                 print('Getting cards ' + str(new_card_ids))
                 for i in new_card_ids:
-                    req = requests.get(API + 'cards/' + str(i))                
-                    res = json.loads(req.text)
+                    res = run(session_manager.get_json(
+                        API + 'cards/' + str(i)))
                     if validate_card(res):
-                        upsert_card(db, res)
-
+                        run(upsert_card(db, res))
 
-     
         except Exception as e:
             print(e)
 
         finally:
-            client.close()
             time.sleep(60)
 
 
-def get_card_ids(db) -> list:
-    """
-    Gets a list of all card IDs in the datase.
-
-    :return: List of card IDs.
-    """
-    return db['cards'].distinct('_id')
-
-
-def get_member_ids(db) -> list:
-    return db['members'].distinct('_id')
-
-def get_members(db, ids: list) -> dict:
-        """
-        Gets a list of members from the database.
-
-        :param ids: List of members IDs to get.
-
-        :return: Matching cards.
-        """
-        search = {'_id': {'$in': ids}}
-        return db['members'].find(search)
-
-def upsert_member(db, member: dict):
-    """
-    Inserts a meber into the member collection if it does not exist.
-
-    :param card: Member dictionary to insert.
-    """
-    member = copy.deepcopy(member)
-    member['_id'] = member['id']
-    del member['id']
-
-    doc = {'_id': member['_id']}
-    setMember = {'$set': member}
-
-    db['members'].update(doc, setMember, upsert=True)
-
-def upsert_card(db, card: dict):
+async def upsert_card(db, card: dict):
     """
     Inserts a card into the card collection if it does not exist.
 
+    :param db: Storage client.
     :param card: Card dictionary to insert.
     """
     card = copy.deepcopy(card)
-    card['_id'] = card['id']
-    del card['id']
 
     # Replace member id with member info.
-    members = get_members(db, [card['member']])
-    if not members:
+    member = await db.members.get_member(card['member'])
+    if not member:
         return
 
-    member = members[0]
     member['id'] = member['_id']
     del member['_id']
     card['member'] = member
 
-    doc = {'_id': card['_id']}
-    setCard = {'$set': card}
-
-    db['cards'].update(doc, setCard, upsert=True)
+    await db.cards.upsert_card(card)
 
 
 def validate_card(card: dict) -> bool:
@@ -1,14 +1,66 @@
+class StorageClient:
+    """
+    Base class for a storage backend. A backend exposes the users, cards,
+        members, feedback and servers controllers, which provide the same
+        methods regardless of the backend.
+    """
+
+    def __init__(self):
+        self._album_listeners = []
+
+    def add_album_listener(self, listener):
+        """
+        Register a function called after cards are added to or removed
+            from an album.
+
+        :param listener: Function taking the user ID, a dictionary mapping
+            card IDs to the number of copies added (negative for removed
+            copies) and the user's new scores.
+        """
+        self._album_listeners.append(listener)
+
+    def notify_album_write(self, user_id: str, counts: dict,
+                           scores: dict = None):
+        """
+        Call every album listener. Controllers call this after each write.
+
+        :param user_id: ID of the user whose album was written.
+        :param counts: Dictionary mapping card IDs to copies added,
+            negative for removed copies.
+        :param scores: Dictionary of the user's scores if they changed.
+        """
+        for listener in self._album_listeners:
+            listener(user_id, counts, scores)
+
+    async def connect(self):
+        """
+        Prepares the backend before the bot starts handling commands.
+        """
+        pass
+
+    async def close(self):
+        """
+        Releases any connections held by the backend.
+        """
+        pass
+
+
 class DatabaseController:
     """
     Class for providing a controller that performs operations on
         a mongodb database.
     """
 
-    def __init__(self, mongo_client, collection: str):
+    def __init__(self, mongo_client, collection: str,
+                 write_concern: str = None):
         """
         Constructor for a DatabaseController.
 
         :param mongo_client: Mongo client used by this controller.
+        :param collection: Name of the collection.
+        :param write_concern: Name of the configured write concern used for
+            writes to this collection.
         """
         self.mongo_client = mongo_client
-        self._collection = mongo_client.db[collection]
\ No newline at end of file
+        self._collection = mongo_client.get_collection(
+            collection, write_concern)
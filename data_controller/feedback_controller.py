@@ -8,7 +8,7 @@ class FeedbackController(DatabaseController):
 
         :param mongo_client: Mongo client used by this controller.
         """
-        super().__init__(mongo_client, 'feedback')
+        super().__init__(mongo_client, 'feedback', 'best_effort')
 
     async def add_feedback(self, user_id, username, message):
         """
@@ -0,0 +1,44 @@
+import copy
+from data_controller.database_controller import DatabaseController
+
+class MemberController(DatabaseController):
+    def __init__(self, mongo_client):
+        """
+        Constructor for a MemberController.
+
+        :param mongo_client: Mongo client used by this controller.
+        """
+        super().__init__(mongo_client, 'members')
+
+    async def upsert_member(self, member: dict):
+        """
+        Inserts a member into the member collection if it does not exist.
+
+        :param member: Member dictionary to insert.
+        """
+        member = copy.deepcopy(member)
+        member['_id'] = member['id']
+        del member['id']
+
+        doc = {'_id': member['_id']}
+        set_member = {'$set': member}
+
+        await self._collection.update(doc, set_member, upsert=True)
+
+    async def get_member(self, member_id: int) -> dict:
+        """
+        Gets a single member from the database.
+
+        :param member_id: ID of member to get.
+
+        :return: Matching member or None.
+        """
+        return await self._collection.find_one({'_id': member_id})
+
+    async def get_member_ids(self) -> list:
+        """
+        Gets a list of all member IDs in the database.
+
+        :return: List of member IDs.
+        """
+        return await self._collection.distinct('_id')
@@ -1,30 +1,114 @@
+import asyncio
 import motor.motor_asyncio
+from pymongo.write_concern import WriteConcern
+from data_controller.database_controller import StorageClient
 from data_controller.user_controller import UserController
 from data_controller.card_controller import CardController
+from data_controller.member_controller import MemberController
+from data_controller.play_controller import PlayController
 from data_controller.feedback_controller import FeedbackController
 from data_controller.server_controller import ServerController
 
 PORT = 27017
 DATABASE_NAME = "haha-no-4star"
+DEFAULT_URI = "mongodb://localhost:" + str(PORT)
 
-class MongoClient:
-    def __init__(self):
+# Client options passed straight through to Motor when present in config.
+CLIENT_OPTIONS = (
+    'maxPoolSize',
+    'minPoolSize',
+    'maxIdleTimeMS',
+    'waitQueueTimeoutMS',
+    'serverSelectionTimeoutMS',
+    'connectTimeoutMS',
+    'socketTimeoutMS',
+    'compressors',
+    'zlibCompressionLevel',
+    'readPreference',
+    'appname'
+)
+
+
+class MongoClient(StorageClient):
+    def __init__(self, options: dict = None, journal_options: dict = None):
         """
-        Constructor for a MongoClient
+        Constructor for a MongoClient.
+
+        :param options: The "mongo" section of config.json. Recognised keys
+            are "uri", "database", "write_concerns" and any of
+            CLIENT_OPTIONS.
+        :param journal_options: The "journal" section of config.json.
         """
-        self.client = motor.motor_asyncio.AsyncIOMotorClient("localhost", PORT)
-        self.db = self.client[DATABASE_NAME]
+        super().__init__()
+        options = options or {}
+        self.options = options
+        self.uri = options.get('uri', DEFAULT_URI)
+        self.min_pool_size = options.get('minPoolSize', 0)
+        self.write_concerns = {
+            name: WriteConcern(**concern)
+            for name, concern in options.get('write_concerns', {}).items()
+        }
+        self.client = motor.motor_asyncio.AsyncIOMotorClient(
+            self.uri, **get_client_kwargs(options))
+        self.db = self.client[options.get('database', DATABASE_NAME)]
         self.users = UserController(self)
         self.cards = CardController(self)
+        self.members = MemberController(self)
         self.feedback = FeedbackController(self)
         self.servers = ServerController(self)
+        self.plays = PlayController(self, journal_options)
+
+    def get_collection(self, name: str, write_concern: str = None):
+        """
+        Gets a collection, optionally with a named write concern.
+
+        :param name: Name of the collection.
+        :param write_concern: Name of a write concern from config, the
+            database default is used if it is not configured.
 
-    def __del__(self):
+        :return: Motor collection.
         """
-        Destructor for a MongoClient.
+        collection = self.db[name]
+        if write_concern in self.write_concerns:
+            collection = collection.with_options(
+                write_concern=self.write_concerns[write_concern])
+        return collection
+
+    async def connect(self):
+        """
+        Checks that the server is reachable and warms the connection pool
+            up to minPoolSize so the first commands don't pay for it.
+        """
+        await self.client.admin.command('ismaster')
+        if self.min_pool_size > 1:
+            await asyncio.gather(*[
+                self.client.admin.command('ping')
+                for _ in range(self.min_pool_size)
+            ])
+        await self.users.create_indexes()
+        await self.plays.create_indexes()
+        self.plays.start()
+
+    async def close(self):
+        """
+        Writes buffered plays and closes the connection to mongodb.
         """
-        # Close the connection to mongodb
+        await self.plays.stop()
         self.client.close()
 
 
+def get_client_kwargs(options: dict) -> dict:
+    """
+    Gets the keyword arguments for the Motor client from the mongo config.
+
+    :param options: The "mongo" section of config.json.
 
+    :return: Dictionary of client keyword arguments.
+    """
+    kwargs = {k: options[k] for k in CLIENT_OPTIONS if k in options}
+    compressors = kwargs.get('compressors')
+    if not compressors:
+        kwargs.pop('compressors', None)
+    elif isinstance(compressors, list):
+        kwargs['compressors'] = ','.join(compressors)
+    return kwargs
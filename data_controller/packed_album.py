@@ -0,0 +1,124 @@
+"""
+Packed album format. Instead of a list of {'id', 'count', 'time_aquired'}
+subdocuments, an album is stored as three parallel little endian arrays
+sorted by card ID:
+
+    album_packed: {'ids': <uint32>, 'counts': <uint32>, 'times': <int64>}
+"""
+import sys
+from array import array
+from bisect import bisect_left
+
+TYPECODES = {'ids': 'I', 'counts': 'I', 'times': 'q'}
+
+
+class PackedAlbum:
+    """
+    An album held as parallel arrays, without a dictionary per card.
+    """
+    __slots__ = ('ids', 'counts', 'times')
+
+    def __init__(self, ids: array = None, counts: array = None,
+                 times: array = None):
+        self.ids = ids if ids is not None else array(TYPECODES['ids'])
+        self.counts = counts if counts is not None else array(
+            TYPECODES['counts'])
+        self.times = times if times is not None else array(TYPECODES['times'])
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_document(cls, packed: dict):
+        """
+        Load the album_packed field of a user document.
+        """
+        return cls(**{
+            name: unpack_array(packed, name) for name in TYPECODES
+        })
+
+    @classmethod
+    def from_entries(cls, album: list):
+        """
+        Pack a list of album entries.
+        """
+        album = sorted(album, key=lambda card: card['id'])
+        return cls(
+            array(TYPECODES['ids'], (card['id'] for card in album)),
+            array(TYPECODES['counts'], (card['count'] for card in album)),
+            array(TYPECODES['times'],
+                  (card.get('time_aquired') or 0 for card in album))
+        )
+
+    def to_document(self) -> dict:
+        """
+        :return: Dictionary of little endian bytes for album_packed.
+        """
+        packed = {}
+        for name in TYPECODES:
+            values = getattr(self, name)
+            if sys.byteorder == 'big':
+                values = array(values.typecode, values)
+                values.byteswap()
+            packed[name] = values.tobytes()
+        return packed
+
+    def to_entries(self) -> list:
+        """
+        :return: List of album entries sorted by card ID.
+        """
+        return [
+            {'id': card_id, 'count': count, 'time_aquired': time_aquired}
+            for card_id, count, time_aquired in zip(
+                self.ids, self.counts, self.times)
+        ]
+
+    def index(self, card_id: int) -> int:
+        """
+        :return: Position of a card, or -1 if it is not in the album.
+        """
+        i = bisect_left(self.ids, card_id)
+        if i < len(self.ids) and self.ids[i] == card_id:
+            return i
+        return -1
+
+    def add(self, counts: dict, now: int) -> list:
+        """
+        Add copies of cards, keeping the arrays sorted.
+
+        :param counts: Dictionary mapping card IDs to copies added.
+        :param now: Time acquired of new cards in milliseconds.
+
+        :return: List of the IDs of cards that were not in the album.
+        """
+        new_ids = []
+        for card_id, count in counts.items():
+            i = self.index(card_id)
+            if i >= 0:
+                self.counts[i] += count
+            else:
+                new_ids.append(card_id)
+
+        if new_ids:
+            merged = sorted(
+                list(zip(self.ids, self.counts, self.times)) +
+                [(card_id, counts[card_id], now) for card_id in new_ids]
+            )
+            self.ids = array(TYPECODES['ids'], (e[0] for e in merged))
+            self.counts = array(TYPECODES['counts'], (e[1] for e in merged))
+            self.times = array(TYPECODES['times'], (e[2] for e in merged))
+        return new_ids
+
+
+def unpack_array(packed: dict, name: str) -> array:
+    """
+    Load one array of the album_packed field of a user document.
+
+    :param packed: The album_packed field.
+    :param name: Name of the array, one of TYPECODES.
+    """
+    values = array(TYPECODES[name])
+    values.frombytes(bytes(packed[name]))
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
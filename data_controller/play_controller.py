@@ -0,0 +1,65 @@
+from datetime import datetime
+from pymongo import ASCENDING, DESCENDING
+from data_controller.database_controller import DatabaseController
+from data_controller.play_journal import DAY_FORMAT, PlayJournal, day_bounds
+
+class PlayController(DatabaseController, PlayJournal):
+    def __init__(self, mongo_client, options: dict = None):
+        """
+        Constructor for a PlayController.
+
+        :param mongo_client: Mongo client used by this controller.
+        :param options: The "journal" section of config.json.
+        """
+        DatabaseController.__init__(
+            self, mongo_client, 'plays', 'best_effort')
+        PlayJournal.__init__(self, options)
+        self._daily = mongo_client.get_collection('play_daily', 'best_effort')
+
+    async def create_indexes(self):
+        """
+        Creates the history index and the index that expires old plays.
+        """
+        await self._collection.create_index(
+            [('user_id', ASCENDING), ('time', DESCENDING)])
+        await self._collection.create_index(
+            'time', expireAfterSeconds=self.retention_days * 86400)
+
+    async def _write(self, entries: list):
+        await self._collection.insert_many(entries, ordered=False)
+
+    async def get_history(self, user_id: str, page: int,
+                          page_size: int) -> list:
+        cursor = self._collection.find(
+            {'user_id': user_id},
+            {'_id': 0, 'user_id': 0}
+        ).sort('time', DESCENDING).skip(page * page_size).limit(page_size)
+        return await cursor.to_list(None)
+
+    async def compact(self, day: datetime):
+        start, end = day_bounds(day)
+        match = {'time': {'$gte': start, '$lt': end}}
+        cursor = self._collection.aggregate([
+            {'$match': match},
+            {'$unwind': '$rarities'},
+            {'$group': {'_id': '$rarities', 'count': {'$sum': 1}}}
+        ])
+        rarities = {
+            str(group['_id']): group['count']
+            for group in await cursor.to_list(None)
+        }
+        daily = {
+            'plays': await self._collection.find(match).count(),
+            'users': len(await self._collection.distinct('user_id', match)),
+            'cards': sum(rarities.values()),
+            'rarities': rarities
+        }
+        await self._daily.update_one(
+            {'_id': start.strftime(DAY_FORMAT)},
+            {'$set': daily},
+            upsert=True
+        )
+
+    async def get_daily(self, day: datetime) -> dict:
+        return await self._daily.find_one(
+            {'_id': day.strftime(DAY_FORMAT)}, {'_id': 0})
@@ -0,0 +1,185 @@
+import logging
+from abc import ABC, abstractmethod
+from asyncio import CancelledError, Lock, ensure_future, sleep
+from datetime import datetime, timedelta
+from time import time
+
+logger = logging.getLogger(__name__)
+
+DAY_FORMAT = '%Y-%m-%d'
+
+
+class PlayJournal(ABC):
+    """
+    Base class for a journal of individual plays. Plays are buffered in
+        memory and written in batches by a background task, so recording a
+        play never waits on storage. The same task rolls plays up into daily
+        aggregates.
+    """
+
+    def __init__(self, options: dict = None):
+        """
+        Constructor for a PlayJournal.
+
+        :param options: The "journal" section of config.json. Recognised
+            keys are "batch_size", "flush_interval", "compact_interval",
+            "retention_days" and "max_buffer".
+        """
+        options = options or {}
+        self.batch_size = options.get('batch_size', 500)
+        self.flush_interval = options.get('flush_interval', 5)
+        self.compact_interval = options.get('compact_interval', 3600)
+        self.retention_days = options.get('retention_days', 30)
+        self.max_buffer = options.get('max_buffer', 100000)
+        self._buffer = []
+        self._flushing = None
+        self._lock = Lock()
+        self._task = None
+        self._last_compact = 0
+
+    def record(self, user_id: str, box: str, cards: list):
+        """
+        Record a play. Returns immediately, the play is written later.
+
+        :param user_id: ID of the user who played.
+        :param box: Box that was played.
+        :param cards: List of cards played.
+        """
+        if len(self._buffer) >= self.max_buffer:
+            logger.warning('Play journal buffer full, dropping play')
+            return
+
+        self._buffer.append({
+            'user_id': user_id,
+            'time': datetime.utcnow(),
+            'box': box,
+            'cards': [card['_id'] for card in cards],
+            'rarities': [card['i_rarity'] for card in cards]
+        })
+        if len(self._buffer) >= self.batch_size and not self._flushing:
+            self._flushing = ensure_future(self._flush_full_buffer())
+
+    async def flush(self):
+        """
+        Write all buffered plays. A batch that fails to write is put back
+            in the buffer before the error is raised.
+        """
+        async with self._lock:
+            try:
+                while self._buffer:
+                    entries = self._buffer[:self.batch_size]
+                    del self._buffer[:self.batch_size]
+                    try:
+                        await self._write(entries)
+                    except BaseException:
+                        self._requeue(entries)
+                        raise
+            finally:
+                self._flushing = None
+
+    async def _flush_full_buffer(self):
+        try:
+            await self.flush()
+        except CancelledError:
+            raise
+        except Exception:
+            logger.exception('Play journal write failed')
+
+    def _requeue(self, entries: list):
+        """
+        Put plays back at the front of the buffer, dropping the newest of
+            them if the buffer is full.
+        """
+        room = max(self.max_buffer - len(self._buffer), 0)
+        if room < len(entries):
+            logger.warning(f'Play journal buffer full, dropping '
+                           f'{len(entries) - room} plays')
+        self._buffer[:0] = entries[:room]
+
+    def start(self):
+        """
+        Start the background task that flushes and compacts the journal.
+        """
+        if not self._task:
+            self._task = ensure_future(self._run())
+
+    async def stop(self):
+        """
+        Stop the background task and write any buffered plays.
+        """
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception(f'Play journal write failed, dropping '
+                             f'{len(self._buffer)} plays')
+
+    async def _run(self):
+        while True:
+            try:
+                await sleep(self.flush_interval)
+                await self.flush()
+                if time() - self._last_compact >= self.compact_interval:
+                    self._last_compact = time()
+                    # Yesterday is compacted again to include its last plays.
+                    today = datetime.utcnow()
+                    await self.compact(today - timedelta(days=1))
+                    await self.compact(today)
+            except CancelledError:
+                raise
+            except Exception:
+                logger.exception('Play journal task failed')
+
+    @abstractmethod
+    async def _write(self, entries: list):
+        """
+        Write a batch of plays to storage.
+
+        :param entries: List of play dictionaries.
+        """
+
+    @abstractmethod
+    async def get_history(self, user_id: str, page: int,
+                          page_size: int) -> list:
+        """
+        Get a page of a user's plays, newest first.
+
+        :param user_id: ID of the user.
+        :param page: Page number starting at 0.
+        :param page_size: Number of plays per page.
+
+        :return: List of play dictionaries.
+        """
+
+    @abstractmethod
+    async def compact(self, day: datetime):
+        """
+        Roll the plays of a day up into its daily aggregate.
+
+        :param day: Any time during the day.
+        """
+
+    @abstractmethod
+    async def get_daily(self, day: datetime) -> dict:
+        """
+        Get the aggregate of a day.
+
+        :param day: Any time during the day.
+
+        :return: Dictionary with the number of "plays", "users" and "cards"
+            played, and "rarities" mapping each rarity to a card count. None
+            if the day has not been compacted.
+        """
+
+
+def day_bounds(day: datetime) -> tuple:
+    """
+    Get the start and end of the day containing a time.
+
+    :return: Tuple of (start, end) datetimes.
+    """
+    start = datetime(day.year, day.month, day.day)
+    return start, start + timedelta(days=1)
+
@@ -0,0 +1,3 @@
+from data_controller.sqlite.client import SQLiteClient
+
+__all__ = ['SQLiteClient']
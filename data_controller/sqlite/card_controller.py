@@ -0,0 +1,185 @@
+import json
+from data_controller.sqlite.database_controller import DatabaseController, \
+    chunks, placeholders
+
+UPSERT_CARD = '''
+INSERT INTO cards (
+    id, i_rarity, i_attribute, member_name, member_band,
+    member_school_year, member_instrument, data
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET
+    i_rarity = excluded.i_rarity,
+    i_attribute = excluded.i_attribute,
+    member_name = excluded.member_name,
+    member_band = excluded.member_band,
+    member_school_year = excluded.member_school_year,
+    member_instrument = excluded.member_instrument,
+    data = excluded.data
+'''
+GET_CARD_IDS = 'SELECT id FROM cards'
+GET_MEMBER_NAMES = '''
+SELECT DISTINCT member_name FROM cards WHERE member_name IS NOT NULL
+'''
+
+# Mongo field paths used in card filters mapped to their columns.
+COLUMNS = {
+    '_id': 'id',
+    'i_rarity': 'i_rarity',
+    'i_attribute': 'i_attribute',
+    'member.name': 'member_name',
+    'member.i_band': 'member_band',
+    'member.i_school_year': 'member_school_year',
+    'member.instrument': 'member_instrument'
+}
+
+# Card fields returned by get_cards, matching the Mongo projection.
+CARD_FIELDS = (
+    'i_rarity', 'i_attribute', 'release_date', 'image', 'image_trained',
+    'art', 'art_trained'
+)
+MEMBER_FIELDS = ('name', 'i_school_year', 'i_band', 'instrument')
+
+
+class CardController(DatabaseController):
+    def __init__(self, sqlite_client):
+        """
+        Constructor for a CardController.
+
+        :param sqlite_client: SQLite client used by this controller.
+        """
+        super().__init__(sqlite_client)
+        # Incremented whenever the card catalog changes.
+        self.catalog_version = 0
+
+    async def upsert_card(self, card: dict):
+        """
+        Inserts a card into the card table if it does not exist.
+
+        :param card: Card dictionary to insert.
+        """
+        card = dict(card)
+        card['_id'] = card.pop('id')
+        member = card.get('member')
+        if not isinstance(member, dict):
+            member = {}
+
+        await self._execute(UPSERT_CARD, (
+            card['_id'],
+            card.get('i_rarity'),
+            card.get('i_attribute'),
+            member.get('name'),
+            member.get('i_band'),
+            member.get('i_school_year'),
+            member.get('instrument'),
+            json.dumps(card)
+        ))
+        self.catalog_version += 1
+
+    async def get_card(self, card_id: int) -> dict:
+        """
+        Gets a single card from the database.
+
+        :param card_id: ID of card to get.
+
+        :return: Matching card.
+        """
+        cards = await self.get_cards([card_id])
+        if cards:
+            return cards[0]
+        return None
+
+    async def get_cards(self, card_ids: list) -> list:
+        """
+        Gets a list of cards from the database.
+
+        :param card_ids: List of card IDs to get.
+
+        :return: Matching cards.
+        """
+        rows = []
+        for chunk in chunks(list(card_ids), self.MAX_PARAMS):
+            sql = (f'SELECT data FROM cards '
+                   f'WHERE id IN ({placeholders(len(chunk))})')
+            rows += await self._fetchall(sql, tuple(chunk))
+        return [_project(json.loads(row[0])) for row in rows]
+
+    async def get_random_cards(self, filters: dict, count: int) -> list:
+        """
+        Gets a random list of cards.
+
+        :param filters: Dicitonary of Mongo style filters to use.
+        :param count: Number of results to return.
+
+        :return: Random list of cards.
+        """
+        where, params = _where(filters)
+        sql = f'SELECT data FROM cards {where} ORDER BY RANDOM() LIMIT ?'
+        rows = await self._fetchall(sql, params + (count,))
+        return [json.loads(row[0]) for row in rows]
+
+    async def get_matching_card_ids(self, filters: dict) -> list:
+        """
+        Gets the IDs of all cards matching a filter.
+
+        :param filters: Dicitonary of Mongo style filters to use.
+
+        :return: List of card IDs.
+        """
+        where, params = _where(filters)
+        rows = await self._fetchall(f'SELECT id FROM cards {where}', params)
+        return [row[0] for row in rows]
+
+    async def get_card_ids(self) -> list:
+        """
+        Gets a list of all card IDs in the datase.
+
+        :return: List of card IDs.
+        """
+        return [row[0] for row in await self._fetchall(GET_CARD_IDS)]
+
+    async def get_member_names(self) -> list:
+        rows = await self._fetchall(GET_MEMBER_NAMES)
+        return [row[0] for row in rows]
+
+
+def _where(filters: dict) -> tuple:
+    """
+    Translates a Mongo style card filter into a sqlite WHERE clause.
+
+    :param filters: Dictionary mapping field paths to a value or to
+        {'$in': [values]}.
+
+    :return: Tuple of (where clause, parameters).
+    """
+    clauses = []
+    params = []
+    for field, value in filters.items():
+        column = COLUMNS.get(field)
+        if not column:
+            raise ValueError(f'Unsupported card filter: {field}')
+        if isinstance(value, dict) and '$in' in value:
+            values = list(value['$in'])
+            clauses.append(f'{column} IN ({placeholders(len(values))})')
+            params += values
+        else:
+            clauses.append(f'{column} = ?')
+            params.append(value)
+
+    where = 'WHERE ' + ' AND '.join(clauses) if clauses else ''
+    return where, tuple(params)
+
+
+def _project(card: dict) -> dict:
+    """
+    Strips a card down to the fields returned by get_cards.
+    """
+    result = {'_id': card['_id']}
+    for field in CARD_FIELDS:
+        if field in card:
+            result[field] = card[field]
+    member = card.get('member')
+    if isinstance(member, dict):
+        result['member'] = {
+            k: member[k] for k in MEMBER_FIELDS if k in member
+        }
+    return result
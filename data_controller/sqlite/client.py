@@ -0,0 +1,222 @@
+import sqlite3
+from asyncio import get_event_loop
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from data import data_path
+from data_controller.database_controller import StorageClient
+from data_controller.sqlite.user_controller import UserController
+from data_controller.sqlite.card_controller import CardController
+from data_controller.sqlite.member_controller import MemberController
+from data_controller.sqlite.play_controller import PlayController
+from data_controller.sqlite.feedback_controller import FeedbackController
+from data_controller.sqlite.server_controller import ServerController
+
+DATABASE_FILE = 'haha-no-4star.db'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    unique_cards INTEGER NOT NULL DEFAULT 0,
+    four_stars INTEGER NOT NULL DEFAULT 0,
+    last_active INTEGER,
+    archived INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS users_archive (
+    user_id TEXT PRIMARY KEY REFERENCES users (id) ON DELETE CASCADE,
+    album BLOB NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS album (
+    user_id TEXT NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    card_id INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    time_aquired INTEGER NOT NULL,
+    PRIMARY KEY (user_id, card_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS cards (
+    id INTEGER PRIMARY KEY,
+    i_rarity INTEGER,
+    i_attribute TEXT,
+    member_name TEXT,
+    member_band TEXT,
+    member_school_year TEXT,
+    member_instrument TEXT,
+    data TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS cards_rarity_band
+    ON cards (i_rarity, member_band);
+CREATE INDEX IF NOT EXISTS cards_member_name
+    ON cards (member_name, i_rarity);
+
+CREATE TABLE IF NOT EXISTS members (
+    id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS servers (
+    id TEXT PRIMARY KEY,
+    command_prefix TEXT
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS plays (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    time REAL NOT NULL,
+    box TEXT,
+    cards TEXT NOT NULL,
+    rarities TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS plays_user_time ON plays (user_id, time);
+CREATE INDEX IF NOT EXISTS plays_time ON plays (time);
+
+CREATE TABLE IF NOT EXISTS play_daily (
+    day TEXT PRIMARY KEY,
+    plays INTEGER NOT NULL,
+    users INTEGER NOT NULL,
+    cards INTEGER NOT NULL,
+    rarities TEXT NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS feedback (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT,
+    username TEXT,
+    date TEXT,
+    message TEXT
+);
+'''
+
+# Created after migrating databases made before the columns existed.
+MIGRATED_SCHEMA = '''
+CREATE INDEX IF NOT EXISTS users_unique_cards ON users (unique_cards DESC);
+CREATE INDEX IF NOT EXISTS users_four_stars ON users (four_stars DESC);
+CREATE INDEX IF NOT EXISTS users_last_active ON users (last_active);
+'''
+
+COMPUTE_SCORES = '''
+UPDATE users SET
+    unique_cards = (SELECT COUNT(*) FROM album WHERE user_id = users.id),
+    four_stars = (
+        SELECT COUNT(*) FROM album JOIN cards ON cards.id = album.card_id
+        WHERE album.user_id = users.id AND cards.i_rarity = 4
+    )
+'''
+
+COMPUTE_LAST_ACTIVE = '''
+UPDATE users SET last_active = (
+    SELECT MAX(time_aquired) FROM album WHERE user_id = users.id
+)
+'''
+
+# Columns added to existing tables, as (table, column, definition, statement
+# that fills the column or None).
+MIGRATIONS = (
+    ('users', 'unique_cards', 'INTEGER NOT NULL DEFAULT 0', COMPUTE_SCORES),
+    ('users', 'four_stars', 'INTEGER NOT NULL DEFAULT 0', COMPUTE_SCORES),
+    ('users', 'last_active', 'INTEGER', COMPUTE_LAST_ACTIVE),
+    ('users', 'archived', 'INTEGER NOT NULL DEFAULT 0', None)
+)
+
+
+class SQLiteClient(StorageClient):
+    """
+    Embedded storage backend. All statements run on a single worker thread
+        that owns the connection, so the event loop never waits on disk.
+    """
+
+    def __init__(self, options: dict = None, journal_options: dict = None):
+        """
+        Constructor for a SQLiteClient.
+
+        :param options: The "sqlite" section of config.json. Recognised keys
+            are "path", "cache_size_kb" and "mmap_size".
+        :param journal_options: The "journal" section of config.json.
+        """
+        super().__init__()
+        options = options or {}
+        path = Path(options.get('path', DATABASE_FILE))
+        self.path = path if path.is_absolute() else data_path.joinpath(path)
+        self.cache_size_kb = options.get('cache_size_kb', 20000)
+        self.mmap_size = options.get('mmap_size', 0)
+        self.connection = None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self.users = UserController(self)
+        self.cards = CardController(self)
+        self.members = MemberController(self)
+        self.feedback = FeedbackController(self)
+        self.servers = ServerController(self)
+        self.plays = PlayController(self, journal_options)
+
+    async def run(self, fn, *args):
+        """
+        Runs a function on the database thread.
+
+        :param fn: Function to run, called with the connection followed by
+            args.
+        :param args: Arguments passed to the function.
+
+        :return: The return value of the function.
+        """
+        return await get_event_loop().run_in_executor(
+            self._executor, fn, self.connection, *args)
+
+    async def connect(self):
+        """
+        Opens the database file and creates the schema if it is missing.
+        """
+        await get_event_loop().run_in_executor(self._executor, self._open)
+        self.plays.start()
+
+    async def close(self):
+        """
+        Writes buffered plays and closes the database file.
+        """
+        await self.plays.stop()
+        if self.connection:
+            await self.run(_close)
+            self.connection = None
+        self._executor.shutdown(wait=False)
+
+    def _open(self):
+        connection = sqlite3.connect(
+            str(self.path), cached_statements=256)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute('PRAGMA foreign_keys=ON')
+        connection.execute('PRAGMA temp_store=MEMORY')
+        connection.execute(f'PRAGMA cache_size=-{int(self.cache_size_kb)}')
+        connection.execute(f'PRAGMA mmap_size={int(self.mmap_size)}')
+        connection.executescript(SCHEMA)
+        _migrate(connection)
+        connection.executescript(MIGRATED_SCHEMA)
+        self.connection = connection
+
+
+def _migrate(connection):
+    """
+    Adds missing columns to tables created by older versions.
+    """
+    fills = []
+    with connection:
+        for table, column, definition, fill in MIGRATIONS:
+            columns = {
+                row[1] for row in connection.execute(
+                    f'PRAGMA table_info({table})')
+            }
+            if column not in columns:
+                connection.execute(
+                    f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+                if fill and fill not in fills:
+                    fills.append(fill)
+        for fill in fills:
+            connection.execute(fill)
+
+
+def _close(connection):
+    connection.execute('PRAGMA optimize')
+    connection.close()
@@ -0,0 +1,78 @@
+class DatabaseController:
+    """
+    Class for providing a controller that performs operations on
+        a sqlite database.
+    """
+
+    # Largest number of host parameters sqlite accepts in one statement.
+    MAX_PARAMS = 900
+
+    def __init__(self, sqlite_client):
+        """
+        Constructor for a DatabaseController.
+
+        :param sqlite_client: SQLite client used by this controller.
+        """
+        self.sqlite_client = sqlite_client
+
+    async def _fetchone(self, sql: str, params: tuple = ()):
+        """
+        Runs a query and returns the first row or None.
+        """
+        return await self.sqlite_client.run(_fetchone, sql, params)
+
+    async def _fetchall(self, sql: str, params: tuple = ()) -> list:
+        """
+        Runs a query and returns all rows.
+        """
+        return await self.sqlite_client.run(_fetchall, sql, params)
+
+    async def _execute(self, sql: str, params: tuple = ()) -> int:
+        """
+        Runs a statement in its own transaction.
+
+        :return: Number of rows changed.
+        """
+        return await self.sqlite_client.run(_execute, sql, params)
+
+    async def _transaction(self, fn, *args):
+        """
+        Runs a function with the connection inside a single transaction.
+
+        :param fn: Function called with the connection followed by args.
+
+        :return: The return value of the function.
+        """
+        return await self.sqlite_client.run(_transaction, fn, args)
+
+
+def _fetchone(connection, sql, params):
+    return connection.execute(sql, params).fetchone()
+
+
+def _fetchall(connection, sql, params):
+    return connection.execute(sql, params).fetchall()
+
+
+def _execute(connection, sql, params):
+    with connection:
+        return connection.execute(sql, params).rowcount
+
+
+def _transaction(connection, fn, args):
+    with connection:
+        return fn(connection, *args)
+
+
+def chunks(values: list, size: int) -> list:
+    """
+    Splits a list into chunks of at most size elements.
+    """
+    return [values[i:i + size] for i in range(0, len(values), size)]
+
+
+def placeholders(count: int) -> str:
+    """
+    Gets a comma separated list of count parameter placeholders.
+    """
+    return ', '.join(['?'] * count)
@@ -0,0 +1,16 @@
+from datetime import datetime
+from data_controller.sqlite.database_controller import DatabaseController
+
+INSERT_FEEDBACK = '''
+INSERT INTO feedback (user_id, username, date, message) VALUES (?, ?, ?, ?)
+'''
+
+
+class FeedbackController(DatabaseController):
+    async def add_feedback(self, user_id, username, message):
+        """
+        Insert a new feedback into the database.
+        """
+        date = datetime.now().isoformat()
+        await self._execute(
+            INSERT_FEEDBACK, (user_id, username, date, message))
@@ -0,0 +1,41 @@
+import json
+from data_controller.sqlite.database_controller import DatabaseController
+
+UPSERT_MEMBER = '''
+INSERT INTO members (id, data) VALUES (?, ?)
+ON CONFLICT (id) DO UPDATE SET data = excluded.data
+'''
+GET_MEMBER = 'SELECT data FROM members WHERE id = ?'
+GET_MEMBER_IDS = 'SELECT id FROM members'
+
+
+class MemberController(DatabaseController):
+    async def upsert_member(self, member: dict):
+        """
+        Inserts a member into the member table if it does not exist.
+
+        :param member: Member dictionary to insert.
+        """
+        member = dict(member)
+        member['_id'] = member.pop('id')
+        await self._execute(
+            UPSERT_MEMBER, (member['_id'], json.dumps(member)))
+
+    async def get_member(self, member_id: int) -> dict:
+        """
+        Gets a single member from the database.
+
+        :param member_id: ID of member to get.
+
+        :return: Matching member or None.
+        """
+        row = await self._fetchone(GET_MEMBER, (member_id,))
+        return json.loads(row[0]) if row else None
+
+    async def get_member_ids(self) -> list:
+        """
+        Gets a list of all member IDs in the database.
+
+        :return: List of member IDs.
+        """
+        return [row[0] for row in await self._fetchall(GET_MEMBER_IDS)]
@@ -0,0 +1,108 @@
+import json
+from datetime import datetime, timedelta
+
+from data_controller.play_journal import DAY_FORMAT, PlayJournal, day_bounds
+from data_controller.sqlite.database_controller import DatabaseController
+
+EPOCH = datetime(1970, 1, 1)
+
+INSERT_PLAY = '''
+INSERT INTO plays (user_id, time, box, cards, rarities) VALUES (?, ?, ?, ?, ?)
+'''
+GET_HISTORY = '''
+SELECT time, box, cards, rarities FROM plays WHERE user_id = ?
+ORDER BY time DESC LIMIT ? OFFSET ?
+'''
+COUNT_PLAYS = '''
+SELECT COUNT(*), COUNT(DISTINCT user_id) FROM plays
+WHERE time >= ? AND time < ?
+'''
+COUNT_RARITIES = '''
+SELECT rarity.value, COUNT(*) FROM plays, json_each(plays.rarities) AS rarity
+WHERE plays.time >= ? AND plays.time < ?
+GROUP BY rarity.value
+'''
+SET_DAILY = '''
+INSERT OR REPLACE INTO play_daily (day, plays, users, cards, rarities)
+VALUES (?, ?, ?, ?, ?)
+'''
+GET_DAILY = '''
+SELECT plays, users, cards, rarities FROM play_daily WHERE day = ?
+'''
+DELETE_OLD_PLAYS = 'DELETE FROM plays WHERE time < ?'
+
+
+class PlayController(DatabaseController, PlayJournal):
+    """
+    Play journal for the embedded backend, kept in the plays table with an
+        index on (user_id, time) for history lookups.
+    """
+
+    def __init__(self, sqlite_client, options: dict = None):
+        """
+        Constructor for a PlayController.
+
+        :param sqlite_client: SQLite client used by this controller.
+        :param options: The "journal" section of config.json.
+        """
+        DatabaseController.__init__(self, sqlite_client)
+        PlayJournal.__init__(self, options)
+
+    async def _write(self, entries: list):
+        await self._transaction(_insert_plays, [
+            (entry['user_id'], _timestamp(entry['time']), entry['box'],
+             json.dumps(entry['cards']), json.dumps(entry['rarities']))
+            for entry in entries
+        ])
+
+    async def get_history(self, user_id: str, page: int,
+                          page_size: int) -> list:
+        rows = await self._fetchall(
+            GET_HISTORY, (user_id, page_size, page * page_size))
+        return [
+            {
+                'time': datetime.utcfromtimestamp(row[0]),
+                'box': row[1],
+                'cards': json.loads(row[2]),
+                'rarities': json.loads(row[3])
+            }
+            for row in rows
+        ]
+
+    async def compact(self, day: datetime):
+        start, end = day_bounds(day)
+        oldest = start - timedelta(days=self.retention_days)
+        await self._transaction(
+            _compact, start.strftime(DAY_FORMAT), _timestamp(start),
+            _timestamp(end), _timestamp(oldest))
+
+    async def get_daily(self, day: datetime) -> dict:
+        row = await self._fetchone(GET_DAILY, (day.strftime(DAY_FORMAT),))
+        if not row:
+            return None
+        return {
+            'plays': row[0],
+            'users': row[1],
+            'cards': row[2],
+            'rarities': json.loads(row[3])
+        }
+
+
+def _insert_plays(connection, rows):
+    connection.executemany(INSERT_PLAY, rows)
+
+
+def _compact(connection, day, start, end, oldest):
+    plays, users = connection.execute(COUNT_PLAYS, (start, end)).fetchone()
+    rarities = {
+        str(rarity): count for rarity, count in
+        connection.execute(COUNT_RARITIES, (start, end)).fetchall()
+    }
+    connection.execute(SET_DAILY, (
+        day, plays, users, sum(rarities.values()), json.dumps(rarities)))
+    # Plays past the retention period are no longer needed.
+    connection.execute(DELETE_OLD_PLAYS, (oldest,))
+
+
+def _timestamp(time: datetime) -> float:
+    return (time - EPOCH).total_seconds()
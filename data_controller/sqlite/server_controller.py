@@ -0,0 +1,18 @@
+from data_controller.sqlite.database_controller import DatabaseController
+
+SET_PREFIX = '''
+INSERT INTO servers (id, command_prefix) VALUES (?, ?)
+ON CONFLICT (id) DO UPDATE SET command_prefix = excluded.command_prefix
+'''
+GET_PREFIX = 'SELECT command_prefix FROM servers WHERE id = ?'
+
+
+class ServerController(DatabaseController):
+    async def set_prefix(self, server_id: str, prefix: str):
+        await self._execute(SET_PREFIX, (server_id, prefix))
+
+    async def get_prefix(self, server_id: str) -> str:
+        row = await self._fetchone(GET_PREFIX, (server_id,))
+        if row and row[0]:
+            return row[0]
+        return '$'
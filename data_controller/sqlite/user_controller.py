@@ -0,0 +1,298 @@
+import time
+from collections import Counter
+from data_controller.archive import RECORD, new_report, pack_album, \
+    unpack_album
+from data_controller.sqlite.database_controller import DatabaseController, \
+    chunks, placeholders
+from data_controller.user_controller import SCORE_FIELDS, merge_card_info
+
+# Score fields mapped to their columns.
+SCORE_COLUMNS = {'unique': 'unique_cards', 'four_star': 'four_stars'}
+
+# Number of users moved to the archive at a time.
+ARCHIVE_BATCH_SIZE = 500
+
+GET_USER_COUNT = 'SELECT COUNT(*) FROM users'
+INSERT_USER = 'INSERT OR IGNORE INTO users (id) VALUES (?)'
+DELETE_USER = 'DELETE FROM users WHERE id = ?'
+GET_USER_IDS = 'SELECT id FROM users'
+FIND_USER = 'SELECT id FROM users WHERE id = ?'
+GET_ALBUM = '''
+SELECT card_id, count, time_aquired FROM album
+WHERE user_id = ? ORDER BY card_id
+'''
+GET_ALBUM_IDS = 'SELECT card_id FROM album WHERE user_id = ?'
+GET_ALBUM_CARD = '''
+SELECT card_id, count, time_aquired FROM album
+WHERE user_id = ? AND card_id = ?
+'''
+ADD_ALBUM_CARD = '''
+INSERT INTO album (user_id, card_id, count, time_aquired) VALUES (?, ?, ?, ?)
+ON CONFLICT (user_id, card_id) DO UPDATE SET count = count + excluded.count
+'''
+UPDATE_SCORES = '''
+UPDATE users SET
+    unique_cards = (SELECT COUNT(*) FROM album WHERE user_id = ?1),
+    four_stars = (
+        SELECT COUNT(*) FROM album JOIN cards ON cards.id = album.card_id
+        WHERE album.user_id = ?1 AND cards.i_rarity = 4
+    ),
+    last_active = ?2
+WHERE id = ?1
+'''
+GET_SCORES = 'SELECT unique_cards, four_stars FROM users WHERE id = ?'
+IS_ARCHIVED = 'SELECT archived FROM users WHERE id = ?'
+GET_INACTIVE_USERS = '''
+SELECT id FROM users WHERE archived = 0 AND last_active < ? AND id > ?
+ORDER BY id LIMIT ?
+'''
+ARCHIVE_ALBUM = 'INSERT OR REPLACE INTO users_archive (user_id, album) VALUES (?, ?)'
+DELETE_ALBUM = 'DELETE FROM album WHERE user_id = ?'
+SET_ARCHIVED = 'UPDATE users SET archived = ? WHERE id = ?'
+GET_ARCHIVED_ALBUM = 'SELECT album FROM users_archive WHERE user_id = ?'
+DELETE_ARCHIVED_ALBUM = 'DELETE FROM users_archive WHERE user_id = ?'
+REMOVE_ALBUM_CARD = '''
+UPDATE album SET count = count - 1
+WHERE user_id = ? AND card_id = ? AND count > 0
+'''
+
+
+class UserController(DatabaseController):
+    async def get_user_count(self) -> int:
+        row = await self._fetchone(GET_USER_COUNT)
+        return row[0]
+
+    async def insert_user(self, user_id: str):
+        """
+        Insert a new user into the database.
+
+        :param user_id: ID of new user.
+        """
+        await self._execute(INSERT_USER, (user_id,))
+
+    async def delete_user(self, user_id: str):
+        """
+        Delete a user and their album from the database.
+
+        :param user_id: ID of the user to delete.
+        """
+        await self._execute(DELETE_USER, (user_id,))
+
+    async def get_all_user_ids(self) -> list:
+        """
+        Gets a list of all user ids from the database.
+
+        :return: List of all user ids.
+        """
+        return [row[0] for row in await self._fetchall(GET_USER_IDS)]
+
+    async def find_user(self, user_id: str) -> dict:
+        """
+        Finds a user in the database.
+
+        :param user_id: ID of user to find in the database.
+
+        :return: Dictionary of found user.
+        """
+        if not await self._fetchone(FIND_USER, (user_id,)):
+            return None
+        await self._ensure_hot(user_id)
+        rows = await self._fetchall(GET_ALBUM, (user_id,))
+        return {'_id': user_id, 'album': [_album_entry(r) for r in rows]}
+
+    async def get_user_album(self, user_id: str,
+                             expand_info: bool=False) -> list:
+        """
+        Gets the cards album of a user.
+
+        :param user_id: User ID of the user to query the album from.
+
+        :return: Card album list.
+        """
+        await self._ensure_hot(user_id)
+        rows = await self._fetchall(GET_ALBUM, (user_id,))
+        album = [_album_entry(row) for row in rows]
+        if expand_info:
+            album = await merge_card_info(self.sqlite_client.cards, album)
+        return album
+
+    async def get_album_card_ids(self, user_id: str) -> set:
+        """
+        Gets the IDs of all cards in a user's album.
+
+        :param user_id: User ID of the user to query.
+
+        :return: Set of card IDs.
+        """
+        await self._ensure_hot(user_id)
+        rows = await self._fetchall(GET_ALBUM_IDS, (user_id,))
+        return {row[0] for row in rows}
+
+    async def get_card_from_album(self, user_id: str, card_id: int) -> dict:
+        """
+        Gets a card from a user's album.
+
+        :param user_id: User ID of the user to query the card from.
+
+        :return: Card dictionary or None if card does not exist.
+        """
+        await self._ensure_hot(user_id)
+        row = await self._fetchone(GET_ALBUM_CARD, (user_id, card_id))
+        if not row:
+            return None
+        result = await merge_card_info(
+            self.sqlite_client.cards, [_album_entry(row)])
+        return result[0] if result else None
+
+    async def add_to_user_album(self, user_id: str, new_cards: list,
+                                idolized: bool = False):
+        """
+        Adds a list of cards to a user's card album.
+
+        :param user_id: User ID of the user who's album will be added to.
+        :param new_cards: List of dictionaries of new cards to add.
+        :param idolized: Whether the new cards being added are idolized.
+        """
+        counts = Counter(card['_id'] for card in new_cards)
+        await self.add_counts_to_user_album(user_id, counts)
+
+    async def add_counts_to_user_album(self, user_id: str, counts: dict):
+        """
+        Adds cards to a user's card album and updates their scores in a
+            single transaction.
+
+        :param user_id: User ID of the user who's album will be added to.
+        :param counts: Dictionary mapping card IDs to the number of copies
+            to add.
+        """
+        await self._ensure_hot(user_id)
+        now = int(round(time.time() * 1000))
+        rows = [
+            (user_id, card_id, count, now) for card_id, count in counts.items()
+        ]
+        row = await self._transaction(_add_album_cards, user_id, now, rows)
+        scores = dict(zip(SCORE_FIELDS, row)) if row else None
+        self.sqlite_client.notify_album_write(user_id, counts, scores)
+
+    async def get_top_scores(self, field: str, limit: int,
+                             user_ids: list = None) -> list:
+        """
+        Gets the users with the highest score.
+
+        :param field: Score to rank by, one of SCORE_FIELDS.
+        :param limit: Number of users to get.
+        :param user_ids: Only rank these users if given.
+
+        :return: List of tuples of (user ID, score), best first.
+        """
+        column = SCORE_COLUMNS[field]
+        if user_ids is None:
+            sql = (f'SELECT id, {column} FROM users WHERE {column} > 0 '
+                   f'ORDER BY {column} DESC LIMIT ?')
+            return [tuple(r) for r in await self._fetchall(sql, (limit,))]
+
+        rows = []
+        for chunk in chunks(list(user_ids), self.MAX_PARAMS):
+            sql = (f'SELECT id, {column} FROM users WHERE {column} > 0 '
+                   f'AND id IN ({placeholders(len(chunk))}) '
+                   f'ORDER BY {column} DESC LIMIT ?')
+            rows += await self._fetchall(sql, tuple(chunk) + (limit,))
+        rows.sort(key=lambda r: r[1], reverse=True)
+        return [tuple(r) for r in rows[:limit]]
+
+    async def backfill_scores(self):
+        """
+        Scores of existing users are computed when the database is
+            migrated, so there is nothing to backfill.
+        """
+        pass
+
+    async def archive_inactive_users(self, inactive_days: int,
+                                     dry_run: bool = True) -> dict:
+        """
+        Moves the albums of users without album writes for a number of days
+            to the compressed archive. Archived albums are restored the next
+            time they are read.
+
+        :param inactive_days: Days without album writes.
+        :param dry_run: Only report what would be archived.
+
+        :return: Dictionary with the number of "users" and "cards", and the
+            approximate size of their albums in "album_bytes" and once
+            archived in "archive_bytes".
+        """
+        cutoff = int(round((time.time() - inactive_days * 86400) * 1000))
+        report = new_report(dry_run)
+        last_id = ''
+        while True:
+            # Batches keep the database thread free for commands in between.
+            user_ids = await self._fetchall(
+                GET_INACTIVE_USERS, (cutoff, last_id, ARCHIVE_BATCH_SIZE))
+            if not user_ids:
+                return report
+            last_id = user_ids[-1][0]
+            await self._transaction(
+                _archive_users, [row[0] for row in user_ids], report)
+
+    async def _ensure_hot(self, user_id: str):
+        """
+        Restores the album of a user if it is archived.
+        """
+        row = await self._fetchone(IS_ARCHIVED, (user_id,))
+        if row and row[0]:
+            await self._transaction(_rehydrate, user_id)
+
+    async def remove_from_user_album(self, user_id: str, card_id: int,
+                                     idolized: bool=False,
+                                     count: int=1) -> bool:
+        """
+        Removes a card from a user's card album.
+
+        :param user_id: User ID of the user who's album will be removed from.
+        :param card_id: ID of the card to remove.
+        :param idolized: Whether the card being removed is idolized.
+
+        :return: True if a card was deleted successfully, otherwise False.
+        """
+        await self._ensure_hot(user_id)
+        changed = await self._execute(REMOVE_ALBUM_CARD, (user_id, card_id))
+        if not changed:
+            return False
+        self.sqlite_client.notify_album_write(user_id, {card_id: -1})
+        return True
+
+
+def _add_album_cards(connection, user_id, now, rows):
+    connection.executemany(ADD_ALBUM_CARD, rows)
+    connection.execute(UPDATE_SCORES, (user_id, now))
+    return connection.execute(GET_SCORES, (user_id,)).fetchone()
+
+
+def _archive_users(connection, user_ids, report):
+    for user_id in user_ids:
+        rows = connection.execute(GET_ALBUM, (user_id,)).fetchall()
+        data = pack_album([_album_entry(row) for row in rows])
+        report['users'] += 1
+        report['cards'] += len(rows)
+        # Each album row stores the user ID along with the record.
+        report['album_bytes'] += len(rows) * (len(user_id) + RECORD.size)
+        report['archive_bytes'] += len(data)
+        if not report['dry_run']:
+            connection.execute(ARCHIVE_ALBUM, (user_id, data))
+            connection.execute(DELETE_ALBUM, (user_id,))
+            connection.execute(SET_ARCHIVED, (1, user_id))
+
+
+def _rehydrate(connection, user_id):
+    row = connection.execute(GET_ARCHIVED_ALBUM, (user_id,)).fetchone()
+    if row:
+        connection.executemany(ADD_ALBUM_CARD, [
+            (user_id, card['id'], card['count'], card['time_aquired'])
+            for card in unpack_album(row[0])
+        ])
+        connection.execute(DELETE_ARCHIVED_ALBUM, (user_id,))
+    connection.execute(SET_ARCHIVED, (0, user_id))
+
+
+def _album_entry(row) -> dict:
+    return {'id': row[0], 'count': row[1], 'time_aquired': row[2]}
@@ -0,0 +1,28 @@
+from data_controller.database_controller import StorageClient
+from data_controller.mongo import MongoClient
+from data_controller.sqlite import SQLiteClient
+
+BACKENDS = {
+    'mongo': MongoClient,
+    'sqlite': SQLiteClient
+}
+
+
+def get_storage(config: dict) -> StorageClient:
+    """
+    Creates the storage backend selected in config.
+
+    :param config: The bot config. "storage" selects the backend and the
+        section with the same name holds its options. Setting the section
+        to false disables storage. "journal" holds the play journal options.
+
+    :return: The storage client, or None if storage is disabled.
+    """
+    backend = config.get('storage', 'mongo')
+    if backend not in BACKENDS:
+        raise ValueError(f'Unknown storage backend: {backend}')
+
+    options = config.get(backend, {})
+    if options is False:
+        return None
+    return BACKENDS[backend](options, config.get('journal', {}))
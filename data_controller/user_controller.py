@@ -1,7 +1,24 @@
 import time
+from collections import Counter
+from bson import BSON, Binary
+from pymongo import DESCENDING, ReplaceOne, ReturnDocument, UpdateOne
+from data_controller.archive import new_report, pack_album, unpack_album
 from data_controller.database_controller import DatabaseController
+from data_controller.packed_album import PackedAlbum, unpack_array
 import pprint
 
+# Leaderboard scores kept on every user document.
+SCORE_FIELDS = ('unique', 'four_star')
+
+# Number of users read and updated at a time when backfilling scores.
+BACKFILL_BATCH_SIZE = 1000
+
+# Number of users moved to the archive at a time.
+ARCHIVE_BATCH_SIZE = 500
+
+# Attempts at writing an album before giving up on concurrent writes.
+MAX_WRITE_ATTEMPTS = 5
+
 class UserController(DatabaseController):
     def __init__(self, mongo_client):
         """
@@ -9,7 +26,17 @@ class UserController(DatabaseController):
 
         :param mongo_client: Mongo client used by this controller.
         """
-        super().__init__(mongo_client, 'users')
+        super().__init__(mongo_client, 'users', 'album')
+        self._archive = mongo_client.get_collection('users_archive', 'album')
+        # Albums are upgraded to the packed format when they are written.
+        self.packed_albums = mongo_client.options.get('packed_albums', False)
+
+    async def create_indexes(self):
+        """
+        Creates the indexes used to rank users by score.
+        """
+        for field in SCORE_FIELDS:
+            await self._collection.create_index([(f'score.{field}', DESCENDING)])
 
     async def get_user_count(self) -> int:
         return await self._collection.find().count()
@@ -20,7 +47,11 @@ class UserController(DatabaseController):
 
         :param user_id: ID of new user.
         """
-        await self._collection.insert_one({'_id': user_id, 'album': []})
+        await self._collection.insert_one({
+            '_id': user_id,
+            'album': [],
+            'score': {field: 0 for field in SCORE_FIELDS}
+        })
 
     async def delete_user(self, user_id: str):
         """
@@ -46,7 +77,7 @@ class UserController(DatabaseController):
 
         :return: Dictionary of found user.
         """
-        return await self._collection.find_one({'_id': user_id})
+        return await self._find_user_doc(user_id)
 
     async def get_user_album(self, user_id: str, expand_info: bool=False) -> list:
         """
@@ -61,7 +92,7 @@ class UserController(DatabaseController):
         if not user_doc:
             return []
 
-        album = user_doc['album']
+        album = _album_entries(user_doc)
         if expand_info:
             album = await self._merge_card_info(album)
   
@@ -76,14 +107,19 @@ class UserController(DatabaseController):
         :return: Card dictionary or None if card does not exist.
         """
         search_filter = {"$elemMatch": {"id": card_id}}
-        cursor = self._collection.find(
-            {"_id": user_id},
-            {"album": search_filter}
-        )
-        search = await cursor.to_list(None)
-
-        if len(search) > 0 and 'album' in search[0]:
-            result =  search[0]['album'][0]
+        search = await self._find_user_doc(
+            user_id, {"album": search_filter, "album_packed": 1})
+
+        result = None
+        if search and 'album_packed' in search:
+            album = PackedAlbum.from_document(search['album_packed'])
+            i = album.index(card_id)
+            if i >= 0:
+                result = album.to_entries()[i]
+        elif search and 'album' in search:
+            result =  search['album'][0]
+
+        if result:
             result = await self._merge_card_info([result])
             return result[0]
             
@@ -98,29 +134,359 @@ class UserController(DatabaseController):
         :param new_cards: List of dictionaries of new cards to add.
         :param idolized: Whether the new cards being added are idolized.
         """
-        for card in new_cards:
-            # User does not have this card, push to album
-            if not await self._user_has_card(user_id, card['_id']):
-                new_card = {
-                    'id': card['_id'],
-                    'count': 1,
-                    'time_aquired': int(round(time.time() * 1000))
-                }
+        counts = Counter(card['_id'] for card in new_cards)
+        await self.add_counts_to_user_album(user_id, counts)
 
-                sort = {'id': 1}
-                insert_card = {'$each': [new_card], '$sort': sort}
+    async def add_counts_to_user_album(self, user_id: str, counts: dict):
+        """
+        Adds cards to a user's card album, retrying if the album changes
+            or is archived while it is written.
+
+        :param user_id: User ID of the user who's album will be added to.
+        :param counts: Dictionary mapping card IDs to the number of copies
+            to add.
+        """
+        if not counts:
+            return
+
+        user_doc = await self._find_user_doc(
+            user_id, {'album.id': 1, 'album_packed': 1, 'rev': 1})
+        now = int(round(time.time() * 1000))
+        if user_doc and self.packed_albums:
+            scores = await self._add_counts_packed(
+                user_id, user_doc, counts, now)
+            self.mongo_client.notify_album_write(user_id, counts, scores)
+            return
+
+        pending = counts
+        scores = None
+        for _ in range(MAX_WRITE_ATTEMPTS):
+            if not user_doc:
+                break
+            if 'album_packed' in user_doc:
+                scores = await self._add_counts_packed(
+                    user_id, user_doc, pending, now)
+                break
+            pending, scores = await self._add_counts_list(
+                user_id, user_doc, pending, now)
+            if not pending:
+                break
+            # The album changed or was archived since it was read. Read it
+            # again, restoring it first if it was archived.
+            user_doc = await self._find_user_doc(
+                user_id, {'album.id': 1, 'album_packed': 1, 'rev': 1})
+        else:
+            raise RuntimeError(f'Album of user {user_id} kept changing')
+
+        self.mongo_client.notify_album_write(user_id, counts, scores)
+
+    async def _add_counts_list(self, user_id: str, user_doc: dict,
+                               counts: dict, now: int) -> tuple:
+        """
+        Adds cards to a list format album, incrementing owned cards in one
+            write and pushing new cards together with the score update in
+            another. Both writes only match the album as it was read, and
+            never an archived album whose cards would be overwritten when
+            it is restored.
+
+        :return: Tuple of (dictionary of the counts that were not added,
+            the user's new scores or None).
+        """
+        positions = {
+            card['id']: i for i, card in enumerate(user_doc.get('album', []))
+        }
+        rev = user_doc.get('rev')
+        search = {
+            '_id': user_id,
+            'archived': {'$ne': True},
+            'rev': rev if rev else {'$exists': False}
+        }
+
+        # User has these cards, increment counts
+        owned = {
+            f'album.{positions[card_id]}.count': count
+            for card_id, count in counts.items() if card_id in positions
+        }
+        if owned:
+            result = await self._collection.update_one(
+                search,
+                {'$inc': dict(owned, rev=1), '$set': {'last_active': now}}
+            )
+            if not result.matched_count:
+                return counts, None
+            search['rev'] = (rev or 0) + 1
+
+        # User does not have these cards, push to album
+        new_cards = [
+            {'id': card_id, 'count': count, 'time_aquired': now}
+            for card_id, count in counts.items() if card_id not in positions
+        ]
+        if not new_cards:
+            return {}, None
+
+        new_ids = [card['id'] for card in new_cards]
+        four_stars = await self.mongo_client.cards.get_matching_card_ids(
+            {'_id': {'$in': new_ids}, 'i_rarity': 4})
+        insert_cards = {'$each': new_cards, '$sort': {'id': 1}}
+        # Only push if no concurrent write added any of the cards, so they
+        # are never in the album or the scores twice.
+        result = await self._collection.find_one_and_update(
+            dict(search, **{'album.id': {'$nin': new_ids}}),
+            {
+                '$push': {'album': insert_cards},
+                '$set': {'last_active': now},
+                '$inc': {
+                    'rev': 1,
+                    'score.unique': len(new_cards),
+                    'score.four_star': len(four_stars)
+                }
+            },
+            {'score': 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if not result:
+            return {card_id: counts[card_id] for card_id in new_ids}, None
+        return {}, result.get('score')
 
-                await self._collection.update_one(
-                    {'_id': user_id},
-                    {'$push': {'album': insert_card}}
-                )
+    async def _add_counts_packed(self, user_id: str, user_doc: dict,
+                                 counts: dict, now: int) -> dict:
+        """
+        Adds cards to a packed album, upgrading the album if it is still a
+            list. Every album write, in either format, increments the rev
+            field, so the write is retried if another write got there
+            first.
 
-            # User has this card, increment count
+        :return: The user's new scores.
+        """
+        for _ in range(MAX_WRITE_ATTEMPTS):
+            if 'album_packed' in user_doc:
+                album = PackedAlbum.from_document(user_doc['album_packed'])
             else:
-                await self._collection.update(
-                    {'_id': user_id, 'album.id': card['_id']},
-                    {'$inc': {'album.$.count': 1}}
-                )
+                user_doc = await self._find_user_doc(
+                    user_id, {'album': 1, 'rev': 1})
+                album = PackedAlbum.from_entries(user_doc.get('album', []))
+
+            new_ids = album.add(counts, now)
+            four_stars = []
+            if new_ids:
+                four_stars = await self.mongo_client.cards.get_matching_card_ids(
+                    {'_id': {'$in': new_ids}, 'i_rarity': 4})
+
+            rev = user_doc.get('rev')
+            packed = {k: Binary(v) for k, v in album.to_document().items()}
+            result = await self._collection.find_one_and_update(
+                {'_id': user_id, 'rev': rev if rev else {'$exists': False}},
+                {
+                    '$set': {'album_packed': packed, 'last_active': now},
+                    '$unset': {'album': ''},
+                    '$inc': {
+                        'rev': 1,
+                        'score.unique': len(new_ids),
+                        'score.four_star': len(four_stars)
+                    }
+                },
+                {'score': 1},
+                return_document=ReturnDocument.AFTER
+            )
+            if result:
+                return result.get('score')
+            user_doc = await self._find_user_doc(
+                user_id, {'album_packed': 1, 'rev': 1})
+        raise RuntimeError(f'Album of user {user_id} kept changing')
+
+    async def get_top_scores(self, field: str, limit: int,
+                             user_ids: list = None) -> list:
+        """
+        Gets the users with the highest score.
+
+        :param field: Score to rank by, one of SCORE_FIELDS.
+        :param limit: Number of users to get.
+        :param user_ids: Only rank these users if given.
+
+        :return: List of tuples of (user ID, score), best first.
+        """
+        search = {f'score.{field}': {'$gt': 0}}
+        if user_ids is not None:
+            search['_id'] = {'$in': list(user_ids)}
+        cursor = self._collection.find(
+            search, {f'score.{field}': 1}
+        ).sort(f'score.{field}', DESCENDING).limit(limit)
+        return [
+            (user_doc['_id'], user_doc['score'][field])
+            for user_doc in await cursor.to_list(None)
+        ]
+
+    async def backfill_scores(self):
+        """
+        Computes the scores of users created before scores were kept, in
+            batches. Run before the bot handles commands so no album writes
+            race with it.
+        """
+        four_stars = set(await self.mongo_client.cards.get_matching_card_ids(
+            {'i_rarity': 4}))
+        cursor = self._collection.find(
+            {'score': {'$exists': False}}, {'album.id': 1, 'album_packed': 1}
+        ).batch_size(BACKFILL_BATCH_SIZE)
+
+        writes = []
+        async for user_doc in cursor:
+            card_ids = _album_card_ids(user_doc)
+            score = {
+                'unique': len(card_ids),
+                'four_star': len(card_ids & four_stars)
+            }
+            writes.append(UpdateOne(
+                {'_id': user_doc['_id']}, {'$set': {'score': score}}))
+            if len(writes) >= BACKFILL_BATCH_SIZE:
+                await self._collection.bulk_write(writes, ordered=False)
+                writes = []
+        if writes:
+            await self._collection.bulk_write(writes, ordered=False)
+
+    async def archive_inactive_users(self, inactive_days: int,
+                                     dry_run: bool = True) -> dict:
+        """
+        Moves the albums of users without album writes for a number of days
+            to the compressed archive. Archived albums are restored the next
+            time they are read.
+
+        :param inactive_days: Days without album writes.
+        :param dry_run: Only report what would be archived.
+
+        :return: Dictionary with the number of "users" and "cards", and the
+            size of their albums in "album_bytes" and once archived in
+            "archive_bytes".
+        """
+        cutoff = int(round((time.time() - inactive_days * 86400) * 1000))
+        report = new_report(dry_run)
+        # Users from before last_active was kept are judged by their newest
+        # card.
+        cursor = self._collection.find(
+            {
+                'archived': {'$ne': True},
+                '$and': [
+                    {'$or': [
+                        {'album.0': {'$exists': True}},
+                        {'album_packed': {'$exists': True}}
+                    ]},
+                    {'$or': [
+                        {'last_active': {'$lt': cutoff}},
+                        {'last_active': {'$exists': False}}
+                    ]}
+                ]
+            },
+            {'album': 1, 'album_packed': 1, 'last_active': 1, 'rev': 1}
+        ).batch_size(ARCHIVE_BATCH_SIZE)
+
+        batch = []
+        async for user_doc in cursor:
+            album = _album_entries(user_doc)
+            if not album:
+                continue
+            last_active = user_doc.get('last_active') or max(
+                card.get('time_aquired') or 0 for card in album)
+            if last_active >= cutoff:
+                continue
+
+            data = pack_album(album)
+            report['users'] += 1
+            report['cards'] += len(album)
+            stored = {k: user_doc[k] for k in ('album', 'album_packed')
+                      if k in user_doc}
+            report['album_bytes'] += len(BSON.encode(stored))
+            report['archive_bytes'] += len(data)
+            if not dry_run:
+                batch.append((user_doc, data))
+            if len(batch) >= ARCHIVE_BATCH_SIZE:
+                await self._archive_batch(batch)
+                batch = []
+        if batch:
+            await self._archive_batch(batch)
+        return report
+
+    async def _archive_batch(self, batch: list):
+        """
+        Archives a batch of users. The archive copies are written first, so
+            an album is never cleared without one.
+
+        :param batch: List of tuples of (user document, packed album).
+        """
+        await self._archive.bulk_write([
+            ReplaceOne(
+                {'_id': user_doc['_id']},
+                {'_id': user_doc['_id'], 'album': Binary(data)},
+                upsert=True
+            )
+            for user_doc, data in batch
+        ], ordered=False)
+
+        # Users whose album changed since it was read are left alone.
+        writes = []
+        for user_doc, _ in batch:
+            rev = user_doc.get('rev')
+            search = {
+                '_id': user_doc['_id'],
+                'rev': rev if rev else {'$exists': False}
+            }
+            writes.append(UpdateOne(
+                search,
+                {
+                    '$set': {'album': [], 'archived': True},
+                    '$unset': {'album_packed': ''},
+                    '$inc': {'rev': 1}
+                }
+            ))
+        result = await self._collection.bulk_write(writes, ordered=False)
+        if result.matched_count == len(batch):
+            return
+
+        # Drop the copies of the users left alone. Users restored since are
+        # not archived either, but _rehydrate already deleted their copies.
+        user_ids = [user_doc['_id'] for user_doc, _ in batch]
+        archived = set(await self._collection.find(
+            {'_id': {'$in': user_ids}, 'archived': True}).distinct('_id'))
+        await self._archive.delete_many(
+            {'_id': {'$in': [i for i in user_ids if i not in archived]}})
+
+    async def _rehydrate(self, user_id: str):
+        """
+        Restores the album of an archived user.
+
+        :param user_id: ID of the archived user.
+        """
+        archived = await self._archive.find_one({'_id': user_id})
+        if not archived:
+            return
+        result = await self._collection.update_one(
+            {'_id': user_id, 'archived': True},
+            {
+                '$set': {'album': unpack_album(archived['album'])},
+                '$unset': {'archived': ''},
+                '$inc': {'rev': 1}
+            }
+        )
+        if result.modified_count:
+            await self._archive.delete_one({'_id': user_id})
+
+    async def _find_user_doc(self, user_id: str,
+                             projection: dict = None) -> dict:
+        """
+        Finds a user document, restoring the album first if the user is
+            archived.
+
+        :param user_id: ID of the user.
+        :param projection: Fields to return, all fields if None.
+
+        :return: The user document or None.
+        """
+        if projection is not None:
+            projection = dict(projection, archived=1)
+        user_doc = await self._collection.find_one({'_id': user_id}, projection)
+        if user_doc and user_doc.get('archived'):
+            await self._rehydrate(user_id)
+            user_doc = await self._collection.find_one(
+                {'_id': user_id}, projection)
+        return user_doc
 
     async def remove_from_user_album(self, user_id: str, card_id: int,
                                      idolized: bool=False,
@@ -143,60 +509,143 @@ class UserController(DatabaseController):
         if count < 0:
             return False
 
-        # Update values
-        await self._collection.update(
-            {'_id': user_id, 'album.id': card_id},
-            {
-                '$set': {
-                    'album.$.count': count,
+        now = int(round(time.time() * 1000))
+        user_doc = await self._find_user_doc(
+            user_id, {'album_packed': 1, 'rev': 1})
+        if 'album_packed' in user_doc:
+            if not await self._remove_packed(
+                    user_id, user_doc, card_id, now):
+                return False
+        else:
+            # Update values
+            result = await self._collection.update_one(
+                {'_id': user_id, 'album.id': card_id,
+                 'archived': {'$ne': True}},
+                {
+                    '$set': {
+                        'album.$.count': count,
+                        'last_active': now
+                    },
+                    '$inc': {'rev': 1}
                 }
-            }
-        )
+            )
+            if not result.matched_count:
+                return False
+        self.mongo_client.notify_album_write(user_id, {card_id: -1})
         return True
 
+    async def _remove_packed(self, user_id: str, user_doc: dict,
+                             card_id: int, now: int) -> bool:
+        """
+        Removes a copy of a card from a packed album. Like
+            _add_counts_packed, the write is retried if another write got
+            there first.
+
+        :return: True if a copy was removed, otherwise False.
+        """
+        for _ in range(MAX_WRITE_ATTEMPTS):
+            album = PackedAlbum.from_document(user_doc['album_packed'])
+            i = album.index(card_id)
+            if i < 0 or album.counts[i] == 0:
+                return False
+            album.counts[i] -= 1
+
+            rev = user_doc.get('rev')
+            packed = {k: Binary(v) for k, v in album.to_document().items()}
+            result = await self._collection.update_one(
+                {'_id': user_id, 'rev': rev if rev else {'$exists': False}},
+                {
+                    '$set': {'album_packed': packed, 'last_active': now},
+                    '$inc': {'rev': 1}
+                }
+            )
+            if result.modified_count:
+                return True
+            user_doc = await self._find_user_doc(
+                user_id, {'album_packed': 1, 'rev': 1})
+            if not user_doc or 'album_packed' not in user_doc:
+                return False
+        raise RuntimeError(f'Album of user {user_id} kept changing')
+
     async def _user_has_card(self, user_id: str, card_id: int) -> bool:
-        search_filter = {'$elemMatch': {'id': card_id}}
+        return card_id in await self.get_album_card_ids(user_id)
 
-        search = await self._collection.find_one(
-            {'_id': user_id},
-            {'album': search_filter}
-        )
+    async def get_album_card_ids(self, user_id: str) -> set:
+        """
+        Gets the IDs of all cards in a user's album.
+
+        :param user_id: User ID of the user to query.
 
-        return len(search.keys()) > 1
+        :return: Set of card IDs.
+        """
+        user_doc = await self._find_user_doc(
+            user_id, {'album.id': 1, 'album_packed.ids': 1})
+        if not user_doc:
+            return set()
+        return _album_card_ids(user_doc)
 
     async def _merge_card_info(self, album: list) -> list:
         """
         Merges card information to an album.
 
         :param album: Album list.
-        :param card_infos: Card information to join.
 
         :return: New list of card dictionaries with merged information.
         """
-        card_ids = [card['id'] for card in album]
-        db_card_infos = await self.mongo_client.cards.get_cards(card_ids)
-        
-        card_infos = {}
-        for info in db_card_infos:
-            card_infos[info['_id']] = info
-
-        rem = []
-        rem_ids = []
-        for i in range(0, len(album)):
-            a_id = album[i]['id']
-            if a_id not in card_infos:
-                rem.append(i)
-                rem_ids.append(a_id)
-                continue
+        return await merge_card_info(self.mongo_client.cards, album)
+
+
+def _album_entries(user_doc: dict) -> list:
+    """
+    Gets the album entries of a user document in either format.
+    """
+    if 'album_packed' in user_doc:
+        return PackedAlbum.from_document(user_doc['album_packed']).to_entries()
+    return user_doc.get('album', [])
+
+
+def _album_card_ids(user_doc: dict) -> set:
+    """
+    Gets the card IDs of a user document in either format.
+    """
+    if 'album_packed' in user_doc:
+        return set(unpack_array(user_doc['album_packed'], 'ids'))
+    return {card['id'] for card in user_doc.get('album', [])}
+
+
+async def merge_card_info(cards, album: list) -> list:
+    """
+    Merges card information to an album.
+
+    :param cards: Card controller used to look up card information.
+    :param album: Album list.
+
+    :return: New list of card dictionaries with merged information.
+    """
+    card_ids = [card['id'] for card in album]
+    db_card_infos = await cards.get_cards(card_ids)
+
+    card_infos = {}
+    for info in db_card_infos:
+        card_infos[info['_id']] = info
+
+    rem = []
+    rem_ids = []
+    for i in range(0, len(album)):
+        a_id = album[i]['id']
+        if a_id not in card_infos:
+            rem.append(i)
+            rem_ids.append(a_id)
+            continue
+
+        for key in card_infos[a_id]:
+            if key == 'member':
+                for idol_key in card_infos[a_id][key]:
+                    album[i][idol_key] = card_infos[a_id][key][idol_key]
+            else:
+                album[i][key] = card_infos[a_id][key]
 
-            for key in card_infos[a_id]:
-                if key == 'member':
-                    for idol_key in card_infos[a_id][key]:
-                        album[i][idol_key] = card_infos[a_id][key][idol_key]
-                else:
-                    album[i][key] = card_infos[a_id][key]
-
-        if rem:
-            print("Stripping " + str(rem_ids) + " from album...")
-        [album.pop(i) for i in rem[::-1]]
-        return album
\ No newline at end of file
+    if rem:
+        print("Stripping " + str(rem_ids) + " from album...")
+    [album.pop(i) for i in rem[::-1]]
+    return album
@@ -1,16 +1,25 @@
 '''
 A discord bot for gacha in Bang Dream: Girls Band Party!
 '''
-from asyncio import get_event_loop
+from asyncio import ensure_future, get_event_loop
 from json import load
 from time import time
 from threading import Thread
 
 from commands import *
 from bot import HahaNo4Star, get_session_manager
-from bot.logger import setup_logging
+from bot.admission import admission_controller
+from bot.logger import setup_logging, stop_logging
+from bot.loop_monitor import get_loop_monitor
+from bot.metrics import metrics, start_metrics_server
 from config import config_path
-from data_controller.mongo import MongoClient
+from core.banner import banner_sampler, load_banners
+from core.album_pages import album_pages
+from core.leaderboard import leaderboard
+from core.memory import memory_tracer, report_memory
+from core.ownership import ownership_index
+from core.session_store import get_session_store, save_sessions
+from data_controller.storage import get_storage
 from logs import log_path
 from data_controller.card_updater import update_task
 
@@ -37,36 +46,73 @@ channel.Overwrites = Overwrites
 
 def main():
     start_time = int(time())
-    logger = setup_logging(start_time, log_path)
-    loop = get_event_loop()
-    session_manager = loop.run_until_complete(get_session_manager(logger))
-
     with config_path.joinpath('config.json').open() as f:
         config = load(f)
     with config_path.joinpath('auth.json').open() as f:
         auth = load(f)
 
-    db = MongoClient() if config.get('mongo', True) else None
+    logger = setup_logging(start_time, log_path, config.get('logging', {}))
+    loop = get_event_loop()
+
+    session_manager = loop.run_until_complete(
+        get_session_manager(logger, config.get('http', {})))
+    loop.run_until_complete(
+        start_metrics_server(metrics, config.get('metrics', {})))
+
+    banner_sampler.set_banners(
+        load_banners(config_path.joinpath('banners.json')))
+
+    db = get_storage(config)
+    if db:
+        loop.run_until_complete(db.connect())
+        db.add_album_listener(ownership_index.on_album_write)
+        db.add_album_listener(leaderboard.on_album_write)
+        db.add_album_listener(album_pages.on_album_write)
+        loop.run_until_complete(leaderboard.rebuild(db))
 
     bot = HahaNo4Star(
         config['default_prefix'], start_time, int(config['colour'], base=16),
-        logger, session_manager, db, auth['error_log'], auth['feedback_log']
+        logger, session_manager, db, auth['error_log'], auth['feedback_log'],
+        auth.get('owners', [])
     )
 
+    session_options = config.get('album_sessions', {})
+    album_sessions = get_session_store(session_options)
+    if session_options.get('save_interval', 300):
+        ensure_future(save_sessions(
+            album_sessions, session_options.get('save_interval', 300)))
+
     bot.remove_command('help')
     cogs = [
         Play(bot), 
-        Album(bot), 
+        Album(bot, album_sessions), 
         Info(bot), 
         Stats(bot), 
-        Config(bot)
+        Config(bot),
+        Admin(bot)
     ]
 
-    card_update_thread = Thread(target=update_task)
-    card_update_thread.setDaemon(True)
-    card_update_thread.start()
+    if db:
+        card_update_thread = Thread(
+            target=update_task, args=(db, session_manager, loop))
+        card_update_thread.setDaemon(True)
+        card_update_thread.start()
 
+    admission_controller.configure(config.get('admission', {}))
+    album_pages.configure(config.get('album_pages', {}))
+    loop_monitor = get_loop_monitor(logger, config.get('loop_monitor', {}))
+    loop_monitor.start(loop)
+    memory_options = config.get('memory', {})
+    memory_tracer.frames = memory_options.get('frames', 1)
+    if memory_options.get('trace'):
+        memory_tracer.start()
+    if memory_options.get('report_interval'):
+        ensure_future(report_memory(
+            logger, memory_tracer, memory_options['report_interval']))
     bot.start_bot(cogs, auth['token'])
+    loop_monitor.stop()
+    album_sessions.save()
+    stop_logging()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,354 @@
+"""
+Benchmarks PlayHandler against an in-memory card pool and checks that plays
+follow the advertised rates.
+
+Usage:
+    python scripts/scout_benchmark.py [--plays N] [--output results.json]
+                                      [--compare old_results.json]
+"""
+import json
+import math
+import subprocess
+import sys
+from argparse import ArgumentParser
+from asyncio import get_event_loop
+from collections import Counter
+from pathlib import Path
+from random import seed
+from time import perf_counter, time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.odds import expected_rarities
+from core.scout_handler import RATES, PlayHandler
+
+BANDS = ["Poppin' Party", 'Afterglow', 'Pastel*Palettes', 'Roselia',
+         'Hello, Happy World!']
+ATTRIBUTES = ['Power', 'Pure', 'Cool', 'Happy']
+
+# (name, box, count, guaranteed 3 star, bulk)
+CONFIGURATIONS = [
+    ('play1', 'star', 1, False, False),
+    ('play5', 'star', 5, True, False),
+    ('play10', 'star', 10, True, False),
+    ('playdf1', 'df', 1, False, False),
+    ('playdf10', 'df', 10, True, False),
+    ('playbulk100', 'star', 100, True, True),
+    ('playbulk1000', 'star', 1000, True, True)
+]
+
+# Results with a p-value below this are reported as failures.
+SIGNIFICANCE = 0.001
+
+
+class MemoryCards:
+    """
+    Card controller serving a generated card pool from memory.
+    """
+
+    def __init__(self, cards_per_rarity: int):
+        self.catalog_version = 0
+        self.cards = {}
+        card_id = 1
+        for rarity in (2, 3, 4):
+            for i in range(cards_per_rarity):
+                band = BANDS[i % len(BANDS)]
+                self.cards[card_id] = {
+                    '_id': card_id,
+                    'i_rarity': rarity,
+                    'i_attribute': ATTRIBUTES[i % len(ATTRIBUTES)],
+                    'image': f'{card_id}.png',
+                    'art': f'{card_id}_art.png',
+                    'member': {
+                        'name': f'{band} {i % 5}',
+                        'i_band': band,
+                        'i_school_year': 'First',
+                        'instrument': 'Guitar'
+                    }
+                }
+                card_id += 1
+
+    async def get_matching_card_ids(self, filters: dict) -> list:
+        return [
+            card_id for card_id, card in self.cards.items()
+            if all(_matches(card, f, v) for f, v in filters.items())
+        ]
+
+    async def get_cards(self, card_ids: list) -> list:
+        return [self.cards[card_id] for card_id in card_ids]
+
+
+class MemoryStorage:
+    def __init__(self, cards_per_rarity: int):
+        self.cards = MemoryCards(cards_per_rarity)
+
+
+class StubBot:
+    def __init__(self, cards_per_rarity: int):
+        self.db = MemoryStorage(cards_per_rarity)
+        self.member_names = []
+        self.session_manager = None
+
+
+def _matches(card: dict, field: str, value) -> bool:
+    for part in field.split('.'):
+        card = card.get(part) if isinstance(card, dict) else None
+    if isinstance(value, dict) and '$in' in value:
+        return card in value['$in']
+    return card == value
+
+
+async def run_configuration(bot, box: str, count: int, guaranteed: bool,
+                            bulk: bool, plays: int) -> tuple:
+    """
+    Run a number of plays with one configuration.
+
+    :return: Tuple of (list of play latencies, list of plays).
+    """
+    latencies = []
+    results = []
+    for _ in range(plays):
+        handler = PlayHandler(bot, None, box, count, guaranteed)
+        start = perf_counter()
+        if bulk:
+            cards = await handler._play_bulk_cards()
+        else:
+            cards = await handler._play_cards()
+        latencies.append(perf_counter() - start)
+        results.append(cards)
+    return latencies, results
+
+
+def percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def chi_square(observed: dict, expected: dict) -> dict:
+    """
+    Pearson's chi-square goodness of fit test.
+
+    :param observed: Dictionary mapping categories to observed counts.
+    :param expected: Dictionary mapping categories to expected counts.
+
+    :return: Dictionary with the statistic, degrees of freedom and p-value.
+    """
+    categories = [k for k, v in expected.items() if v > 0]
+    stat = sum(
+        (observed.get(k, 0) - expected[k]) ** 2 / expected[k]
+        for k in categories
+    )
+    unexpected = sum(v for k, v in observed.items() if expected.get(k, 0) == 0)
+    dof = max(len(categories) - 1, 1)
+    p_value = 0.0 if unexpected else chi_square_sf(stat, dof)
+    return {'statistic': stat, 'dof': dof, 'p_value': p_value}
+
+
+def chi_square_sf(x: float, k: int) -> float:
+    """
+    Survival function of the chi-square distribution.
+    """
+    return upper_gamma(k / 2, x / 2)
+
+
+def upper_gamma(a: float, x: float) -> float:
+    """
+    Regularized upper incomplete gamma function Q(a, x).
+    """
+    if x <= 0:
+        return 1.0
+    log_prefix = a * math.log(x) - x - math.lgamma(a)
+    if x < a + 1:
+        # Series for P(a, x).
+        term = total = 1 / a
+        n = a
+        for _ in range(1000):
+            n += 1
+            term *= x / n
+            total += term
+            if abs(term) < abs(total) * 1e-15:
+                break
+        return max(0.0, 1 - total * math.exp(log_prefix))
+
+    # Continued fraction for Q(a, x).
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    h = d
+    for i in range(1, 1000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < 1e-15:
+            break
+    return math.exp(log_prefix) * h
+
+
+def verify_rarities(box: str, count: int, guaranteed: bool,
+                    plays: list) -> dict:
+    """
+    Test the rarity of every card played. Cards within a guaranteed play are
+        not independent, so that result is approximate.
+    """
+    observed = Counter(card['i_rarity'] for play in plays for card in play)
+    total = sum(observed.values())
+    expected = {
+        r: share * total
+        for r, share in expected_rarities(
+            RATES[box], count, guaranteed).items()
+    }
+    result = chi_square(observed, expected)
+    result['observed'] = {str(k): v for k, v in sorted(observed.items())}
+    return result
+
+
+def verify_top_rarity(box: str, count: int, plays: list) -> dict:
+    """
+    Test the best rarity of each guaranteed play of at most 10 cards, which
+        is independent between plays.
+    """
+    p4 = RATES[box][4]
+    observed = Counter(max(card['i_rarity'] for card in play) for play in plays)
+    all_4 = 1 - (1 - p4) ** count
+    expected = {4: all_4 * len(plays), 3: (1 - all_4) * len(plays)}
+    result = chi_square(observed, expected)
+    result['observed'] = {str(k): v for k, v in sorted(observed.items())}
+    return result
+
+
+def verify_cards(bot, plays: list) -> dict:
+    """
+    Test that every card of a rarity is equally likely.
+    """
+    by_rarity = {}
+    for play in plays:
+        for card in play:
+            by_rarity.setdefault(card['i_rarity'], Counter())[card['_id']] += 1
+
+    results = {}
+    for rarity, observed in sorted(by_rarity.items()):
+        pool = [
+            card_id for card_id, card in bot.db.cards.cards.items()
+            if card['i_rarity'] == rarity
+        ]
+        total = sum(observed.values())
+        expected = {card_id: total / len(pool) for card_id in pool}
+        results[str(rarity)] = chi_square(observed, expected)
+    return results
+
+
+def get_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(plays: int, cards_per_rarity: int) -> dict:
+    bot = StubBot(cards_per_rarity)
+    loop = get_event_loop()
+    report = {
+        'commit': get_commit(),
+        'time': int(time()),
+        'plays': plays,
+        'configurations': {}
+    }
+
+    for name, box, count, guaranteed, bulk in CONFIGURATIONS:
+        n = max(1, plays // count) if bulk else plays
+        start = perf_counter()
+        latencies, results = loop.run_until_complete(
+            run_configuration(bot, box, count, guaranteed, bulk, n))
+        elapsed = perf_counter() - start
+
+        result = {
+            'plays': n,
+            'cards': sum(len(r) for r in results),
+            'plays_per_second': n / elapsed,
+            'cards_per_second': sum(len(r) for r in results) / elapsed,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'rarity': verify_rarities(box, count, guaranteed, results),
+            'cards_by_rarity': verify_cards(bot, results)
+        }
+        if guaranteed and count <= 10:
+            result['top_rarity'] = verify_top_rarity(box, count, results)
+        report['configurations'][name] = result
+        print_result(name, result)
+
+    return report
+
+
+def failures(result: dict) -> list:
+    tests = [('rarity', result['rarity'])]
+    if 'top_rarity' in result:
+        tests.append(('top_rarity', result['top_rarity']))
+    tests += [
+        (f'cards {rarity} star', test)
+        for rarity, test in result['cards_by_rarity'].items()
+    ]
+    return [name for name, test in tests if test['p_value'] < SIGNIFICANCE]
+
+
+def print_result(name: str, result: dict):
+    failed = failures(result)
+    status = 'FAIL ' + ', '.join(failed) if failed else 'ok'
+    print(f"{name:>14}: {result['plays_per_second']:>10.0f} plays/s "
+          f"p50 {result['p50_ms']:.3f}ms p99 {result['p99_ms']:.3f}ms "
+          f"rarity p={result['rarity']['p_value']:.3f} {status}")
+
+
+def compare(old: dict, new: dict):
+    print(f"\nCompared with {old.get('commit')}:")
+    for name, result in new['configurations'].items():
+        before = old['configurations'].get(name)
+        if not before:
+            continue
+        change = result['plays_per_second'] / before['plays_per_second'] - 1
+        print(f"{name:>14}: {change:+.1%} plays/s, "
+              f"p99 {before['p99_ms']:.3f}ms -> {result['p99_ms']:.3f}ms")
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--plays', type=int, default=100000,
+                        help='plays per configuration')
+    parser.add_argument('--cards', type=int, default=60,
+                        help='cards per rarity in the generated pool')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--output', default='scout_benchmark.json')
+    parser.add_argument('--compare', default=None,
+                        help='results of an earlier run to compare with')
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        seed(args.seed)
+
+    report = run(args.plays, args.cards)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+    failed = [
+        name for name, result in report['configurations'].items()
+        if failures(result)
+    ]
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()